@@ -0,0 +1,50 @@
+import logging
+import threading
+from pathlib import Path
+
+from transformers import TrainerCallback
+
+logger = logging.getLogger(__name__)
+
+
+class ResumableCheckpointCallback(TrainerCallback):
+    """Stops training gracefully on request and reports full-state checkpoints.
+
+    A stop request makes the trainer save a checkpoint at the current step
+    before exiting, so the run can be resumed exactly where it stopped. A
+    request made before training starts (while the model loads or data is
+    prepared) stops the run after its first step.
+    on_checkpoint(step, path) is called after every checkpoint the trainer writes.
+    """
+
+    def __init__(self, on_checkpoint=None):
+        self._on_checkpoint = on_checkpoint
+        self._stop_requested = threading.Event()
+
+    @property
+    def stop_requested(self) -> bool:
+        return self._stop_requested.is_set()
+
+    def request_stop(self):
+        self._stop_requested.set()
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        if self._stop_requested.is_set():
+            logger.info("Stop requested before training started; stopping after the first step")
+            control.should_training_stop = True
+        return control
+
+    def on_step_end(self, args, state, control, **kwargs):
+        if self._stop_requested.is_set():
+            control.should_save = True
+            control.should_training_stop = True
+        return control
+
+    def on_save(self, args, state, control, **kwargs):
+        path = Path(args.output_dir) / f"checkpoint-{state.global_step}"
+        logger.info("Saved training checkpoint at step %d: %s", state.global_step, path)
+        if self._on_checkpoint is not None:
+            try:
+                self._on_checkpoint(state.global_step, str(path))
+            except Exception as e:
+                logger.warning("Could not record checkpoint at step %d: %s", state.global_step, e)
@@ -0,0 +1,116 @@
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCheckpointWriter:
+    """Writes adapter snapshots to disk on a background thread.
+
+    snapshot() copies the LoRA weights to CPU memory on the caller's thread
+    (a few MB, milliseconds) and returns; the writer thread saves the latest
+    pending snapshot, replacing older ones that were not written yet, and
+    waits at least min_interval seconds between writes. flush() writes any
+    pending snapshot immediately and blocks until done.
+    """
+
+    def __init__(self, path: Path, min_interval: float = 0.0, on_saved=None):
+        self._path = path
+        self._min_interval = min_interval
+        self._on_saved = on_saved
+        self._cond = threading.Condition()
+        self._pending: dict | None = None
+        self._writing = False
+        self._flush = False
+        self._closed = False
+        self._last_write = 0.0
+        self._config_written = False
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def snapshot(self, model, tokenizer, step: int, loss: float):
+        from peft import get_peft_model_state_dict
+
+        start = time.perf_counter()
+        state = {k: v.detach().to("cpu", copy=True) for k, v in get_peft_model_state_dict(model).items()}
+        snapshot = {
+            "state": state,
+            "step": step,
+            "loss": loss,
+            "snapshot_seconds": time.perf_counter() - start,
+            "coalesced": 0,
+        }
+        if not self._config_written:
+            # Config and tokenizer don't change during training; write them once, here
+            self._path.mkdir(parents=True, exist_ok=True)
+            model.peft_config[model.active_adapter].save_pretrained(str(self._path))
+            tokenizer.save_pretrained(str(self._path))
+            self._config_written = True
+        with self._cond:
+            if self._pending is not None:
+                snapshot["coalesced"] = self._pending["coalesced"] + 1
+            self._pending = snapshot
+            self._cond.notify()
+
+    def flush(self, timeout: float | None = None):
+        with self._cond:
+            self._flush = True
+            self._cond.notify()
+            self._cond.wait_for(lambda: self._pending is None and not self._writing, timeout)
+            self._flush = False
+
+    def close(self):
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._pending is not None:
+                        wait = self._last_write + self._min_interval - time.monotonic()
+                        if self._flush or wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+                if self._pending is None:
+                    return
+                snapshot, self._pending = self._pending, None
+                self._writing = True
+            try:
+                self._write(snapshot)
+            except Exception as e:
+                logger.warning("Could not save checkpoint at step %d: %s", snapshot["step"], e)
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._last_write = time.monotonic()
+                    self._cond.notify_all()
+
+    def _write(self, snapshot: dict):
+        from safetensors.torch import save_file
+
+        start = time.perf_counter()
+        self._path.mkdir(parents=True, exist_ok=True)
+        dest = self._path / "adapter_model.safetensors"
+        tmp = dest.with_suffix(".tmp")
+        save_file(snapshot["state"], str(tmp), metadata={"format": "pt"})
+        os.replace(tmp, dest)
+        save_seconds = time.perf_counter() - start
+        logger.info("Saved best adapter at step %d (loss=%.4f) in %.2fs", snapshot["step"], snapshot["loss"], save_seconds)
+        if self._on_saved is not None:
+            self._on_saved({
+                "step": snapshot["step"],
+                "loss": snapshot["loss"],
+                "path": str(self._path),
+                "snapshot_seconds": round(snapshot["snapshot_seconds"], 4),
+                "save_seconds": round(save_seconds, 4),
+                "coalesced": snapshot["coalesced"],
+            })
@@ -0,0 +1,65 @@
+import logging
+import math
+
+from transformers import TrainerCallback
+
+logger = logging.getLogger(__name__)
+
+# Logged losses averaged to smooth the value compared at each rung
+_SMOOTHING_WINDOW = 5
+
+
+class SuccessiveHalvingCallback(TrainerCallback):
+    """Asynchronous successive halving for trials that run one after another.
+
+    Rungs sit at min_steps * eta**k steps. At the first logged loss on or
+    after a rung, the trial's smoothed loss is compared with every earlier
+    trial's loss at that rung; unless it ranks in the best 1/eta it is
+    stopped. rung_losses is shared across the trials of a sweep and updated
+    in place.
+    """
+
+    def __init__(self, rung_losses: dict[int, list[float]], min_steps: int, eta: int):
+        self._rung_losses = rung_losses
+        self._min_steps = min_steps
+        self._eta = eta
+        self._rungs: list[int] = []
+        self._recent: list[float] = []
+        self.pruned_at: int | None = None
+        self.last_loss: float | None = None
+        self.trial_rung_losses: dict[int, float] = {}
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        rung = self._min_steps
+        while rung < state.max_steps:
+            # Rungs already passed by a resumed run were decided before
+            if rung > state.global_step:
+                self._rungs.append(rung)
+            rung *= self._eta
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        # on_step_end runs before the step's loss is logged, so rungs are checked here
+        loss = (logs or {}).get("loss")
+        if loss is None:
+            return control
+        self._recent = (self._recent + [loss])[-_SMOOTHING_WINDOW:]
+        self.last_loss = sum(self._recent) / len(self._recent)
+        while self._rungs and self._rungs[0] <= state.global_step:
+            if self._check_rung(self._rungs.pop(0), control):
+                break
+        return control
+
+    def _check_rung(self, step: int, control) -> bool:
+        """Record this trial's loss at a rung and stop it if it ranks outside the best 1/eta."""
+        previous = self._rung_losses.setdefault(step, [])
+        rank = sum(loss < self.last_loss for loss in previous)
+        keep = math.ceil((len(previous) + 1) / self._eta)
+        previous.append(self.last_loss)
+        self.trial_rung_losses[step] = self.last_loss
+        if rank >= keep:
+            logger.info("Sweep: pruning trial at step %d (loss %.4f ranks %d of %d)",
+                        step, self.last_loss, rank + 1, len(previous))
+            self.pruned_at = step
+            control.should_training_stop = True
+            return True
+        return False
@@ -3,6 +3,8 @@ import logging
 import time
 from transformers import TrainerCallback
 
+from backend.callbacks.checkpoint_writer import AsyncCheckpointWriter
+from backend.services.metric_writer import metric_writer
 from backend.ws.manager import ws_manager
 from backend.config import settings
 
@@ -10,17 +12,35 @@ logger = logging.getLogger(__name__)
 
 
 class WebSocketTrainerCallback(TrainerCallback):
-    def __init__(self, loop: asyncio.AbstractEventLoop, save_best: bool = True, save_every_n: int = 0):
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        save_best: bool = True,
+        save_every_n: int = 0,
+        batch_stats=None,
+        session_id: int | None = None,
+    ):
         self.loop = loop
+        self._session_id = session_id
+        self._batch_stats = batch_stats
         self._start_time = None
         self._step_times: list[float] = []
         self._save_best = save_best
         self._save_every_n = save_every_n
         self._best_loss = float("inf")
         self._best_step = 0
+        self._saved_loss = float("inf")
+        self._intervals: list[dict] = []
+        self._writer: AsyncCheckpointWriter | None = None
 
     def on_train_begin(self, args, state, control, **kwargs):
         self._start_time = time.time()
+        if self._save_best:
+            self._writer = AsyncCheckpointWriter(
+                settings.adapter_dir / "best_adapter",
+                min_interval=settings.best_checkpoint_min_interval,
+                on_saved=lambda payload: ws_manager.broadcast_sync("training_checkpoint", payload, self.loop),
+            )
         ws_manager.broadcast_sync("training_started", {
             "total_steps": state.max_steps,
         }, self.loop)
@@ -43,6 +63,11 @@ class WebSocketTrainerCallback(TrainerCallback):
                 eta = secs_per_step * remaining
 
         loss = logs.get("loss")
+        stats = self._batch_stats.snapshot() if self._batch_stats is not None else {}
+        if stats.get("samples_per_sec") is not None:
+            self._intervals.append(stats)
+        if loss is not None and self._session_id is not None:
+            metric_writer.push(self._session_id, step, {**logs, **stats})
 
         ws_manager.broadcast_sync("training_step", {
             "step": step,
@@ -52,29 +77,58 @@ class WebSocketTrainerCallback(TrainerCallback):
             "epoch": logs.get("epoch"),
             "grad_norm": logs.get("grad_norm"),
             "eta_seconds": eta,
+            **stats,
         }, self.loop)
 
-        # Track best loss and save checkpoint
-        if self._save_best and loss is not None and loss < self._best_loss:
+        # Track best loss; snapshot to CPU and let the writer thread save it
+        if loss is not None and loss < self._best_loss:
             self._best_loss = loss
             self._best_step = step
-            try:
-                from backend.services.model_manager import model_manager
-                best_path = settings.adapter_dir / "best_adapter"
-                best_path.mkdir(parents=True, exist_ok=True)
-                if model_manager.model is not None:
-                    model_manager.model.save_pretrained(str(best_path))
-                    model_manager.tokenizer.save_pretrained(str(best_path))
-                    logger.info("Saved best adapter at step %d (loss=%.4f)", step, loss)
-                    ws_manager.broadcast_sync("training_checkpoint", {
-                        "step": step,
-                        "loss": loss,
-                        "path": str(best_path),
-                    }, self.loop)
-            except Exception as e:
-                logger.debug("Could not save best checkpoint: %s", e)
+            if self._writer is not None and loss < self._saved_loss - settings.best_checkpoint_min_delta:
+                try:
+                    from backend.services.model_manager import model_manager
+                    if model_manager.model is not None:
+                        self._writer.snapshot(model_manager.model, model_manager.tokenizer, step, loss)
+                        self._saved_loss = loss
+                except Exception as e:
+                    logger.debug("Could not snapshot best checkpoint: %s", e)
+
+    def throughput_summary(self) -> dict:
+        """Whole-run throughput and where the time went, from the per-interval stats."""
+        if not self._intervals:
+            return {}
+        elapsed = sum(s["interval_seconds"] for s in self._intervals)
+
+        def _rate(key: str) -> float:
+            return round(sum(s[key] * s["interval_seconds"] for s in self._intervals) / elapsed, 2) if elapsed else 0.0
+
+        peaks = [s["peak_memory_gb"] for s in self._intervals if s["peak_memory_gb"] is not None]
+        return {
+            "samples_per_sec": _rate("samples_per_sec"),
+            "text_tokens_per_sec": _rate("text_tokens_per_sec"),
+            "vision_tokens_per_sec": _rate("vision_tokens_per_sec"),
+            "data_wait_seconds": round(sum(s["data_wait_seconds"] for s in self._intervals), 2),
+            "compute_seconds": round(sum(s["compute_seconds"] for s in self._intervals), 2),
+            "optimizer_seconds": round(sum(s["optimizer_seconds"] for s in self._intervals), 2),
+            "peak_memory_gb": max(peaks) if peaks else None,
+        }
+
+    def on_pre_optimizer_step(self, args, state, control, **kwargs):
+        if self._batch_stats is not None:
+            self._batch_stats.optimizer.start()
+
+    def on_optimizer_step(self, args, state, control, **kwargs):
+        if self._batch_stats is not None:
+            self._batch_stats.optimizer.stop()
+
+    def close_writer(self):
+        """Write any pending best-adapter snapshot and stop the writer thread. Safe to call twice."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
 
     def on_train_end(self, args, state, control, **kwargs):
+        self.close_writer()
         total_time = time.time() - self._start_time if self._start_time else 0
         ws_manager.broadcast_sync("training_complete", {
             "total_steps": state.global_step,
@@ -1,4 +1,5 @@
 from pathlib import Path
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
 
@@ -11,22 +12,79 @@ class Settings(BaseSettings):
     data_dir: Path = base_dir / "data"
     upload_dir: Path = data_dir / "uploads"
     image_cache_dir: Path = data_dir / "image_cache"
+    image_derived_dir: Path | None = None  # defaults to image_cache_dir / "derived"
     adapter_dir: Path = data_dir / "adapters"
+    sample_cache_dir: Path = data_dir / "sample_cache"
     db_path: Path = data_dir / "app.db"
+    prediction_cache_path: Path = data_dir / "prediction_cache.sqlite"
 
     # Model defaults
     default_model_name: str = "unsloth/Qwen3-VL-8B-Instruct-unsloth-bnb-4bit"
     default_max_seq_length: int = 2048
 
+    # Image fetching
+    image_fetch_workers: int = 16
+    image_fetch_per_host: int = 8
+    image_fetch_retries: int = 3
+    image_fetch_backoff: float = 0.5
+    image_fetch_timeout: float = 30.0
+
+    # On-disk image cache
+    image_cache_max_bytes: int = 20 * 1024**3
+    image_cache_policy: str = "lru"  # lru or lfu
+    image_memory_cache_bytes: int = 2 * 1024**3
+
+    # Images are downscaled once to this pixel budget (aligned to the vision
+    # patch grid) and the result cached; 0 (default) leaves images as the
+    # processor receives them today
+    image_max_pixels: int = 0
+    image_patch_factor: int = 32  # patch_size * spatial merge size for Qwen3-VL
+    image_derived_cache_max_bytes: int = 10 * 1024**3
+
+    # Processed training samples (cache_processed_samples) share the image cache's eviction policy
+    sample_cache_max_bytes: int = 50 * 1024**3
+
+    # Best-adapter checkpoints: a new best is saved only if loss improves by at
+    # least min_delta, and written at most once per min_interval seconds
+    best_checkpoint_min_delta: float = 0.001
+    best_checkpoint_min_interval: float = 30.0
+
+    # Training metrics are buffered and written to the database in batches
+    metric_flush_steps: int = 50
+    metric_flush_seconds: float = 5.0
+    metric_buffer_size: int = 10000
+
+    # Evaluation samples are written to the database in chunks of this many rows
+    eval_flush_rows: int = 32
+
+    # Outputs of deterministic (do_sample=False) generations are cached on disk
+    # and reused for identical model, adapter, inputs and generation params
+    prediction_cache_enabled: bool = True
+    prediction_cache_max_entries: int = 500_000
+
+    # Adapters attached to the resident base model: this many most recently used
+    # stay on the GPU, older ones move to pinned CPU memory, and past cpu_slots
+    # they are detached (and read from disk again when next used)
+    adapter_gpu_slots: int = 4
+    adapter_cpu_slots: int = 16
+
     # Server
     host: str = "0.0.0.0"
     port: int = 8000
 
     model_config = {"env_prefix": "QWEN3VL_"}
 
+    @model_validator(mode="after")
+    def _derive_paths(self):
+        # Follows an overridden image_cache_dir unless set explicitly
+        if self.image_derived_dir is None:
+            self.image_derived_dir = self.image_cache_dir / "derived"
+        return self
+
 
 settings = Settings()
 
 # Ensure directories exist
-for d in [settings.data_dir, settings.upload_dir, settings.image_cache_dir, settings.adapter_dir]:
+for d in [settings.data_dir, settings.upload_dir, settings.image_cache_dir, settings.image_derived_dir, settings.adapter_dir,
+          settings.sample_cache_dir]:
     d.mkdir(parents=True, exist_ok=True)
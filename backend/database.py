@@ -15,8 +15,36 @@ class Base(DeclarativeBase):
     pass
 
 
+# Columns added after their table was first released; added in place so existing rows are kept
+_ADDED_COLUMNS = [
+    ("training_sessions", "checkpoint_dir", "VARCHAR(500)"),
+    ("training_sessions", "last_checkpoint_step", "INTEGER"),
+    ("training_metric_logs", "samples_per_sec", "FLOAT"),
+    ("training_metric_logs", "text_tokens_per_sec", "FLOAT"),
+    ("training_metric_logs", "vision_tokens_per_sec", "FLOAT"),
+    ("training_metric_logs", "data_wait_seconds", "FLOAT"),
+    ("training_metric_logs", "compute_seconds", "FLOAT"),
+    ("training_metric_logs", "optimizer_seconds", "FLOAT"),
+    ("training_metric_logs", "peak_memory_gb", "FLOAT"),
+    ("evaluation_runs", "status", "VARCHAR(20) DEFAULT 'completed'"),
+    ("evaluation_runs", "dataset_path", "VARCHAR(500)"),
+    ("evaluation_runs", "dataset_config", "TEXT"),
+    ("evaluation_runs", "sample_limit", "INTEGER"),
+    ("evaluation_runs", "generation_params", "TEXT DEFAULT '{}'"),
+    ("evaluation_runs", "batch_size", "INTEGER DEFAULT 1"),
+    ("evaluation_runs", "group_by_length", "INTEGER DEFAULT 0"),
+    ("evaluation_runs", "num_evaluated", "INTEGER DEFAULT 0"),
+    ("evaluation_runs", "sum_exact_match", "FLOAT DEFAULT 0"),
+    ("evaluation_runs", "sum_token_precision", "FLOAT DEFAULT 0"),
+    ("evaluation_runs", "sum_token_recall", "FLOAT DEFAULT 0"),
+    ("evaluation_runs", "sum_token_f1", "FLOAT DEFAULT 0"),
+    ("evaluation_runs", "cls_skipped", "INTEGER DEFAULT 0"),
+    ("evaluation_runs", "num_cached", "INTEGER DEFAULT 0"),
+]
+
+
 async def init_db():
-    from backend.models import TrainingSession, TrainingMetricLog, EvaluationRun, EvalSample  # noqa
+    from backend.models import TrainingSession, TrainingMetricLog, EvaluationRun, EvalSample, Job  # noqa
 
     async with engine.begin() as conn:
         # Check if schema needs rebuilding by verifying a known new column exists
@@ -29,6 +57,11 @@ async def init_db():
 
         await conn.run_sync(Base.metadata.create_all)
 
+        for table, column, ddl in _ADDED_COLUMNS:
+            existing = {row[1] for row in await conn.execute(text(f"PRAGMA table_info({table})"))}
+            if column not in existing:
+                await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
 
 async def get_db():
     async with async_session() as session:
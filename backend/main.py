@@ -12,6 +12,7 @@ from backend.config import settings
 from backend.database import init_db
 from backend.ws.manager import ws_manager
 from backend.utils.gpu import get_gpu_stats
+from backend.utils.fetcher import image_fetcher
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -26,10 +27,25 @@ async def lifespan(app: FastAPI):
     from backend.services.dataset_service import restore_state
     restore_state()
 
+    from backend.services.training_service import mark_interrupted_sessions
+    await mark_interrupted_sessions()
+
+    from backend.services.evaluation_service import mark_interrupted_runs
+    await mark_interrupted_runs()
+
+    from backend.services.metric_writer import metric_writer
+    await metric_writer.start()
+
+    from backend.services.job_queue import job_queue
+    await job_queue.start()
+
     # Start GPU stats broadcaster
     gpu_task = asyncio.create_task(_gpu_broadcaster())
     yield
     gpu_task.cancel()
+    await job_queue.stop()
+    await metric_writer.stop()
+    image_fetcher.close()
 
 
 async def _gpu_broadcaster():
@@ -56,7 +72,7 @@ app.add_middleware(
 )
 
 # Routers
-from backend.routers import system, datasets, training, sessions, inference, evaluation
+from backend.routers import system, datasets, training, sessions, inference, evaluation, jobs
 
 app.include_router(system.router)
 app.include_router(datasets.router)
@@ -64,6 +80,7 @@ app.include_router(training.router)
 app.include_router(sessions.router)
 app.include_router(inference.router)
 app.include_router(evaluation.router)
+app.include_router(jobs.router)
 
 
 @app.websocket("/ws")
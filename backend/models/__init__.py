@@ -1,2 +1,3 @@
 from backend.models.session import TrainingSession
 from backend.models.training_run import TrainingMetricLog, EvaluationRun, EvalSample
+from backend.models.job import Job
@@ -0,0 +1,28 @@
+import datetime
+from sqlalchemy import String, Text, DateTime, Integer, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+
+from backend.database import Base
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(20))  # "training" or "evaluation"
+    status: Mapped[str] = mapped_column(String(20), default="queued")  # queued, running, completed, failed, cancelled
+    priority: Mapped[int] = mapped_column(Integer, default=0)
+
+    # JSON-serialized request plus the dataset/mapping it was submitted against
+    payload: Mapped[str] = mapped_column(Text, default="{}")
+    result: Mapped[str | None] = mapped_column(Text, nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    session_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("training_sessions.id"), nullable=True)
+    eval_run_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("evaluation_runs.id"), nullable=True)
+
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, default=datetime.datetime.utcnow
+    )
+    started_at: Mapped[datetime.datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime.datetime | None] = mapped_column(DateTime, nullable=True)
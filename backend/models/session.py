@@ -21,6 +21,10 @@ class TrainingSession(Base):
     adapter_path: Mapped[str | None] = mapped_column(String(500), nullable=True)
     dataset_path: Mapped[str | None] = mapped_column(String(500), nullable=True)
 
+    # Full trainer state (adapter, optimizer, scheduler, RNG) for resuming
+    checkpoint_dir: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    last_checkpoint_step: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
     created_at: Mapped[datetime.datetime] = mapped_column(
         DateTime, default=datetime.datetime.utcnow
     )
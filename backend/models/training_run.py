@@ -15,6 +15,15 @@ class TrainingMetricLog(Base):
     learning_rate: Mapped[float] = mapped_column(Float)
     epoch: Mapped[float] = mapped_column(Float, default=0.0)
     grad_norm: Mapped[float | None] = mapped_column(Float, nullable=True)
+
+    # Throughput and time breakdown over the logging interval ending at this step
+    samples_per_sec: Mapped[float | None] = mapped_column(Float, nullable=True)
+    text_tokens_per_sec: Mapped[float | None] = mapped_column(Float, nullable=True)
+    vision_tokens_per_sec: Mapped[float | None] = mapped_column(Float, nullable=True)
+    data_wait_seconds: Mapped[float | None] = mapped_column(Float, nullable=True)
+    compute_seconds: Mapped[float | None] = mapped_column(Float, nullable=True)
+    optimizer_seconds: Mapped[float | None] = mapped_column(Float, nullable=True)
+    peak_memory_gb: Mapped[float | None] = mapped_column(Float, nullable=True)
     timestamp: Mapped[datetime.datetime] = mapped_column(
         DateTime, default=datetime.datetime.utcnow
     )
@@ -30,6 +39,24 @@ class EvaluationRun(Base):
     eval_mode: Mapped[str] = mapped_column(String(20), default="token")  # "token" or "classification"
     num_samples: Mapped[int] = mapped_column(Integer, default=0)
     num_skipped: Mapped[int] = mapped_column(Integer, default=0)
+    status: Mapped[str] = mapped_column(String(20), default="completed")  # running, completed, stopped, failed, interrupted
+
+    # Request, kept so an unfinished run can be resumed with the same settings
+    dataset_path: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    dataset_config: Mapped[str | None] = mapped_column(Text, nullable=True)  # column mapping as JSON
+    sample_limit: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    generation_params: Mapped[str] = mapped_column(Text, default="{}")
+    batch_size: Mapped[int] = mapped_column(Integer, default=1)
+    group_by_length: Mapped[int] = mapped_column(Integer, default=0)
+
+    # Running totals over the persisted samples; the averages below are derived from them
+    num_evaluated: Mapped[int] = mapped_column(Integer, default=0)
+    sum_exact_match: Mapped[float] = mapped_column(Float, default=0.0)
+    sum_token_precision: Mapped[float] = mapped_column(Float, default=0.0)
+    sum_token_recall: Mapped[float] = mapped_column(Float, default=0.0)
+    sum_token_f1: Mapped[float] = mapped_column(Float, default=0.0)
+    cls_skipped: Mapped[int] = mapped_column(Integer, default=0)
+    num_cached: Mapped[int] = mapped_column(Integer, default=0)  # predictions served from the prediction cache
 
     # Token-level metrics (used when eval_mode="token")
     exact_match_accuracy: Mapped[float] = mapped_column(Float, default=0.0)
@@ -1,4 +1,4 @@
-import shutil
+import asyncio
 from fastapi import APIRouter, UploadFile, File, HTTPException
 
 from backend.config import settings
@@ -9,7 +9,9 @@ from backend.schemas.dataset import (
     DatasetPreviewResponse,
     ConversationPreviewItem,
 )
-from backend.services import dataset_service
+from backend.services import dataset_service, length_index, prefetch_service
+from backend.services.model_manager import model_manager
+from backend.ws.manager import ws_manager
 
 router = APIRouter(prefix="/api/datasets", tags=["datasets"])
 
@@ -20,37 +22,45 @@ async def upload_csv(file: UploadFile = File(...)):
         raise HTTPException(400, "Only CSV files are accepted")
 
     dest = settings.upload_dir / file.filename
-    with open(dest, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    prefetch_service.cancel_prefetch()
+    loop = asyncio.get_event_loop()
 
-    df = dataset_service.load_csv(str(dest))
-    sample_rows = df.head(5).fillna("").to_dict(orient="records")
+    def _on_progress(rows: int, bytes_read: int, total_bytes: int):
+        ws_manager.broadcast_sync("upload_progress", {
+            "filename": file.filename,
+            "rows": rows,
+            "bytes_read": bytes_read,
+            "total_bytes": total_bytes,
+        }, loop)
+
+    # Save and parse in one pass, off the event loop so WebSocket broadcasts keep flowing
+    table = await asyncio.to_thread(dataset_service.load_csv, str(dest), _on_progress, file.file)
+    sample_rows = dataset_service.get_preview(1, 5)["rows"]
 
     return DatasetInfo(
         filename=file.filename,
-        num_rows=len(df),
-        num_columns=len(df.columns),
-        columns=list(df.columns),
+        num_rows=table.num_rows,
+        num_columns=table.num_columns,
+        columns=table.column_names,
         sample_rows=sample_rows,
+        column_stats=dataset_service.get_column_stats(),
     )
 
 
 @router.get("/columns")
 async def get_columns():
-    df = dataset_service.get_current_df()
-    if df is None:
+    if dataset_service.get_current_table() is None:
         raise HTTPException(404, "No dataset loaded")
-    return {"columns": list(df.columns)}
+    return {"columns": dataset_service.get_columns()}
 
 
 @router.post("/mapping")
 async def set_column_mapping(mapping: ColumnMappingRequest):
-    df = dataset_service.get_current_df()
-    if df is None:
+    if dataset_service.get_current_table() is None:
         raise HTTPException(404, "No dataset loaded")
 
     # Validate columns exist
-    all_cols = set(df.columns)
+    all_cols = set(dataset_service.get_columns())
     for col in [mapping.prompt_column, mapping.response_column]:
         if col not in all_cols:
             raise HTTPException(400, f"Column '{col}' not found in dataset")
@@ -64,6 +74,7 @@ async def set_column_mapping(mapping: ColumnMappingRequest):
             raise HTTPException(400, f"Mandatory column '{col}' not found in dataset")
 
     dataset_service.set_mapping(mapping)
+    _launch_prefetch()
     return {"status": "ok", "mapping": mapping.model_dump()}
 
 
@@ -89,13 +100,74 @@ async def preview_conversations(start: int = 0, count: int = 5):
 
 @router.get("/info")
 async def dataset_info():
-    df = dataset_service.get_current_df()
-    if df is None:
+    table = dataset_service.get_current_table()
+    if table is None:
         return {"loaded": False}
     return {
         "loaded": True,
         "filename": dataset_service.get_current_filename(),
-        "num_rows": len(df),
-        "num_columns": len(df.columns),
-        "columns": list(df.columns),
+        "num_rows": table.num_rows,
+        "num_columns": table.num_columns,
+        "columns": table.column_names,
+        "column_stats": dataset_service.get_column_stats(),
     }
+
+
+def _launch_prefetch():
+    job_id = prefetch_service.start_prefetch()
+    loop = asyncio.get_event_loop()
+    asyncio.create_task(asyncio.to_thread(prefetch_service.run_prefetch, job_id, loop))
+
+
+@router.post("/prefetch")
+async def start_prefetch():
+    if dataset_service.get_current_table() is None:
+        raise HTTPException(404, "No dataset loaded")
+    if dataset_service.get_current_mapping() is None:
+        raise HTTPException(400, "Column mapping not set")
+    _launch_prefetch()
+    return {"status": "started"}
+
+
+@router.get("/prefetch")
+async def prefetch_status():
+    return prefetch_service.get_prefetch_status()
+
+
+@router.delete("/prefetch")
+async def cancel_prefetch():
+    if not prefetch_service.cancel_prefetch():
+        raise HTTPException(400, "No prefetch in progress")
+    return {"status": "cancelling"}
+
+
+def _analysis_model_name(model_name: str | None) -> str:
+    return model_name or model_manager.model_name or settings.default_model_name
+
+
+@router.post("/analyze")
+async def analyze_lengths(model_name: str | None = None):
+    """Build the per-row token length index in the background."""
+    if dataset_service.get_current_table() is None:
+        raise HTTPException(404, "No dataset loaded")
+    if dataset_service.get_current_mapping() is None:
+        raise HTTPException(400, "Column mapping not set")
+    if length_index.get_analysis_status()["status"] == "running":
+        raise HTTPException(400, "Analysis already in progress")
+    loop = asyncio.get_event_loop()
+    asyncio.create_task(asyncio.to_thread(length_index.run_analysis, _analysis_model_name(model_name), loop))
+    return {"status": "started"}
+
+
+@router.get("/lengths")
+async def get_lengths(model_name: str | None = None, max_seq_length: int | None = None):
+    """Token length distribution from the stored index."""
+    if dataset_service.get_current_table() is None:
+        raise HTTPException(404, "No dataset loaded")
+    if dataset_service.get_current_mapping() is None:
+        raise HTTPException(400, "Column mapping not set")
+    table = await asyncio.to_thread(length_index.load_length_index, _analysis_model_name(model_name))
+    if table is None:
+        return {"status": length_index.get_analysis_status(), "lengths": None}
+    summary = await asyncio.to_thread(length_index.summarize, table, max_seq_length)
+    return {"status": length_index.get_analysis_status(), "lengths": summary}
@@ -5,26 +5,26 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.database import get_db, async_session
+from backend.database import get_db
 from backend.models.training_run import EvaluationRun, EvalSample
-from backend.schemas.evaluation import EvalRequest
+from backend.schemas.evaluation import EvalRequest, MultiEvalRequest
 from backend.services import evaluation_service
-from backend.services.model_manager import model_manager
+from backend.services.job_queue import busy_reason
 from backend.ws.manager import ws_manager
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/evaluation", tags=["evaluation"])
 
-_eval_status = {"running": False, "model_type": None}
-
-
 def _run_to_dict(r: EvaluationRun) -> dict:
     d: dict = {
         "id": r.id,
         "model_type": r.model_type,
+        "adapter_path": r.adapter_path,
         "eval_mode": r.eval_mode,
         "num_samples": r.num_samples,
         "num_skipped": r.num_skipped,
+        "status": r.status,
+        "num_cached": r.num_cached,
         "created_at": r.created_at.isoformat(),
     }
     if r.eval_mode == "classification":
@@ -48,107 +48,82 @@ def _run_to_dict(r: EvaluationRun) -> dict:
     return d
 
 
-async def _save_eval_to_db(result: dict) -> int:
-    """Save evaluation results to the database. Returns the run ID."""
-    async with async_session() as db:
-        metrics = result["metrics"]
-        cls = result.get("classification_metrics")
-        is_cls = cls is not None
-
-        run = EvaluationRun(
-            session_id=None,
-            adapter_path=None,
-            model_type=metrics["model_type"],
-            eval_mode="classification" if is_cls else "token",
-            num_samples=metrics["num_samples"],
-            num_skipped=metrics.get("num_skipped", 0),
-            exact_match_accuracy=metrics["exact_match_accuracy"],
-            token_precision=metrics["token_precision"],
-            token_recall=metrics["token_recall"],
-            token_f1=metrics["token_f1"],
-            cls_accuracy=cls["accuracy"] if cls else 0.0,
-            cls_precision=cls["precision"] if cls else 0.0,
-            cls_recall=cls["recall"] if cls else 0.0,
-            cls_f1=cls["f1"] if cls else 0.0,
-            cls_tp=cls["tp"] if cls else 0,
-            cls_fp=cls["fp"] if cls else 0,
-            cls_tn=cls["tn"] if cls else 0,
-            cls_fn=cls["fn"] if cls else 0,
-        )
-        db.add(run)
-        await db.flush()
-
-        for s in result["samples"]:
-            sample = EvalSample(
-                eval_run_id=run.id,
-                sample_index=s["index"],
-                prompt=s["prompt"],
-                ground_truth=s["ground_truth"],
-                prediction=s["prediction"],
-                image_urls=json.dumps(s.get("image_urls", [])),
-                exact_match=s["exact_match"],
-                token_precision=s["token_precision"],
-                token_recall=s["token_recall"],
-                token_f1=s["token_f1"],
-                skipped=1 if s.get("skipped") else 0,
-                skipped_reason=s.get("skipped_reason"),
-            )
-            db.add(sample)
-
-        await db.commit()
-        logger.info("Saved eval run #%d (%s) with %d samples", run.id, run.eval_mode, len(result["samples"]))
-        return run.id
-
+def _check_idle():
+    reason = busy_reason()
+    if reason:
+        raise HTTPException(409, reason)
 
-@router.post("/run")
-async def run_evaluation(req: EvalRequest):
-    if model_manager.is_training:
-        raise HTTPException(409, "Model is currently training")
-    if _eval_status["running"]:
-        raise HTTPException(409, "Evaluation already in progress")
-
-    _eval_status["running"] = True
-    _eval_status["model_type"] = "finetuned" if req.adapter_path else "base"
 
+def _launch(job, model_type: str, **info) -> dict:
+    """Run job(loop) in the background; info (the run IDs) is echoed in the response and eval_error."""
     loop = asyncio.get_event_loop()
 
     async def _run():
         try:
-            result = await asyncio.to_thread(
-                evaluation_service.run_evaluation,
-                req.adapter_path,
-                req.sample_limit,
-                req.generation_params,
-                loop,
-                req.classification_mode,
-            )
-
-            # Save to database
-            run_id = await _save_eval_to_db(result)
-
-            # Broadcast completion with just metrics (no samples — those are in the DB)
-            payload: dict = {
-                "model_type": result["model_type"],
-                "metrics": result["metrics"],
-                "run_id": run_id,
-            }
-            if "classification_metrics" in result:
-                payload["classification_metrics"] = result["classification_metrics"]
-            await ws_manager.broadcast("eval_complete", payload)
-
+            await job(loop)
         except Exception as e:
             logger.exception("Evaluation failed")
-            await ws_manager.broadcast("eval_error", {"error": str(e)})
-        finally:
-            _eval_status["running"] = False
+            await ws_manager.broadcast("eval_error", {"error": str(e), **info})
 
+    evaluation_service.eval_status["running"] = True
+    evaluation_service.eval_status["model_type"] = model_type
     asyncio.create_task(_run())
-    return {"status": "started", "model_type": _eval_status["model_type"]}
+    return {"status": "started", "model_type": model_type, **info}
+
+
+@router.post("/run")
+async def run_evaluation(req: EvalRequest):
+    _check_idle()
+    run_id = await evaluation_service.create_eval_run(req.model_dump())
+    return _launch(
+        lambda loop: evaluation_service.run_evaluation_job(run_id, loop),
+        "finetuned" if req.adapter_path else "base",
+        run_id=run_id,
+    )
+
+
+@router.post("/run-multi")
+async def run_multi_evaluation(req: MultiEvalRequest):
+    """Evaluate the base model and/or several adapters over the same rows in one pass."""
+    _check_idle()
+    try:
+        evaluation_service.check_targets(req.targets)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    options = req.model_dump(exclude={"targets"})
+    run_ids = [
+        await evaluation_service.create_eval_run({**options, "adapter_path": target})
+        for target in req.targets
+    ]
+    return _launch(
+        lambda loop: evaluation_service.run_multi_evaluation_job(run_ids, loop), "multi", run_ids=run_ids
+    )
+
+
+@router.post("/runs/{run_id}/resume")
+async def resume_run(run_id: int):
+    """Continue an interrupted or failed run from its last stored sample."""
+    _check_idle()
+    try:
+        model_type = await evaluation_service.check_resumable(run_id)
+    except LookupError as e:
+        raise HTTPException(404, str(e))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return _launch(lambda loop: evaluation_service.run_evaluation_job(run_id, loop), model_type, run_id=run_id)
+
+
+@router.post("/stop")
+async def stop_evaluation():
+    """Stop the running evaluation after its current batch; resume it later from /runs/{run_id}/resume."""
+    if not evaluation_service.stop_evaluation():
+        raise HTTPException(400, "No evaluation in progress to stop")
+    return {"status": "stopping"}
 
 
 @router.get("/status")
 async def eval_status():
-    return _eval_status
+    return evaluation_service.eval_status
 
 
 @router.get("/runs")
@@ -1,5 +1,5 @@
 import asyncio
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 
 from backend.schemas.inference import (
     InferenceRequest,
@@ -9,6 +9,7 @@ from backend.schemas.inference import (
 )
 from backend.services import inference_service
 from backend.services.model_manager import model_manager
+from backend.services.prediction_cache import prediction_cache
 
 router = APIRouter(prefix="/api/inference", tags=["inference"])
 
@@ -47,3 +48,16 @@ async def compare(req: CompareRequest):
         return CompareResponse(**result)
     except Exception as e:
         raise HTTPException(500, str(e))
+
+
+@router.get("/cache")
+async def cache_stats():
+    """Prediction cache size, hit rate since startup and entries per adapter."""
+    return await asyncio.to_thread(prediction_cache.stats)
+
+
+@router.delete("/cache")
+async def invalidate_cache(adapter_path: str | None = Query(None)):
+    """Drop cached predictions of one adapter, or all of them if adapter_path is omitted."""
+    removed = await asyncio.to_thread(prediction_cache.invalidate, adapter_path)
+    return {"status": "ok", "removed": removed}
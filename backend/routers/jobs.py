@@ -0,0 +1,58 @@
+from fastapi import APIRouter, HTTPException
+
+from backend.schemas.job import JobSubmitRequest, JobUpdateRequest
+from backend.services import dataset_service
+from backend.services.job_queue import job_queue
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+
+@router.post("/")
+async def submit_job(req: JobSubmitRequest):
+    if dataset_service.get_current_table() is None:
+        raise HTTPException(400, "No dataset loaded")
+    if dataset_service.get_current_mapping() is None:
+        raise HTTPException(400, "Column mapping not set")
+
+    if req.kind == "training":
+        if req.training is None:
+            raise HTTPException(400, "Training jobs need a 'training' request")
+        request = req.training.model_dump()
+    else:
+        if req.evaluation is None:
+            raise HTTPException(400, "Evaluation jobs need an 'evaluation' request")
+        request = req.evaluation.model_dump()
+    return await job_queue.submit(req.kind, request, req.priority)
+
+
+@router.get("/")
+async def list_jobs(status: str | None = None, limit: int = 100):
+    return {"jobs": await job_queue.list_jobs(status, limit), "current_job_id": job_queue.current_job_id}
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: int):
+    job = await job_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    return job
+
+
+@router.patch("/{job_id}")
+async def update_job(job_id: int, req: JobUpdateRequest):
+    try:
+        return await job_queue.set_priority(job_id, req.priority)
+    except LookupError as e:
+        raise HTTPException(404, str(e))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: int):
+    try:
+        return await job_queue.cancel(job_id)
+    except LookupError as e:
+        raise HTTPException(404, str(e))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
@@ -28,6 +28,8 @@ async def list_sessions(db: AsyncSession = Depends(get_db)):
                 lora_config=s.lora_config,
                 adapter_path=s.adapter_path,
                 dataset_path=s.dataset_path,
+                checkpoint_dir=s.checkpoint_dir,
+                last_checkpoint_step=s.last_checkpoint_step,
                 created_at=s.created_at.isoformat(),
                 updated_at=s.updated_at.isoformat(),
             )
@@ -52,6 +54,8 @@ async def create_session(req: SessionCreate, db: AsyncSession = Depends(get_db))
         lora_config=session.lora_config,
         adapter_path=session.adapter_path,
         dataset_path=session.dataset_path,
+        checkpoint_dir=session.checkpoint_dir,
+        last_checkpoint_step=session.last_checkpoint_step,
         created_at=session.created_at.isoformat(),
         updated_at=session.updated_at.isoformat(),
     )
@@ -72,6 +76,8 @@ async def get_session(session_id: int, db: AsyncSession = Depends(get_db)):
         lora_config=session.lora_config,
         adapter_path=session.adapter_path,
         dataset_path=session.dataset_path,
+        checkpoint_dir=session.checkpoint_dir,
+        last_checkpoint_step=session.last_checkpoint_step,
         created_at=session.created_at.isoformat(),
         updated_at=session.updated_at.isoformat(),
     )
@@ -98,6 +104,8 @@ async def update_session(session_id: int, req: SessionUpdate, db: AsyncSession =
         lora_config=session.lora_config,
         adapter_path=session.adapter_path,
         dataset_path=session.dataset_path,
+        checkpoint_dir=session.checkpoint_dir,
+        last_checkpoint_step=session.last_checkpoint_step,
         created_at=session.created_at.isoformat(),
         updated_at=session.updated_at.isoformat(),
     )
@@ -140,6 +148,8 @@ async def clone_session(session_id: int, db: AsyncSession = Depends(get_db)):
         lora_config=clone.lora_config,
         adapter_path=clone.adapter_path,
         dataset_path=clone.dataset_path,
+        checkpoint_dir=clone.checkpoint_dir,
+        last_checkpoint_step=clone.last_checkpoint_step,
         created_at=clone.created_at.isoformat(),
         updated_at=clone.updated_at.isoformat(),
     )
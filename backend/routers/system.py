@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
 
 from backend.utils.gpu import get_gpu_stats
+from backend.utils.image_cache import derived_image_cache, image_cache, memory_image_cache
 from backend.services.model_manager import model_manager
 
 router = APIRouter(prefix="/api/system", tags=["system"])
@@ -29,5 +30,16 @@ async def model_status():
     return {
         "loaded": model_manager.is_loaded,
         "mode": model_manager.status,
+        "model_name": model_manager.model_name,
         "adapter": model_manager._current_adapter_path,
+        **model_manager.adapter_status(),
+    }
+
+
+@router.get("/cache")
+async def cache_stats():
+    return {
+        **image_cache.stats(),
+        "memory": memory_image_cache.stats(),
+        "derived": derived_image_cache.stats(),
     }
@@ -1,38 +1,32 @@
 import asyncio
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 
 from backend.schemas.training import (
     TrainingStartRequest,
+    TrainingResumeRequest,
     TrainingStatusResponse,
     AdapterInfo,
 )
-from backend.services import training_service, dataset_service
+from backend.schemas.sweep import SweepRequest
+from backend.services import training_service, dataset_service, sweep_service
+from backend.services.job_queue import busy_reason
 
 router = APIRouter(prefix="/api/training", tags=["training"])
 
 
-@router.post("/start")
-async def start_training(req: TrainingStartRequest):
-    # Check dataset is ready
-    if dataset_service.get_current_df() is None:
-        raise HTTPException(400, "No dataset loaded")
-    if dataset_service.get_current_mapping() is None:
-        raise HTTPException(400, "Column mapping not set")
-
-    status = training_service.get_training_status()
-    if status["status"] in ("training", "loading_model", "preparing_data"):
-        raise HTTPException(409, "Training already in progress")
-
+def _launch(model_config: dict, sft_config: dict, lora_config: dict, session_id: int, resume: bool = False):
     loop = asyncio.get_event_loop()
 
     async def _run():
         try:
             return await asyncio.to_thread(
                 training_service.run_training,
-                req.model_config_data.model_dump(),
-                req.sft_config.model_dump(),
-                req.lora_config.model_dump(),
+                model_config,
+                sft_config,
+                lora_config,
                 loop,
+                session_id,
+                resume,
             )
         except Exception as e:
             import logging
@@ -43,7 +37,48 @@ async def start_training(req: TrainingStartRequest):
             await ws_manager.broadcast("training_error", {"error": str(e)})
 
     asyncio.create_task(_run())
-    return {"status": "started"}
+
+
+def _check_ready():
+    # Check dataset is ready
+    if dataset_service.get_current_table() is None:
+        raise HTTPException(400, "No dataset loaded")
+    if dataset_service.get_current_mapping() is None:
+        raise HTTPException(400, "Column mapping not set")
+
+    reason = busy_reason()
+    if reason:
+        raise HTTPException(409, reason)
+
+
+@router.post("/start")
+async def start_training(req: TrainingStartRequest):
+    _check_ready()
+    model_config = req.model_config_data.model_dump()
+    sft_config = req.sft_config.model_dump()
+    lora_config = req.lora_config.model_dump()
+    try:
+        training_service.check_length_index(model_config, sft_config)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    session_id = await training_service.create_run_session(model_config, sft_config, lora_config, req.session_name)
+    _launch(model_config, sft_config, lora_config, session_id)
+    return {"status": "started", "session_id": session_id}
+
+
+@router.post("/resume")
+async def resume_training(req: TrainingResumeRequest):
+    """Continue a stopped, failed or interrupted run from its latest checkpoint."""
+    _check_ready()
+    try:
+        model_config, sft_config, lora_config = await training_service.get_resume_config(req.session_id)
+    except LookupError as e:
+        raise HTTPException(404, str(e))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    await training_service.update_session_status(req.session_id, "training")
+    _launch(model_config, sft_config, lora_config, req.session_id, resume=True)
+    return {"status": "resumed", "session_id": req.session_id}
 
 
 @router.post("/stop")
@@ -59,6 +94,35 @@ async def get_training_status():
     return training_service.get_training_status()
 
 
+@router.get("/metrics")
+async def get_training_metrics(session_id: int | None = None, max_points: int = Query(500, ge=10, le=10000)):
+    return await training_service.get_metrics(session_id, max_points)
+
+
 @router.get("/adapters")
 async def list_adapters():
     return {"adapters": training_service.list_adapters()}
+
+
+@router.post("/sweep")
+async def start_sweep(req: SweepRequest):
+    """Train one trial per point of the search space, pruning losers and evaluating the rest."""
+    _check_ready()
+    try:
+        trials = sweep_service.build_trials(req)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    sweep_service.start_sweep(req, trials)
+    return {"status": "started", "num_trials": len(trials)}
+
+
+@router.get("/sweep")
+async def sweep_status():
+    return sweep_service.get_sweep_status()
+
+
+@router.delete("/sweep")
+async def cancel_sweep():
+    if not sweep_service.cancel_sweep():
+        raise HTTPException(400, "No sweep in progress")
+    return {"status": "cancelling"}
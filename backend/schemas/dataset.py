@@ -16,6 +16,7 @@ class DatasetInfo(BaseModel):
     num_columns: int
     columns: list[str]
     sample_rows: list[dict]
+    column_stats: dict[str, dict] = {}
 
 
 class DatasetPreviewRequest(BaseModel):
@@ -1,10 +1,12 @@
 from pydantic import BaseModel, Field
 
 
-class EvalRequest(BaseModel):
-    adapter_path: str | None = None
+class EvalOptions(BaseModel):
     sample_limit: int = Field(default=50, ge=1, le=100000)
     classification_mode: bool = False
+    # Rows generated per model.generate call; 1 keeps the per-row path
+    batch_size: int = Field(default=1, ge=1, le=64)
+    group_by_length: bool = False
     generation_params: dict = Field(default_factory=lambda: {
         "max_new_tokens": 256,
         "temperature": 0.1,
@@ -12,6 +14,15 @@ class EvalRequest(BaseModel):
     })
 
 
+class EvalRequest(EvalOptions):
+    adapter_path: str | None = None
+
+
+class MultiEvalRequest(EvalOptions):
+    # Adapter paths evaluated side by side on one resident base model; null is the base model
+    targets: list[str | None] = Field(min_length=1, max_length=8)
+
+
 class EvalMetrics(BaseModel):
     model_type: str
     exact_match_accuracy: float
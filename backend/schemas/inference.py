@@ -20,6 +20,7 @@ class InferenceResponse(BaseModel):
     output: str
     model_type: str  # "base" or "finetuned"
     generation_time_ms: float
+    cached: bool = False  # served from the prediction cache
 
 
 class CompareRequest(BaseModel):
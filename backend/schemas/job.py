@@ -0,0 +1,32 @@
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+from backend.schemas.evaluation import EvalRequest
+from backend.schemas.training import TrainingStartRequest
+
+
+class JobSubmitRequest(BaseModel):
+    kind: Literal["training", "evaluation"]
+    priority: int = Field(default=0, ge=-100, le=100)  # higher runs first
+    training: TrainingStartRequest | None = None
+    evaluation: EvalRequest | None = None
+
+
+class JobUpdateRequest(BaseModel):
+    priority: int = Field(ge=-100, le=100)
+
+
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    status: str
+    priority: int
+    payload: dict
+    result: dict | None = None
+    error: str | None = None
+    session_id: int | None = None
+    eval_run_id: int | None = None
+    created_at: str
+    started_at: str | None = None
+    finished_at: str | None = None
@@ -21,6 +21,8 @@ class SessionResponse(BaseModel):
     lora_config: str
     adapter_path: str | None
     dataset_path: str | None
+    checkpoint_dir: str | None = None
+    last_checkpoint_step: int | None = None
     created_at: str
     updated_at: str
 
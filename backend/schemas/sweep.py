@@ -0,0 +1,42 @@
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+from backend.schemas.training import LoRAConfigSchema, ModelConfigSchema, SFTConfigSchema
+
+
+class SweepParam(BaseModel):
+    # Either a list of values (grid, or sampled uniformly for random search)...
+    values: list | None = None
+    # ...or a range for random search
+    min: float | None = None
+    max: float | None = None
+    log: bool = False
+    integer: bool = False
+
+
+class SweepRequest(BaseModel):
+    name: str | None = None
+    strategy: Literal["grid", "random"] = "grid"
+    num_trials: int = Field(default=8, ge=1, le=100)  # random search only
+    seed: int = 0
+
+    # Base configs; search_space keys ("lora.r", "sft.learning_rate", ...) override fields
+    model_config_data: ModelConfigSchema = Field(default_factory=ModelConfigSchema)
+    sft_config: SFTConfigSchema = Field(default_factory=SFTConfigSchema)
+    lora_config: LoRAConfigSchema = Field(default_factory=LoRAConfigSchema)
+    search_space: dict[str, SweepParam]
+
+    # Successive halving: rungs at min_steps * eta**k steps
+    early_stopping: bool = True
+    eta: int = Field(default=3, ge=2, le=8)
+    min_steps: int = Field(default=10, ge=1, le=10000)
+
+    # Evaluate each finished trial's adapter; 0 disables
+    eval_sample_limit: int = Field(default=50, ge=0, le=100000)
+    classification_mode: bool = False
+    eval_generation_params: dict = Field(default_factory=lambda: {
+        "max_new_tokens": 256,
+        "temperature": 0.1,
+        "do_sample": False,
+    })
@@ -17,6 +17,15 @@ class SFTConfigSchema(BaseModel):
     fp16: bool = Field(default=False)
     bf16: bool = Field(default=True)
     use_epochs: bool = Field(default=False)
+    dataloader_num_workers: int = Field(default=0, ge=0, le=32)
+    dataloader_pin_memory: bool = Field(default=True)
+    dataloader_prefetch_factor: int | None = Field(default=None, ge=1, le=16)
+    cache_processed_samples: bool = Field(default=False)
+    group_by_length: bool = Field(default=False)
+    pack_text_rows: bool = Field(default=False)
+    token_budget: int | None = Field(default=None, ge=512, le=262144)
+    save_steps: int = Field(default=50, ge=0, le=10000)
+    save_total_limit: int = Field(default=2, ge=1, le=20)
 
 
 class LoRAConfigSchema(BaseModel):
@@ -41,6 +50,10 @@ class TrainingStartRequest(BaseModel):
     session_name: str | None = None
 
 
+class TrainingResumeRequest(BaseModel):
+    session_id: int
+
+
 class TrainingStatusResponse(BaseModel):
     status: str  # idle, loading_model, training, stopping, completed, error
     current_step: int = 0
@@ -49,6 +62,7 @@ class TrainingStatusResponse(BaseModel):
     learning_rate: float | None = None
     eta_seconds: float | None = None
     error_message: str | None = None
+    session_id: int | None = None
 
 
 class AdapterInfo(BaseModel):
@@ -0,0 +1,263 @@
+import bisect
+import logging
+import random
+import time
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Each megabatch spans this many batches; sorting happens within a megabatch
+_MEGABATCH_MULT = 50
+
+
+def pack_text_rows(
+    rows: list[tuple[str, str, list[str]]],
+    lengths: list[int],
+    max_tokens: int,
+) -> list[list[int]]:
+    """Group text-only rows into packs of at most max_tokens (best-fit decreasing).
+
+    Packed rows become consecutive turns of one sample, so they share attention
+    context — the same trade-off as classic constant-length packing. Rows with
+    images always stay alone. Open packs are kept sorted by remaining capacity,
+    so each row finds the tightest pack it fits with a binary search.
+    """
+    packs: list[list[int]] = []
+    text_only = []
+    for i, (_, _, image_urls) in enumerate(rows):
+        if image_urls or lengths[i] >= max_tokens:
+            packs.append([i])
+        else:
+            text_only.append(i)
+
+    bins: list[list[int]] = []
+    # (remaining capacity, bin index), ascending
+    free: list[tuple[int, int]] = []
+    for i in sorted(text_only, key=lambda i: lengths[i], reverse=True):
+        pos = bisect.bisect_left(free, (lengths[i], -1))
+        if pos < len(free):
+            remaining, b = free.pop(pos)
+            bins[b].append(i)
+        else:
+            remaining, b = max_tokens, len(bins)
+            bins.append([i])
+        bisect.insort(free, (remaining - lengths[i], b))
+    packs.extend(bins)
+    return packs
+
+
+def pack_lengths(packs: list[list[int]], lengths: list[int]) -> list[int]:
+    return [sum(lengths[i] for i in pack) for pack in packs]
+
+
+class LengthGroupedSampler:
+    """Random order with similar-length samples placed in the same batch.
+
+    Indices are shuffled, cut into megabatches of batch_size * 50, and each
+    megabatch is sorted by length, so batches are length-homogeneous while
+    the epoch order stays random. Reshuffles on every iteration.
+    """
+
+    def __init__(self, lengths: list[int], batch_size: int, seed: int = 0):
+        self._lengths = lengths
+        self._batch_size = batch_size
+        self._seed = seed
+        self._epoch = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def set_epoch(self, epoch: int):
+        self._epoch = epoch
+
+    def order(self, epoch: int) -> list[int]:
+        rng = random.Random(self._seed + epoch)
+        indices = list(range(len(self._lengths)))
+        rng.shuffle(indices)
+        size = self._batch_size * _MEGABATCH_MULT
+        ordered = []
+        for start in range(0, len(indices), size):
+            mega = indices[start:start + size]
+            ordered.extend(sorted(mega, key=lambda i: self._lengths[i], reverse=True))
+        return ordered
+
+    def __iter__(self):
+        order = self.order(self._epoch)
+        self._epoch += 1
+        return iter(order)
+
+
+def padding_ratio(lengths: list[int], order: list[int], batch_size: int) -> float:
+    """Fraction of batch token slots that would be padding for the given order."""
+    real = padded = 0
+    for start in range(0, len(order), batch_size):
+        batch = [lengths[i] for i in order[start:start + batch_size]]
+        real += sum(batch)
+        padded += max(batch) * len(batch)
+    return 1 - real / padded if padded else 0.0
+
+
+def batched_padding_ratio(lengths: list[int], batches: list[list[int]]) -> float:
+    """padding_ratio for explicit (variable-size) batches."""
+    real = sum(lengths[i] for batch in batches for i in batch)
+    padded = sum(max(lengths[i] for i in batch) * len(batch) for batch in batches)
+    return 1 - real / padded if padded else 0.0
+
+
+class TokenBudgetBatchSampler:
+    """Batches filled up to a token budget instead of a fixed sample count.
+
+    Samples are sorted by length and cut greedily so that
+    len(batch) * longest_in_batch stays within max_tokens; a sample longer
+    than the budget gets a batch of its own. Batch membership is fixed so
+    the number of steps per epoch is stable; only the batch order is
+    reshuffled every epoch.
+    """
+
+    def __init__(self, lengths: list[int], max_tokens: int, seed: int = 0):
+        self._seed = seed
+        self._epoch = 0
+        self._batches: list[list[int]] = []
+        batch: list[int] = []
+        longest = 0
+        for i in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+            longest_with = max(longest, lengths[i])
+            if batch and (len(batch) + 1) * longest_with > max_tokens:
+                self._batches.append(batch)
+                batch, longest_with = [], lengths[i]
+            batch.append(i)
+            longest = longest_with
+        if batch:
+            self._batches.append(batch)
+
+    def __len__(self) -> int:
+        return len(self._batches)
+
+    @property
+    def mean_batch_size(self) -> float:
+        return sum(len(b) for b in self._batches) / len(self._batches) if self._batches else 0.0
+
+    def set_epoch(self, epoch: int):
+        self._epoch = epoch
+
+    def order(self, epoch: int) -> list[list[int]]:
+        batches = list(self._batches)
+        random.Random(self._seed + epoch).shuffle(batches)
+        return batches
+
+    def __iter__(self):
+        order = self.order(self._epoch)
+        self._epoch += 1
+        return iter(order)
+
+
+class _Timer:
+    """Accumulates durations of GPU work via CUDA events, read only when summarised.
+
+    Events are recorded asynchronously, so timing never stalls the training
+    step; falls back to wall-clock time without CUDA.
+    """
+
+    def __init__(self):
+        self._cuda = torch.cuda.is_available()
+        self._pending: list[tuple] = []
+        self._start = None
+        self.seconds = 0.0
+
+    def start(self):
+        if self._cuda:
+            self._start = torch.cuda.Event(enable_timing=True)
+            self._start.record()
+        else:
+            self._start = time.perf_counter()
+
+    def stop(self):
+        if self._start is None:
+            return
+        if self._cuda:
+            end = torch.cuda.Event(enable_timing=True)
+            end.record()
+            self._pending.append((self._start, end))
+        else:
+            self.seconds += time.perf_counter() - self._start
+        self._start = None
+
+    def collect(self) -> float:
+        if self._pending:
+            self._pending[-1][1].synchronize()
+            self.seconds += sum(start.elapsed_time(end) for start, end in self._pending) / 1000
+            self._pending.clear()
+        seconds, self.seconds = self.seconds, 0.0
+        return seconds
+
+
+class BatchStats:
+    """Running totals of the batches the trainer consumed since the last log.
+
+    Besides batch shape and padding, tracks where the interval's time went:
+    waiting on the data loader, forward/backward compute, and optimizer
+    steps, plus text vs. vision token throughput and peak GPU memory.
+    """
+
+    def __init__(self, vision_token_ids: set[int] | None = None):
+        self._vision_token_ids = sorted(vision_token_ids or [])
+        self._vision_ids_on: dict[torch.device, torch.Tensor] = {}
+        self.compute = _Timer()
+        self.optimizer = _Timer()
+        self.reset()
+
+    def reset(self):
+        self.batches = 0
+        self.samples = 0
+        self.padded_tokens = 0
+        # Token counts stay on the batch's device until snapshot(), so record() never syncs
+        self._tokens = 0
+        self._vision_tokens = 0
+        self.data_wait = 0.0
+        self._interval_start = time.perf_counter()
+        if torch.cuda.is_available():
+            torch.cuda.reset_peak_memory_stats()
+
+    def record(self, inputs: dict):
+        input_ids = inputs["input_ids"]
+        self.batches += 1
+        self.samples += input_ids.shape[0]
+        self.padded_tokens += input_ids.numel()
+        mask = inputs.get("attention_mask")
+        self._tokens = self._tokens + (mask.sum() if mask is not None else input_ids.numel())
+        if self._vision_token_ids:
+            ids = self._vision_ids_on.get(input_ids.device)
+            if ids is None:
+                ids = self._vision_ids_on[input_ids.device] = torch.tensor(
+                    self._vision_token_ids, device=input_ids.device
+                )
+            self._vision_tokens = self._vision_tokens + torch.isin(input_ids, ids).sum()
+
+    def add_data_wait(self, seconds: float):
+        self.data_wait += seconds
+
+    def snapshot(self) -> dict:
+        """Per-interval summary for the training_step event; resets the totals."""
+        elapsed = time.perf_counter() - self._interval_start
+        compute = self.compute.collect()
+        optimizer = self.optimizer.collect()
+        tokens = int(self._tokens)
+        vision_tokens = int(self._vision_tokens)
+        text_tokens = tokens - vision_tokens
+        summary = {
+            "batch_size_avg": round(self.samples / self.batches, 2) if self.batches else None,
+            "tokens_per_batch": round(tokens / self.batches, 1) if self.batches else None,
+            "padding_ratio": round(1 - tokens / self.padded_tokens, 4) if self.padded_tokens else None,
+            "samples_per_sec": round(self.samples / elapsed, 3) if elapsed else None,
+            "tokens_per_sec": round(tokens / elapsed, 1) if elapsed else None,
+            "text_tokens_per_sec": round(text_tokens / elapsed, 1) if elapsed else None,
+            "vision_tokens_per_sec": round(vision_tokens / elapsed, 1) if elapsed else None,
+            "interval_seconds": round(elapsed, 4),
+            "data_wait_seconds": round(self.data_wait, 4),
+            "compute_seconds": round(compute, 4),
+            "optimizer_seconds": round(optimizer, 4),
+            "peak_memory_gb": round(torch.cuda.max_memory_allocated() / 1024**3, 3) if torch.cuda.is_available() else None,
+        }
+        self.reset()
+        return summary
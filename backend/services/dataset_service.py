@@ -1,8 +1,13 @@
+import contextlib
+import io
 import json
 import logging
+import os
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 
 from backend.config import settings
 from backend.schemas.dataset import ColumnMappingRequest
@@ -12,11 +17,21 @@ logger = logging.getLogger(__name__)
 
 _STATE_FILE = settings.data_dir / "dataset_state.json"
 
-# Module-level state for current dataset
-_current_df: pd.DataFrame | None = None
+# Rows parsed per chunk when converting an uploaded CSV
+_PARSE_CHUNK_ROWS = 50_000
+
+# Read size when draining the rest of an upload after parsing
+_UPLOAD_COPY_BYTES = 1024 * 1024
+
+# Module-level state for current dataset. The table is memory-mapped from an
+# Arrow IPC file written next to the uploaded CSV, so only the columns/rows
+# actually read are paged in.
+_current_table: pa.Table | None = None
 _current_mapping: ColumnMappingRequest | None = None
 _current_filename: str | None = None
 _current_file_path: str | None = None
+_current_column_stats: dict[str, dict] = {}
+_row_plan_cache: tuple[tuple, "RowPlan"] | None = None
 
 
 def _save_state():
@@ -31,47 +46,230 @@ def _save_state():
     _STATE_FILE.write_text(json.dumps(state))
 
 
+def _arrow_path(file_path: str) -> Path:
+    return Path(file_path).with_suffix(".arrow")
+
+
+def _stats_path(file_path: str) -> Path:
+    return Path(file_path).with_suffix(".stats.json")
+
+
+def _new_column_stats() -> dict:
+    return {"non_null": 0, "null": 0, "max_length": 0, "numeric": True, "integer": True}
+
+
+def _update_column_stats(stats: dict[str, dict], chunk: pd.DataFrame):
+    for col in chunk.columns:
+        values = chunk[col]
+        st = stats.setdefault(col, _new_column_stats())
+        non_null = int(values.notna().sum())
+        st["non_null"] += non_null
+        st["null"] += len(values) - non_null
+        if non_null:
+            st["max_length"] = max(st["max_length"], int(values.str.len().max()))
+        # Track the type read_csv would infer for the whole column, applied when rows are read
+        present = values.dropna().str.strip()
+        if st["numeric"] and len(present):
+            if pd.to_numeric(present, errors="coerce").isna().any():
+                st["numeric"] = st["integer"] = False
+            elif st["integer"] and not present.str.fullmatch(r"[+-]?\d+").all():
+                st["integer"] = False
+
+
+class _TeeReader(io.RawIOBase):
+    """Binary reader that copies everything read from src into dst."""
+
+    def __init__(self, src, dst):
+        self._src = src
+        self._dst = dst
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        data = self._src.read(len(b))
+        self._dst.write(data)
+        b[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+
+def _convert_csv(file_path: str, on_progress=None, upload=None) -> Path:
+    """Stream a CSV into an Arrow IPC file chunk by chunk.
+
+    Every column is stored as string so the schema can't change between
+    chunks; only one chunk is held in memory at a time. Column stats,
+    including the type read_csv would have inferred for the whole column,
+    are accumulated along the way and written to a sidecar JSON file.
+    With upload (a binary file object), the CSV is parsed from it and
+    saved to file_path in the same pass. on_progress(rows, bytes_read,
+    total_bytes) is called after each chunk.
+    """
+    dest = _arrow_path(file_path)
+    tmp = dest.with_suffix(".arrow.tmp")
+    stats: dict[str, dict] = {}
+    rows = 0
+    writer = None
+    try:
+        with contextlib.ExitStack() as stack:
+            if upload is None:
+                f = stack.enter_context(open(file_path, "rb"))
+                total_bytes = os.path.getsize(file_path)
+            else:
+                total_bytes = upload.seek(0, os.SEEK_END)
+                upload.seek(0)
+                out = stack.enter_context(open(file_path, "wb"))
+                f = _TeeReader(upload, out)
+            sink = stack.enter_context(pa.OSFile(str(tmp), "wb"))
+            for chunk in pd.read_csv(f, dtype=str, chunksize=_PARSE_CHUNK_ROWS):
+                if writer is None:
+                    schema = pa.schema([(col, pa.string()) for col in chunk.columns])
+                    writer = pa.ipc.new_file(sink, schema)
+                writer.write_batch(pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False))
+                _update_column_stats(stats, chunk)
+                rows += len(chunk)
+                if on_progress:
+                    on_progress(rows, f.tell(), total_bytes)
+            if upload is not None:
+                # Copy anything the parser didn't consume, so the saved CSV is complete
+                while f.read(_UPLOAD_COPY_BYTES):
+                    pass
+                out.flush()
+            if writer is None:
+                # Header-only CSV
+                columns = pd.read_csv(file_path, nrows=0).columns
+                writer = pa.ipc.new_file(sink, pa.schema([(col, pa.string()) for col in columns]))
+                stats = {col: _new_column_stats() for col in columns}
+            writer.close()
+        os.replace(tmp, dest)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        if upload is not None:
+            # A partial upload isn't a usable dataset
+            Path(file_path).unlink(missing_ok=True)
+        raise
+    _stats_path(file_path).write_text(json.dumps(stats))
+    return dest
+
+
+def _ensure_arrow(file_path: str, on_progress=None) -> Path:
+    """Arrow file for a CSV, converting only if it (or its stats sidecar) is missing or older than the CSV."""
+    arrow = _arrow_path(file_path)
+    stats = _stats_path(file_path)
+    csv_mtime = Path(file_path).stat().st_mtime
+    if arrow.exists() and stats.exists() and min(arrow.stat().st_mtime, stats.stat().st_mtime) >= csv_mtime:
+        # Sidecars written before type tracking need a fresh conversion
+        if all("numeric" in st for st in json.loads(stats.read_text()).values()):
+            return arrow
+    logger.info("Converting %s to Arrow", file_path)
+    return _convert_csv(file_path, on_progress)
+
+
+def _open_arrow(path: Path) -> pa.Table:
+    return pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+
+
+def _load_column_stats(file_path: str) -> dict[str, dict]:
+    path = _stats_path(file_path)
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def _to_frame(table: pa.Table) -> pd.DataFrame:
+    df = table.to_pandas()
+    # Arrow nulls come back as None in object columns; callers expect NaN as from read_csv
+    df = df.where(df.notna(), np.nan)
+    # Restore read_csv's numeric columns so values stringify as they did ("1", "1.0")
+    for col in df.columns:
+        st = _current_column_stats.get(col, {})
+        if st.get("numeric") and st.get("non_null"):
+            values = pd.to_numeric(df[col].str.strip())
+            df[col] = values.astype("int64" if st["integer"] and not st["null"] else "float64")
+    return df
+
+
 def restore_state():
     """Restore dataset + mapping from disk on startup."""
-    global _current_df, _current_mapping, _current_filename, _current_file_path
+    global _current_table, _current_mapping, _current_filename, _current_file_path, _current_column_stats
     if not _STATE_FILE.exists():
         return
     try:
         state = json.loads(_STATE_FILE.read_text())
         fp = state.get("file_path")
         if fp and Path(fp).exists():
-            _current_df = pd.read_csv(fp)
+            _current_table = _open_arrow(_ensure_arrow(fp))
+            _current_column_stats = _load_column_stats(fp)
             _current_file_path = fp
             _current_filename = state.get("filename", Path(fp).name)
-            logger.info("Restored dataset: %s (%d rows)", _current_filename, len(_current_df))
+            logger.info("Restored dataset: %s (%d rows)", _current_filename, _current_table.num_rows)
         mapping_data = state.get("mapping")
-        if mapping_data and _current_df is not None:
+        if mapping_data and _current_table is not None:
             _current_mapping = ColumnMappingRequest(**mapping_data)
             logger.info("Restored column mapping")
     except Exception:
         logger.exception("Failed to restore dataset state")
 
 
-def get_current_df() -> pd.DataFrame | None:
-    return _current_df
+def get_current_table() -> pa.Table | None:
+    return _current_table
+
+
+def get_columns() -> list[str]:
+    return _current_table.column_names if _current_table is not None else []
+
+
+def get_num_rows() -> int:
+    return _current_table.num_rows if _current_table is not None else 0
+
+
+def read_columns(columns: list[str], start: int = 0, stop: int | None = None) -> pd.DataFrame:
+    """Materialize only the given columns (and optionally a row range) as a DataFrame."""
+    if _current_table is None:
+        raise ValueError("No dataset loaded")
+    names = set(_current_table.column_names)
+    table = _current_table.select([c for c in dict.fromkeys(columns) if c in names])
+    stop = table.num_rows if stop is None else min(stop, table.num_rows)
+    return _to_frame(table.slice(start, max(0, stop - start)))
+
+
+def get_column_stats() -> dict[str, dict]:
+    return _current_column_stats
 
 
 def get_current_mapping() -> ColumnMappingRequest | None:
     return _current_mapping
 
 
+def get_current_file_path() -> str | None:
+    return _current_file_path
+
+
 def get_current_filename() -> str | None:
     return _current_filename
 
 
-def load_csv(file_path: str) -> pd.DataFrame:
-    global _current_df, _current_filename, _current_file_path
-    df = pd.read_csv(file_path)
-    _current_df = df
+def load_csv(file_path: str, on_progress=None, upload=None) -> pa.Table:
+    """Make file_path the current dataset.
+
+    With upload (the uploaded file object), the CSV is written to file_path
+    while it is parsed, instead of being saved first and read back.
+    """
+    global _current_table, _current_filename, _current_file_path, _current_column_stats, _row_plan_cache
+    if upload is not None:
+        arrow = _convert_csv(file_path, on_progress, upload)
+    else:
+        arrow = _ensure_arrow(file_path, on_progress)
+    table = _open_arrow(arrow)
+    _current_table = table
+    _current_column_stats = _load_column_stats(file_path)
+    _row_plan_cache = None
     _current_filename = Path(file_path).name
     _current_file_path = file_path
     _save_state()
-    return df
+    return table
 
 
 def set_mapping(mapping: ColumnMappingRequest):
@@ -81,14 +279,14 @@ def set_mapping(mapping: ColumnMappingRequest):
 
 
 def get_preview(page: int = 1, page_size: int = 20) -> dict:
-    if _current_df is None:
+    if _current_table is None:
         return {"rows": [], "total_rows": 0, "page": page, "page_size": page_size, "total_pages": 0}
 
-    total = len(_current_df)
+    total = _current_table.num_rows
     total_pages = max(1, (total + page_size - 1) // page_size)
     start = (page - 1) * page_size
     end = min(start + page_size, total)
-    rows = _current_df.iloc[start:end].fillna("").to_dict(orient="records")
+    rows = read_columns(_current_table.column_names, start, end).fillna("").to_dict(orient="records")
 
     return {
         "rows": rows,
@@ -99,83 +297,144 @@ def get_preview(page: int = 1, page_size: int = 20) -> dict:
     }
 
 
-def get_image_urls_for_row(row: pd.Series, mapping: ColumnMappingRequest) -> list[str]:
-    urls = []
+def _build_messages(prompt_text: str, response_text: str, image_items: list[dict]) -> list[dict]:
+    user_content = list(image_items)
+    user_content.append({"type": "text", "text": prompt_text})
+    return [
+        {"role": "user", "content": user_content},
+        {"role": "assistant", "content": [{"type": "text", "text": response_text}]},
+    ]
+
+
+class LazyConversationDataset:
+    """Map-style training dataset that downloads and decodes images on access.
+
+    Only each row's text and image URLs are held in memory, so host memory is
+    bounded by the batches being collated rather than by the dataset size.
+    Optional packs group several rows into one sample as consecutive turns.
+    """
+
+    def __init__(self, rows: list[tuple[str, str, list[str]]], packs: list[list[int]] | None = None):
+        self._rows = rows
+        self._packs = packs
+
+    def __len__(self) -> int:
+        return len(self._packs) if self._packs is not None else len(self._rows)
+
+    @property
+    def source_rows(self) -> list[tuple[str, str, list[str]]]:
+        return self._rows
+
+    def rows(self, idx: int) -> list[tuple[str, str, list[str]]]:
+        if self._packs is None:
+            return [self._rows[idx]]
+        return [self._rows[i] for i in self._packs[idx]]
+
+    def with_packs(self, packs: list[list[int]]) -> "LazyConversationDataset":
+        return LazyConversationDataset(self._rows, packs)
+
+    def __getitem__(self, idx: int) -> dict:
+        messages = []
+        for prompt_text, response_text, image_urls in self.rows(idx):
+            image_items = [{"type": "image", "image": img} for img in download_images(image_urls)]
+            messages.extend(_build_messages(prompt_text, response_text, image_items))
+        return {"messages": messages}
+
+
+class RowPlan:
+    """Per-row skip reasons and image URL lists for one dataset + mapping."""
+
+    def __init__(self, skip_reasons: list[str | None], image_urls: list[list[str]]):
+        self.skip_reasons = skip_reasons
+        self.image_urls = image_urls
+
+    @property
+    def num_skipped(self) -> int:
+        return sum(r is not None for r in self.skip_reasons)
+
+    def valid_indices(self, limit: int | None = None) -> list[int]:
+        reasons = self.skip_reasons if limit is None else self.skip_reasons[:limit]
+        return [i for i, r in enumerate(reasons) if r is None]
+
+
+def _empty_mask(df: pd.DataFrame, col: str) -> pd.Series:
+    # Empty means missing, blank after str() + strip, or the string "nan"
+    if col not in df.columns:
+        return pd.Series(True, index=df.index)
+    s = df[col].astype(str).str.strip()
+    return df[col].isna() | (s == "") | (s == "nan")
+
+
+def compute_row_plan(df: pd.DataFrame, mapping: ColumnMappingRequest) -> RowPlan:
+    """Skip reason (first empty required column) and image URLs for every row, vectorized."""
+    reasons = pd.Series(None, index=df.index, dtype=object)
+    for col in [mapping.prompt_column, mapping.response_column, *mapping.mandatory_columns]:
+        mask = _empty_mask(df, col) & reasons.isna()
+        reasons[mask] = f"empty: {col}"
+
+    image_urls: list[list[str]] = [[] for _ in range(len(df))]
     for col in mapping.image_url_columns:
-        val = str(row.get(col, "")).strip()
-        if not val or val == "nan":
+        if col not in df.columns:
             continue
+        values = df[col].astype(str).str.strip().where(~_empty_mask(df, col))
         if mapping.image_separator:
-            urls.extend([u.strip() for u in val.split(mapping.image_separator) if u.strip()])
+            parts = values.str.split(mapping.image_separator, regex=False)
+            col_urls = [
+                [u.strip() for u in p if u.strip()] if isinstance(p, list) else []
+                for p in parts
+            ]
         else:
-            urls.append(val)
-    return urls
-
-
-def build_conversation(row: pd.Series, mapping: ColumnMappingRequest, fetch_images: bool = False) -> dict:
-    prompt_text = str(row[mapping.prompt_column])
-    response_text = str(row[mapping.response_column])
-    image_urls = get_image_urls_for_row(row, mapping)
-
-    user_content = []
-    if image_urls and fetch_images:
-        images = download_images(image_urls)
-        for img in images:
-            user_content.append({"type": "image", "image": img})
-    elif image_urls:
-        for url in image_urls:
-            user_content.append({"type": "image"})
-    user_content.append({"type": "text", "text": prompt_text})
+            col_urls = [[v] if isinstance(v, str) else [] for v in values]
+        for urls, extra in zip(image_urls, col_urls):
+            urls.extend(extra)
 
-    messages = [
-        {"role": "user", "content": user_content},
-        {"role": "assistant", "content": [{"type": "text", "text": response_text}]},
-    ]
-    return {"messages": messages, "image_urls": image_urls}
+    return RowPlan(reasons.tolist(), image_urls)
 
 
-def check_row_mandatory(row: pd.Series, mapping: ColumnMappingRequest) -> str | None:
-    """Returns None if row is valid, or a reason string if a mandatory column is empty."""
-    for col in [mapping.prompt_column, mapping.response_column]:
-        val = str(row.get(col, "")).strip()
-        if not val or val == "nan":
-            return f"empty: {col}"
-    for col in mapping.mandatory_columns:
-        val = str(row.get(col, "")).strip()
-        if not val or val == "nan":
-            return f"empty: {col}"
-    return None
+def get_row_plan() -> RowPlan:
+    """Row plan for the current dataset + mapping, computed once and cached."""
+    global _row_plan_cache
+    if _current_table is None or _current_mapping is None:
+        raise ValueError("Dataset or mapping not set")
+    key = (_current_file_path, _current_mapping.model_dump_json())
+    if _row_plan_cache is None or _row_plan_cache[0] != key:
+        m = _current_mapping
+        df = read_columns([m.prompt_column, m.response_column, *m.mandatory_columns, *m.image_url_columns])
+        _row_plan_cache = (key, compute_row_plan(df, m))
+    return _row_plan_cache[1]
 
 
-def build_training_dataset() -> tuple[list[dict], int]:
-    if _current_df is None or _current_mapping is None:
+def build_training_dataset() -> tuple[LazyConversationDataset, int]:
+    if _current_table is None or _current_mapping is None:
         raise ValueError("Dataset or mapping not set")
 
-    dataset = []
-    num_skipped = 0
-    for _, row in _current_df.iterrows():
-        reason = check_row_mandatory(row, _current_mapping)
-        if reason:
-            num_skipped += 1
-            continue
-        conv = build_conversation(row, _current_mapping, fetch_images=True)
-        dataset.append({"messages": conv["messages"]})
-    return dataset, num_skipped
+    plan = get_row_plan()
+    df = read_columns([_current_mapping.prompt_column, _current_mapping.response_column])
+    prompts = df[_current_mapping.prompt_column].astype(str).tolist()
+    responses = df[_current_mapping.response_column].astype(str).tolist()
+    rows = [(prompts[i], responses[i], plan.image_urls[i]) for i in plan.valid_indices()]
+    return LazyConversationDataset(rows), plan.num_skipped
 
 
 def get_conversation_preview(start: int = 0, count: int = 5) -> list[dict]:
-    if _current_df is None or _current_mapping is None:
+    if _current_table is None or _current_mapping is None:
         return []
 
+    plan = get_row_plan()
+    end = min(start + count, _current_table.num_rows)
+    df = read_columns([_current_mapping.prompt_column, _current_mapping.response_column], start, end)
     previews = []
-    end = min(start + count, len(_current_df))
-    for i in range(start, end):
-        row = _current_df.iloc[i]
-        conv = build_conversation(row, _current_mapping, fetch_images=False)
-        image_urls = get_image_urls_for_row(row, _current_mapping)
+    for offset, i in enumerate(range(start, end)):
+        row = df.iloc[offset]
+        image_urls = plan.image_urls[i]
+        messages = _build_messages(
+            str(row[_current_mapping.prompt_column]),
+            str(row[_current_mapping.response_column]),
+            [{"type": "image"} for _ in image_urls],
+        )
         previews.append({
             "index": i,
-            "messages": conv["messages"],
+            "messages": messages,
             "image_urls": image_urls,
         })
     return previews
@@ -1,141 +1,529 @@
 import asyncio
+import json
 import logging
+import threading
+from pathlib import Path
 
+from sqlalchemy import insert, select, update
+
+from backend.config import settings
+from backend.database import async_session
+from backend.models.training_run import EvaluationRun, EvalSample
 from backend.services.model_manager import model_manager
-from backend.services.dataset_service import get_current_df, get_current_mapping, get_image_urls_for_row, check_row_mandatory
-from backend.services.inference_service import generate
-from backend.utils.metrics import compute_metrics, compute_classification_metrics
+from backend.services.dataset_service import (
+    get_current_file_path, get_current_mapping, get_current_table, get_row_plan, read_columns,
+)
+from backend.services.inference_service import generate, generate_batch, generate_multi
+from backend.services.length_index import load_length_index
+from backend.utils.image import prefetch_images
+from backend.utils.metrics import classification_summary, classify_pair, compute_metrics
 from backend.ws.manager import ws_manager
 
 logger = logging.getLogger(__name__)
 
+eval_status = {"running": False, "model_type": None}
+_stop_requested = threading.Event()
+
+
+def stop_evaluation() -> bool:
+    """Stop the running evaluation after its current batch; the run keeps its stored samples and can be resumed."""
+    if not eval_status["running"]:
+        return False
+    _stop_requested.set()
+    return True
 
-def run_evaluation(
+
+def _predict_batch(
+    rows: list[int],
+    prompts: list[str],
+    image_urls: list[list[str]],
     adapter_path: str | None,
-    sample_limit: int,
     generation_params: dict,
-    loop: asyncio.AbstractEventLoop,
-    classification_mode: bool = False,
-) -> dict:
-    """Run evaluation synchronously (called via asyncio.to_thread)."""
-    df = get_current_df()
+) -> list[dict]:
+    """{"output", "cached"} for rows, in order. A failed batch falls back to one row at a time."""
+    if len(rows) > 1:
+        try:
+            return generate_batch(
+                [prompts[i] for i in rows], [image_urls[i] for i in rows], adapter_path, generation_params
+            )
+        except Exception as e:
+            logger.warning("Eval batch of %d rows failed, retrying row by row: %s", len(rows), e)
+
+    predictions = []
+    for i in rows:
+        try:
+            predictions.append(generate(
+                prompt=prompts[i],
+                image_urls=image_urls[i],
+                adapter_path=adapter_path,
+                generation_params=generation_params,
+            ))
+        except Exception as e:
+            logger.warning("Eval sample %d failed: %s", i, e)
+            predictions.append({"output": "", "cached": False})
+    return predictions
+
+
+def _eval_batches(valid: list[int], prompts: list[str], batch_size: int, group_by_length: bool):
+    """Yield the rows of each batch, ending early once a stop is requested."""
+    batch_size = max(1, batch_size)
+    order = valid
+    if group_by_length and batch_size > 1:
+        # Rows of similar prompt length share a batch so less of it is padding
+        lengths = _prompt_lengths(prompts)
+        order = sorted(valid, key=lambda i: lengths[i])
+    for start in range(0, len(order), batch_size):
+        if _stop_requested.is_set():
+            return
+        yield order[start:start + batch_size]
+
+
+def _prompt_lengths(prompts: list[str]) -> list[int]:
+    """Estimated prompt tokens (text + vision) per row, else prompt characters.
+
+    The index is only used if it covers exactly the current dataset's rows;
+    anything else falls back rather than sorting on another file's lengths.
+    """
+    index = load_length_index(model_manager.model_name or settings.default_model_name)
+    table = get_current_table()
+    if index is not None and table is not None and index.num_rows == table.num_rows >= len(prompts):
+        prompt_tokens = index.column("prompt_tokens").to_numpy()[:len(prompts)]
+        vision_tokens = index.column("vision_tokens").to_numpy()[:len(prompts)]
+        return (prompt_tokens + vision_tokens).tolist()
+    return [len(p) for p in prompts]
+
+
+class _RunTotals:
+    """Running metric totals of an evaluation run, mirrored in its EvaluationRun row."""
+
+    _SUMS = ("exact_match", "token_precision", "token_recall", "token_f1")
+    _CELLS = ("tp", "fp", "tn", "fn")
+
+    def __init__(self, run: EvaluationRun):
+        self.num_samples = run.num_samples or 0
+        self.num_skipped = run.num_skipped or 0
+        self.num_evaluated = run.num_evaluated or 0
+        self.sums = {key: getattr(run, f"sum_{key}") or 0.0 for key in self._SUMS}
+        self.confusion = {cell: getattr(run, f"cls_{cell}") or 0 for cell in self._CELLS}
+        self.cls_skipped = run.cls_skipped or 0
+        self.num_cached = run.num_cached or 0
+
+    def add(self, sample: dict):
+        self.num_samples += 1
+        if sample["skipped"]:
+            self.num_skipped += 1
+            return
+        self.num_evaluated += 1
+        for key in self._SUMS:
+            self.sums[key] += sample[key]
+        cell = classify_pair(sample["prediction"], sample["ground_truth"])
+        if cell is None:
+            self.cls_skipped += 1
+        else:
+            self.confusion[cell] += 1
+
+    def metrics(self, model_type: str) -> dict:
+        n = self.num_evaluated or 1
+        return {
+            "model_type": model_type,
+            "exact_match_accuracy": round(self.sums["exact_match"] / n, 4),
+            "token_precision": round(self.sums["token_precision"] / n, 4),
+            "token_recall": round(self.sums["token_recall"] / n, 4),
+            "token_f1": round(self.sums["token_f1"] / n, 4),
+            "num_samples": self.num_samples,
+            "num_skipped": self.num_skipped,
+            "num_cached": self.num_cached,
+        }
+
+    def classification_metrics(self, model_type: str) -> dict:
+        return {**classification_summary(**self.confusion, skipped=self.cls_skipped), "model_type": model_type}
+
+    def columns(self) -> dict:
+        """EvaluationRun column values for the current totals."""
+        metrics = self.metrics("")
+        cls = self.classification_metrics("")
+        return {
+            "num_samples": self.num_samples,
+            "num_skipped": self.num_skipped,
+            "num_evaluated": self.num_evaluated,
+            "num_cached": self.num_cached,
+            **{f"sum_{key}": value for key, value in self.sums.items()},
+            "exact_match_accuracy": metrics["exact_match_accuracy"],
+            "token_precision": metrics["token_precision"],
+            "token_recall": metrics["token_recall"],
+            "token_f1": metrics["token_f1"],
+            "cls_accuracy": cls["accuracy"],
+            "cls_precision": cls["precision"],
+            "cls_recall": cls["recall"],
+            "cls_f1": cls["f1"],
+            **{f"cls_{cell}": count for cell, count in self.confusion.items()},
+            "cls_skipped": self.cls_skipped,
+        }
+
+
+async def _persist_samples(run_id: int, samples: list[dict], columns: dict):
+    """Store a chunk of samples and the run's updated totals in one transaction."""
+    async with async_session() as db:
+        await db.execute(insert(EvalSample), [
+            {
+                "eval_run_id": run_id,
+                "sample_index": s["index"],
+                "prompt": s["prompt"],
+                "ground_truth": s["ground_truth"],
+                "prediction": s["prediction"],
+                "image_urls": json.dumps(s["image_urls"]),
+                "exact_match": s["exact_match"],
+                "token_precision": s["token_precision"],
+                "token_recall": s["token_recall"],
+                "token_f1": s["token_f1"],
+                "skipped": 1 if s["skipped"] else 0,
+                "skipped_reason": s["skipped_reason"],
+            }
+            for s in samples
+        ])
+        await db.execute(update(EvaluationRun).where(EvaluationRun.id == run_id).values(**columns))
+        await db.commit()
+
+
+class _RunRecorder:
+    """Collects an evaluation run's new samples and stores them in chunks with its totals."""
+
+    def __init__(self, run: EvaluationRun, loop: asyncio.AbstractEventLoop):
+        self.run = run
+        self.totals = _RunTotals(run)
+        self._loop = loop
+        self._pending: list[dict] = []
+
+    def record(self, sample: dict, cached: bool = False):
+        self.totals.add(sample)
+        if cached:
+            self.totals.num_cached += 1
+        self._pending.append(sample)
+
+    def flush(self, force: bool = True):
+        """Store pending samples; unless force, only once eval_flush_rows have built up."""
+        if not self._pending or (not force and len(self._pending) < settings.eval_flush_rows):
+            return
+        asyncio.run_coroutine_threadsafe(
+            _persist_samples(self.run.id, self._pending, self.totals.columns()), self._loop
+        ).result()
+        self._pending = []
+
+    def result(self) -> dict:
+        totals = self.totals
+        model_type = self.run.model_type
+        if totals.num_cached:
+            logger.info("Eval run #%d: %d of %d predictions served from the prediction cache",
+                        self.run.id, totals.num_cached, totals.num_evaluated)
+        if totals.num_skipped > 0:
+            logger.info("Eval run #%d: %d evaluated, %d skipped due to mandatory columns",
+                        self.run.id, totals.num_evaluated, totals.num_skipped)
+
+        result_data: dict = {
+            "model_type": model_type,
+            "metrics": totals.metrics(model_type),
+        }
+        if self.run.eval_mode == "classification":
+            result_data["classification_metrics"] = totals.classification_metrics(model_type)
+        return result_data
+
+
+def _eval_rows(sample_limit: int):
+    """(prompts, ground truths, row plan) for the first sample_limit rows of the current dataset."""
+    table = get_current_table()
     mapping = get_current_mapping()
 
-    if df is None or mapping is None:
+    if table is None or mapping is None:
         raise ValueError("Dataset and mapping must be set before evaluation")
 
     gt_col = mapping.ground_truth_column or mapping.response_column
 
-    eval_df = df.head(sample_limit)
-    total = len(eval_df)
+    eval_df = read_columns([mapping.prompt_column, gt_col], 0, sample_limit)
+    prompts = eval_df[mapping.prompt_column].astype(str).tolist()
+    ground_truths = eval_df[gt_col].astype(str).tolist()
+    return prompts, ground_truths, get_row_plan()
+
+
+def _sample(i: int, prompts: list[str], ground_truths: list[str], plan, prediction: str | None = None) -> dict:
+    """Sample record for row i; rows with a skip reason get an empty prediction and zero scores."""
+    skip_reason = plan.skip_reasons[i]
+    sample = {
+        "index": i,
+        "prompt": prompts[i],
+        "ground_truth": ground_truths[i],
+        "prediction": "" if skip_reason else prediction,
+        "image_urls": plan.image_urls[i],
+        "skipped": bool(skip_reason),
+        "skipped_reason": skip_reason,
+    }
+    if skip_reason:
+        sample.update({"exact_match": 0.0, "token_precision": 0.0, "token_recall": 0.0, "token_f1": 0.0})
+    else:
+        sample.update(compute_metrics(prediction, ground_truths[i]))
+    return sample
+
+
+def run_evaluation(run: EvaluationRun, done_indices: set[int], loop: asyncio.AbstractEventLoop) -> dict:
+    """Run evaluation synchronously (called via asyncio.to_thread).
+
+    Rows in done_indices were stored by an earlier attempt and are not
+    generated again. New samples are written to eval_samples every
+    eval_flush_rows rows together with the run's running totals, so at most
+    one chunk is lost if the process dies. With batch_size > 1, rows are
+    generated in left-padded batches.
+    """
+    prompts, ground_truths, plan = _eval_rows(run.sample_limit)
+    total = len(prompts)
+    valid = [i for i in plan.valid_indices(total) if i not in done_indices]
+    generation_params = json.loads(run.generation_params)
+    recorder = _RunRecorder(run, loop)
+
+    # Check mandatory columns — skipped rows are stored with an empty prediction
+    for i in range(total):
+        if i not in done_indices and plan.skip_reasons[i]:
+            recorder.record(_sample(i, prompts, ground_truths, plan))
+    recorder.flush()
+
+    if done_indices:
+        logger.info("Resuming eval run #%d: %d of %d rows already stored", run.id, len(done_indices), total)
 
-    model_type = "finetuned" if adapter_path else "base"
-    samples = []
-    all_predictions = []
-    all_ground_truths = []
-    total_em = 0.0
-    total_precision = 0.0
-    total_recall = 0.0
-    total_f1 = 0.0
-    num_skipped = 0
-    num_evaluated = 0
+    # Start downloading images for the remaining rows in the background so fetches overlap generation
+    prefetch_images([url for i in valid for url in plan.image_urls[i]])
 
     # Broadcast progress every N samples to avoid flooding the browser
     broadcast_interval = max(1, total // 20)  # ~20 updates total
+    last_broadcast = 0
 
-    for i, (_, row) in enumerate(eval_df.iterrows()):
-        prompt_text = str(row[mapping.prompt_column])
-        ground_truth = str(row[gt_col])
-        image_urls = get_image_urls_for_row(row, mapping)
-
-        # Check mandatory columns — skip but preserve row slot
-        skip_reason = check_row_mandatory(row, mapping)
-        if skip_reason:
-            num_skipped += 1
-            samples.append({
-                "index": i,
-                "prompt": prompt_text,
-                "ground_truth": ground_truth,
-                "prediction": "",
-                "image_urls": image_urls,
-                "exact_match": 0.0,
-                "token_precision": 0.0,
-                "token_recall": 0.0,
-                "token_f1": 0.0,
-                "skipped": True,
-                "skipped_reason": skip_reason,
-            })
-            # Still broadcast progress for skipped rows
-            if (i + 1) % broadcast_interval == 0 or i == total - 1:
-                ws_manager.broadcast_sync("eval_progress", {
-                    "current": i + 1,
-                    "total": total,
-                    "model_type": model_type,
-                }, loop)
-            continue
-
-        try:
-            result = generate(
-                prompt=prompt_text,
-                image_urls=image_urls,
-                adapter_path=adapter_path,
-                generation_params=generation_params,
-            )
-            prediction = result["output"]
-        except Exception as e:
-            logger.warning("Eval sample %d failed: %s", i, e)
-            prediction = ""
-
-        all_predictions.append(prediction)
-        all_ground_truths.append(ground_truth)
-
-        metrics = compute_metrics(prediction, ground_truth)
-        num_evaluated += 1
-        total_em += metrics["exact_match"]
-        total_precision += metrics["token_precision"]
-        total_recall += metrics["token_recall"]
-        total_f1 += metrics["token_f1"]
-
-        samples.append({
-            "index": i,
-            "prompt": prompt_text,
-            "ground_truth": ground_truth,
-            "prediction": prediction,
-            "image_urls": image_urls,
-            "skipped": False,
-            "skipped_reason": None,
-            **metrics,
-        })
+    for rows in _eval_batches(valid, prompts, run.batch_size, bool(run.group_by_length)):
+        predictions = _predict_batch(rows, prompts, plan.image_urls, run.adapter_path, generation_params)
+        for i, result in zip(rows, predictions):
+            recorder.record(_sample(i, prompts, ground_truths, plan, result["output"]), result["cached"])
+        recorder.flush(force=False)
 
         # Throttled progress broadcast
-        if (i + 1) % broadcast_interval == 0 or i == total - 1:
+        done = recorder.totals.num_samples
+        if done - last_broadcast >= broadcast_interval or done == total:
+            last_broadcast = done
             ws_manager.broadcast_sync("eval_progress", {
-                "current": i + 1,
+                "current": done,
                 "total": total,
-                "model_type": model_type,
+                "model_type": run.model_type,
+                "run_id": run.id,
+                "cached": recorder.totals.num_cached,
             }, loop)
+    recorder.flush()
+    return {**recorder.result(), "stopped": _stop_requested.is_set()}
 
-    n = num_evaluated or 1
-    if num_skipped > 0:
-        logger.info("Evaluation: %d evaluated, %d skipped due to mandatory columns", num_evaluated, num_skipped)
 
-    result_data: dict = {
-        "model_type": model_type,
-        "metrics": {
-            "model_type": model_type,
-            "exact_match_accuracy": round(total_em / n, 4),
-            "token_precision": round(total_precision / n, 4),
-            "token_recall": round(total_recall / n, 4),
-            "token_f1": round(total_f1 / n, 4),
-            "num_samples": len(samples),
-            "num_skipped": num_skipped,
-        },
-        "samples": samples,
-    }
+def _predict_targets(
+    rows: list[int],
+    prompts: list[str],
+    image_urls: list[list[str]],
+    targets: list[str | None],
+    generation_params: dict,
+) -> list[list[dict]]:
+    """{"output", "cached"} per target for rows, in order. A failed batch falls back to one row at a time."""
+    try:
+        return generate_multi([prompts[i] for i in rows], [image_urls[i] for i in rows], targets, generation_params)
+    except Exception as e:
+        if len(rows) == 1:
+            logger.warning("Eval sample %d failed: %s", rows[0], e)
+            return [[{"output": "", "cached": False}] for _ in targets]
+        logger.warning("Eval batch of %d rows failed, retrying row by row: %s", len(rows), e)
+    per_row = [_predict_targets([i], prompts, image_urls, targets, generation_params) for i in rows]
+    return [[row[t][0] for row in per_row] for t in range(len(targets))]
+
+
+def run_multi_evaluation(runs: list[EvaluationRun], loop: asyncio.AbstractEventLoop) -> list[dict]:
+    """Evaluate several targets over the same rows in one pass (called via asyncio.to_thread).
+
+    runs share everything but adapter_path. The base model stays resident
+    with every adapter attached; each batch's images and inputs are prepared
+    once and generated once per target by switching the active adapter.
+    Returns one result per run, in order.
+    """
+    first = runs[0]
+    prompts, ground_truths, plan = _eval_rows(first.sample_limit)
+    total = len(prompts)
+    valid = plan.valid_indices(total)
+    generation_params = json.loads(first.generation_params)
+    targets = [run.adapter_path for run in runs]
+    recorders = [_RunRecorder(run, loop) for run in runs]
+
+    for i in range(total):
+        if plan.skip_reasons[i]:
+            sample = _sample(i, prompts, ground_truths, plan)
+            for recorder in recorders:
+                recorder.record(sample)
+    for recorder in recorders:
+        recorder.flush()
+
+    prefetch_images([url for i in valid for url in plan.image_urls[i]])
+
+    broadcast_interval = max(1, total // 20)
+    done = total - len(valid)
+    last_broadcast = 0
+
+    for rows in _eval_batches(valid, prompts, first.batch_size, bool(first.group_by_length)):
+        per_target = _predict_targets(rows, prompts, plan.image_urls, targets, generation_params)
+        for recorder, results in zip(recorders, per_target):
+            for i, result in zip(rows, results):
+                recorder.record(_sample(i, prompts, ground_truths, plan, result["output"]), result["cached"])
+            recorder.flush(force=False)
+
+        done += len(rows)
+        if done - last_broadcast >= broadcast_interval or done == total:
+            last_broadcast = done
+            ws_manager.broadcast_sync("eval_progress", {
+                "current": done,
+                "total": total,
+                "model_type": "multi",
+                "run_ids": [run.id for run in runs],
+            }, loop)
+
+    for recorder in recorders:
+        recorder.flush()
+    stopped = _stop_requested.is_set()
+    return [{**recorder.result(), "stopped": stopped} for recorder in recorders]
+
 
-    if classification_mode:
-        cls_metrics = compute_classification_metrics(all_predictions, all_ground_truths)
-        cls_metrics["model_type"] = model_type
-        result_data["classification_metrics"] = cls_metrics
+def check_targets(targets: list[str | None]):
+    """Raise ValueError unless targets are distinct, existing adapters (or None) on one base model."""
+    if len(set(targets)) != len(targets):
+        raise ValueError("Each target can only be evaluated once")
+    base_models = set()
+    for path in targets:
+        if path is None:
+            continue
+        if not (Path(path) / "adapter_config.json").exists():
+            raise ValueError(f"Adapter not found: {path}")
+        base_models.add(model_manager._adapter_base_model(path))
+    if len(base_models) > 1:
+        raise ValueError("All adapters must be trained on the same base model")
+
+
+async def create_eval_run(req: dict) -> int:
+    """Create a running EvaluationRun for an EvalRequest on the current dataset. Returns its ID."""
+    mapping = get_current_mapping()
+    async with async_session() as db:
+        run = EvaluationRun(
+            session_id=None,
+            adapter_path=req.get("adapter_path"),
+            model_type="finetuned" if req.get("adapter_path") else "base",
+            eval_mode="classification" if req.get("classification_mode") else "token",
+            status="running",
+            dataset_path=get_current_file_path(),
+            dataset_config=json.dumps(mapping.model_dump() if mapping else {}),
+            sample_limit=req["sample_limit"],
+            generation_params=json.dumps(req["generation_params"]),
+            batch_size=req.get("batch_size", 1),
+            group_by_length=1 if req.get("group_by_length") else 0,
+        )
+        db.add(run)
+        await db.commit()
+        return run.id
+
+
+async def check_resumable(run_id: int) -> str:
+    """The model_type of a run that can be resumed with the current dataset.
+
+    Raises LookupError if the run doesn't exist, ValueError if it can't be resumed now.
+    """
+    async with async_session() as db:
+        run = await db.get(EvaluationRun, run_id)
+    if run is None:
+        raise LookupError("Evaluation run not found")
+    if run.status == "completed":
+        raise ValueError("Evaluation run already completed")
+    # Stored samples are indexed by row, so both the file and the mapping must be the same
+    mapping = get_current_mapping()
+    if (
+        run.dataset_path is None
+        or run.dataset_path != get_current_file_path()
+        or run.dataset_config is None
+        or json.loads(run.dataset_config) != (mapping.model_dump() if mapping else {})
+    ):
+        raise ValueError("Load the run's dataset and column mapping before resuming")
+    return run.model_type
+
+
+async def _set_run_status(run_id: int, status: str):
+    async with async_session() as db:
+        await db.execute(update(EvaluationRun).where(EvaluationRun.id == run_id).values(status=status))
+        await db.commit()
+
+
+async def mark_interrupted_runs():
+    """Evaluations that were running when the backend went down can be resumed; flag them."""
+    async with async_session() as db:
+        await db.execute(
+            update(EvaluationRun).where(EvaluationRun.status == "running").values(status="interrupted")
+        )
+        await db.commit()
+
+
+async def run_evaluation_job(run_id: int, loop: asyncio.AbstractEventLoop) -> dict:
+    """Evaluate the rows of an EvaluationRun that aren't stored yet and broadcast eval_complete.
+
+    Works for new runs (see create_eval_run) and for resuming interrupted,
+    stopped or failed ones. Returns the eval_complete payload (metrics, run_id
+    and whether stop_evaluation ended it early).
+    """
+    async with async_session() as db:
+        run = await db.get(EvaluationRun, run_id)
+        done_indices = set((await db.execute(
+            select(EvalSample.sample_index).where(EvalSample.eval_run_id == run_id)
+        )).scalars().all())
+
+    eval_status["running"] = True
+    eval_status["model_type"] = run.model_type
+    _stop_requested.clear()
+    try:
+        await _set_run_status(run_id, "running")
+        try:
+            result = await asyncio.to_thread(run_evaluation, run, done_indices, loop)
+        except Exception:
+            await _set_run_status(run_id, "failed")
+            raise
+        status = "stopped" if result["stopped"] else "completed"
+        await _set_run_status(run_id, status)
+        logger.info("Eval run #%d (%s) %s with %d samples",
+                    run_id, run.eval_mode, status, result["metrics"]["num_samples"])
+
+        # Broadcast completion with just metrics (no samples — those are in the DB)
+        payload: dict = {**result, "run_id": run_id}
+        await ws_manager.broadcast("eval_complete", payload)
+        return payload
+    finally:
+        eval_status["running"] = False
+
+
+async def run_multi_evaluation_job(run_ids: list[int], loop: asyncio.AbstractEventLoop) -> list[dict]:
+    """Evaluate runs created for several targets in one pass; broadcasts eval_complete for each.
+
+    Returns the eval_complete payloads, in run order.
+    """
+    async with async_session() as db:
+        runs = [await db.get(EvaluationRun, run_id) for run_id in run_ids]
+
+    eval_status["running"] = True
+    eval_status["model_type"] = "multi"
+    _stop_requested.clear()
+    try:
+        try:
+            results = await asyncio.to_thread(run_multi_evaluation, runs, loop)
+        except Exception:
+            for run_id in run_ids:
+                await _set_run_status(run_id, "failed")
+            raise
 
-    return result_data
+        payloads = []
+        for run_id, result in zip(run_ids, results):
+            await _set_run_status(run_id, "stopped" if result["stopped"] else "completed")
+            payload = {**result, "run_id": run_id}
+            await ws_manager.broadcast("eval_complete", payload)
+            payloads.append(payload)
+        logger.info("Multi-target evaluation %s: runs %s", "stopped" if results[0]["stopped"] else "completed", run_ids)
+        return payloads
+    finally:
+        eval_status["running"] = False
@@ -3,50 +3,108 @@ import time
 
 import torch
 
+from backend.config import settings
 from backend.services.model_manager import model_manager
-from backend.utils.image import download_images
+from backend.services.prediction_cache import cacheable_params, prediction_cache
+from backend.utils.image import download_images, image_fingerprint
 
 logger = logging.getLogger(__name__)
 
 
-def generate(
-    prompt: str,
-    image_urls: list[str],
-    adapter_path: str | None = None,
-    generation_params: dict | None = None,
-) -> dict:
+def _prepare_model(adapter_path: str | None) -> str:
+    """Make the requested adapter (or the base model) active for inference. Returns the model type."""
     if model_manager.is_training:
         raise RuntimeError("Model is currently training")
 
-    gen_params = generation_params or {}
-
-    # Load adapter if specified and different from current
-    if adapter_path:
-        if model_manager._current_adapter_path != adapter_path:
-            model_manager.load_adapter(adapter_path)
-        model_type = "finetuned"
-    else:
-        # Base model requested — reload if adapter is currently loaded
-        if not model_manager.is_loaded or model_manager._current_adapter_path is not None:
-            model_manager.load_model()
-        model_type = "base"
+    # Switch the active adapter of the resident base model (adapters disabled for base)
+    if not model_manager.is_loaded or model_manager._current_adapter_path != adapter_path:
+        model_manager.activate_adapter(adapter_path)
+    model_type = "finetuned" if adapter_path else "base"
 
     if model_manager.status != "inference":
         model_manager.for_inference()
+    return model_type
 
-    # Build messages
-    user_content = []
-    images = []
-    if image_urls:
-        images = download_images(image_urls)
-        for _ in images:
-            user_content.append({"type": "image"})
-    user_content.append({"type": "text", "text": prompt})
 
+def _chat_text(prompt: str, num_images: int) -> str:
+    user_content = [{"type": "image"} for _ in range(num_images)]
+    user_content.append({"type": "text", "text": prompt})
     messages = [{"role": "user", "content": user_content}]
+    return model_manager.tokenizer.apply_chat_template(messages, add_generation_prompt=True)
 
+
+def _generation_kwargs(gen_params: dict) -> dict:
+    return {
+        "max_new_tokens": gen_params.get("max_new_tokens", 256),
+        "temperature": gen_params.get("temperature", 0.7),
+        "top_p": gen_params.get("top_p", 0.9),
+        "min_p": gen_params.get("min_p", 0.0),
+        "do_sample": gen_params.get("do_sample", True),
+        "use_cache": True,
+    }
+
+
+def _base_model_for(adapter_path: str | None) -> str:
+    """Base model that _prepare_model leaves loaded for adapter_path."""
+    if adapter_path:
+        return model_manager._adapter_base_model(adapter_path) or model_manager.model_name or settings.default_model_name
+    return model_manager.model_name or settings.default_model_name
+
+
+def _cache_keys(
+    prompts: list[str],
+    image_urls: list[list[str]],
+    adapter_path: str | None,
+    gen_kwargs: dict,
+    base_model: str | None = None,
+    batched: bool = False,
+) -> tuple[str, str, list[str]] | None:
+    """(base model, adapter hash, prediction cache key per row), or None if outputs can't be cached.
+
+    Left-padded batches change the numerics enough that greedy outputs can
+    differ from single-row generation, so the two are cached separately.
+    """
+    params = cacheable_params(gen_kwargs)
+    if not settings.prediction_cache_enabled or params is None:
+        return None
+    if batched:
+        params = {**params, "batched": True}
+    base_model = base_model or _base_model_for(adapter_path)
+    adapter_hash = prediction_cache.adapter_hash(adapter_path)
+    keys = [
+        prediction_cache.key_for(
+            base_model, adapter_hash, prompt, [image_fingerprint(u.strip()) for u in urls if u.strip()], params
+        )
+        for prompt, urls in zip(prompts, image_urls)
+    ]
+    return base_model, adapter_hash, keys
+
+
+def generate(
+    prompt: str,
+    image_urls: list[str],
+    adapter_path: str | None = None,
+    generation_params: dict | None = None,
+) -> dict:
+    gen_kwargs = _generation_kwargs(generation_params or {})
+
+    # Deterministic decoding of inputs seen before: answer without touching the model
+    cache = _cache_keys([prompt], [image_urls], adapter_path, gen_kwargs)
+    if cache is not None:
+        cached = prediction_cache.get(cache[2][0])
+        if cached is not None:
+            return {
+                "output": cached,
+                "model_type": "finetuned" if adapter_path else "base",
+                "generation_time_ms": 0.0,
+                "cached": True,
+            }
+
+    model_type = _prepare_model(adapter_path)
+
+    images = download_images(image_urls) if image_urls else []
+    input_text = _chat_text(prompt, len(images))
     tokenizer = model_manager.tokenizer
-    input_text = tokenizer.apply_chat_template(messages, add_generation_prompt=True)
 
     # Tokenize with images — no truncation during inference to avoid
     # cutting off image tokens (vision models expand images to thousands of tokens)
@@ -67,24 +125,137 @@ def generate(
         ).to("cuda")
 
     start = time.time()
-    output = model_manager.generate(
-        inputs,
-        max_new_tokens=gen_params.get("max_new_tokens", 256),
-        temperature=gen_params.get("temperature", 0.7),
-        top_p=gen_params.get("top_p", 0.9),
-        min_p=gen_params.get("min_p", 0.0),
-        do_sample=gen_params.get("do_sample", True),
-        use_cache=True,
-    )
+    output = model_manager.generate(inputs, **gen_kwargs)
     elapsed_ms = (time.time() - start) * 1000
 
+    if cache is not None:
+        base_model, adapter_hash, keys = cache
+        prediction_cache.put(keys[0], output, base_model, adapter_hash, adapter_path)
+
     return {
         "output": output,
         "model_type": model_type,
         "generation_time_ms": round(elapsed_ms, 1),
+        "cached": False,
     }
 
 
+def generate_batch(
+    prompts: list[str],
+    image_urls: list[list[str]],
+    adapter_path: str | None = None,
+    generation_params: dict | None = None,
+) -> list[dict]:
+    """Generate for several prompts, in order, as {"output", "cached"} per row.
+
+    Rows found in the prediction cache are answered from it; the rest go
+    through one left-padded model.generate call.
+    """
+    gen_kwargs = _generation_kwargs(generation_params or {})
+    results: list[dict | None] = [None] * len(prompts)
+
+    cache = _cache_keys(prompts, image_urls, adapter_path, gen_kwargs, batched=True)
+    if cache is not None:
+        for i, key in enumerate(cache[2]):
+            cached = prediction_cache.get(key)
+            if cached is not None:
+                results[i] = {"output": cached, "cached": True}
+
+    misses = [i for i, r in enumerate(results) if r is None]
+    if misses:
+        outputs = _generate_padded(
+            [prompts[i] for i in misses], [image_urls[i] for i in misses], adapter_path, gen_kwargs
+        )
+        for i, output in zip(misses, outputs):
+            results[i] = {"output": output, "cached": False}
+            if cache is not None:
+                base_model, adapter_hash, keys = cache
+                prediction_cache.put(keys[i], output, base_model, adapter_hash, adapter_path)
+    return results
+
+
+def _generate_padded(
+    prompts: list[str],
+    image_urls: list[list[str]],
+    adapter_path: str | None,
+    gen_kwargs: dict,
+) -> list[str]:
+    """One left-padded model.generate call over all prompts."""
+    _prepare_model(adapter_path)
+    return model_manager.generate_batch(_padded_inputs(prompts, image_urls), **gen_kwargs)
+
+
+def _padded_inputs(prompts: list[str], image_urls: list[list[str]]) -> dict:
+    """Left-padded processor inputs for a batch, on the GPU.
+
+    Rows may mix image and text-only prompts; the processor assigns the flat
+    image list to rows in order of their image placeholders.
+    """
+    row_images = [download_images(urls) if urls else [] for urls in image_urls]
+    texts = [_chat_text(prompt, len(images)) for prompt, images in zip(prompts, row_images)]
+    flat_images = [img for images in row_images for img in images]
+
+    # Generation continues from the end of each row, so prompts must be right-aligned.
+    # Passed per call rather than set on the shared processor, which other requests use concurrently.
+    return model_manager.tokenizer(
+        text=texts,
+        images=flat_images or None,
+        padding=True,
+        padding_side="left",
+        add_special_tokens=False,
+        return_tensors="pt",
+        truncation=False,
+    ).to("cuda")
+
+
+def generate_multi(
+    prompts: list[str],
+    image_urls: list[list[str]],
+    adapter_paths: list[str | None],
+    generation_params: dict | None = None,
+) -> list[list[dict]]:
+    """generate_batch for several targets (adapter paths, None for the base model) over the same rows.
+
+    Returns {"output", "cached"} per target, per row. Images are loaded and
+    the batch is tokenized once; between targets only the active adapter of
+    the resident base model changes. Rows any target misses in the
+    prediction cache are generated for every target that misses at least one.
+    """
+    if model_manager.is_training:
+        raise RuntimeError("Model is currently training")
+    gen_kwargs = _generation_kwargs(generation_params or {})
+    base_model = next((model_manager._adapter_base_model(p) for p in adapter_paths if p), None)
+    results: list[list[dict | None]] = [[None] * len(prompts) for _ in adapter_paths]
+
+    caches = [_cache_keys(prompts, image_urls, path, gen_kwargs, base_model, batched=True) for path in adapter_paths]
+    for target_results, cache in zip(results, caches):
+        if cache is None:
+            continue
+        for i, key in enumerate(cache[2]):
+            cached = prediction_cache.get(key)
+            if cached is not None:
+                target_results[i] = {"output": cached, "cached": True}
+
+    misses = sorted({i for target_results in results for i, r in enumerate(target_results) if r is None})
+    inputs = None
+    for path, target_results, cache in zip(adapter_paths, results, caches):
+        if all(target_results[i] is not None for i in misses):
+            continue
+        model_manager.activate_adapter(path, base_model)
+        if model_manager.status != "inference":
+            model_manager.for_inference()
+        if inputs is None:
+            inputs = _padded_inputs([prompts[i] for i in misses], [image_urls[i] for i in misses])
+        outputs = model_manager.generate_batch(inputs, **gen_kwargs)
+        for i, output in zip(misses, outputs):
+            if target_results[i] is None:
+                target_results[i] = {"output": output, "cached": False}
+                if cache is not None:
+                    base, adapter_hash, keys = cache
+                    prediction_cache.put(keys[i], output, base, adapter_hash, path)
+    return results
+
+
 def compare(
     prompt: str,
     image_urls: list[str],
@@ -95,8 +266,7 @@ def compare(
     if model_manager.is_training:
         raise RuntimeError("Model is currently training")
 
-    # Generate with base model
-    model_manager.load_model()
+    # Both go through the adapter registry, so neither switch reloads the base model
     base_result = generate(prompt, image_urls, adapter_path=None, generation_params=generation_params)
 
     # Generate with finetuned model
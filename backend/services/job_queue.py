@@ -0,0 +1,286 @@
+import asyncio
+import datetime
+import json
+import logging
+
+from sqlalchemy import select, update
+
+from backend.database import async_session
+from backend.models.job import Job
+from backend.schemas.dataset import ColumnMappingRequest
+from backend.services import dataset_service, evaluation_service, sweep_service, training_service
+from backend.ws.manager import ws_manager
+
+logger = logging.getLogger(__name__)
+
+# How often the worker re-checks for work when nothing wakes it
+_POLL_SECONDS = 5.0
+
+_BUSY_TRAINING_STATES = ("loading_model", "preparing_data", "training", "stopping")
+
+
+def job_to_dict(job: Job) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "priority": job.priority,
+        "payload": json.loads(job.payload),
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "session_id": job.session_id,
+        "eval_run_id": job.eval_run_id,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def busy_reason() -> str | None:
+    """Why the shared model can't take another run right now, or None if it is free.
+
+    Covers manual training and evaluation, sweeps and the job the queue is
+    running, including the part before the job's training status changes.
+    """
+    if training_service.get_training_status()["status"] in _BUSY_TRAINING_STATES:
+        return "Training already in progress"
+    if evaluation_service.eval_status["running"]:
+        return "Evaluation already in progress"
+    if sweep_service.is_running():
+        return "Sweep in progress"
+    if job_queue.current_job_id is not None:
+        return f"Queued job #{job_queue.current_job_id} is running"
+    return None
+
+
+def _ensure_dataset(dataset_path: str, mapping: dict):
+    """Make the job's dataset and mapping current, loading them if another job changed them."""
+    if dataset_service.get_current_file_path() != dataset_path:
+        logger.info("Job queue: loading dataset %s", dataset_path)
+        dataset_service.load_csv(dataset_path)
+    current = dataset_service.get_current_mapping()
+    if current is None or current.model_dump() != mapping:
+        dataset_service.set_mapping(ColumnMappingRequest(**mapping))
+
+
+class JobQueue:
+    """Persistent FIFO-by-priority queue of training and evaluation jobs.
+
+    Jobs live in the jobs table and run one at a time on the shared
+    model_manager; manually started runs are waited for, not interrupted.
+    Jobs that were running when the backend stopped are queued again on
+    startup (training jobs resume from their session's last checkpoint,
+    evaluation jobs from their run's last stored sample).
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+        self._current_id: int | None = None
+        self._cancel_requested: set[int] = set()
+
+    @property
+    def current_job_id(self) -> int | None:
+        return self._current_id
+
+    async def start(self):
+        async with async_session() as db:
+            await db.execute(update(Job).where(Job.status == "running").values(status="queued", started_at=None))
+            await db.commit()
+        self._task = asyncio.create_task(self._worker())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def submit(self, kind: str, request: dict, priority: int = 0) -> dict:
+        mapping = dataset_service.get_current_mapping()
+        payload = {
+            "request": request,
+            "dataset_path": dataset_service.get_current_file_path(),
+            "mapping": mapping.model_dump() if mapping else None,
+        }
+        async with async_session() as db:
+            job = Job(kind=kind, priority=priority, payload=json.dumps(payload))
+            db.add(job)
+            await db.commit()
+            await db.refresh(job)
+        data = job_to_dict(job)
+        await ws_manager.broadcast("job_update", data)
+        self._wake.set()
+        return data
+
+    async def list_jobs(self, status: str | None = None, limit: int = 100) -> list[dict]:
+        async with async_session() as db:
+            query = select(Job)
+            if status:
+                query = query.where(Job.status == status)
+            result = await db.execute(query.order_by(Job.id.desc()).limit(limit))
+            return [job_to_dict(j) for j in result.scalars().all()]
+
+    async def get_job(self, job_id: int) -> dict | None:
+        async with async_session() as db:
+            job = await db.get(Job, job_id)
+            return job_to_dict(job) if job else None
+
+    async def set_priority(self, job_id: int, priority: int) -> dict:
+        async with async_session() as db:
+            job = await db.get(Job, job_id)
+            if job is None:
+                raise LookupError("Job not found")
+            if job.status != "queued":
+                raise ValueError("Only queued jobs can be reprioritized")
+            job.priority = priority
+            await db.commit()
+            data = job_to_dict(job)
+        await ws_manager.broadcast("job_update", data)
+        return data
+
+    async def cancel(self, job_id: int) -> dict:
+        """Cancel a queued job, or stop a running one where it can be resumed.
+
+        Training stops at a checkpoint (after its first step if it hasn't
+        started yet); evaluation stops after its current batch with the
+        samples so far stored.
+        """
+        async with async_session() as db:
+            job = await db.get(Job, job_id)
+            if job is None:
+                raise LookupError("Job not found")
+            if job.status == "queued":
+                job.status = "cancelled"
+                job.finished_at = datetime.datetime.utcnow()
+                await db.commit()
+                data = job_to_dict(job)
+                await ws_manager.broadcast("job_update", data)
+                return data
+            if job.status != "running":
+                raise ValueError(f"Job is already {job.status}")
+            # A job still loading its dataset sees the flag before it starts its run
+            self._cancel_requested.add(job_id)
+            if job.kind == "training":
+                training_service.stop_training()
+            else:
+                evaluation_service.stop_evaluation()
+            return job_to_dict(job)
+
+    async def _wait(self):
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    async def _worker(self):
+        while True:
+            try:
+                job = None if busy_reason() else await self._claim_next()
+                if job is None:
+                    await self._wait()
+                    continue
+                await self._execute(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job queue worker error")
+                await asyncio.sleep(_POLL_SECONDS)
+
+    async def _claim_next(self) -> Job | None:
+        async with async_session() as db:
+            result = await db.execute(
+                select(Job).where(Job.status == "queued").order_by(Job.priority.desc(), Job.id).limit(1)
+            )
+            job = result.scalars().first()
+            if job is None:
+                return None
+            job.status = "running"
+            job.started_at = datetime.datetime.utcnow()
+            job.error = None
+            await db.commit()
+        self._current_id = job.id
+        await ws_manager.broadcast("job_update", job_to_dict(job))
+        return job
+
+    async def _finish(self, job_id: int, **fields):
+        async with async_session() as db:
+            job = await db.get(Job, job_id)
+            for key, value in fields.items():
+                setattr(job, key, value)
+            job.finished_at = datetime.datetime.utcnow()
+            await db.commit()
+            data = job_to_dict(job)
+        await ws_manager.broadcast("job_update", data)
+
+    async def _execute(self, job: Job):
+        payload = json.loads(job.payload)
+        loop = asyncio.get_running_loop()
+        logger.info("Job queue: starting %s job #%d", job.kind, job.id)
+        try:
+            if payload["dataset_path"] is None or payload["mapping"] is None:
+                raise ValueError("Job was submitted without a dataset and column mapping")
+            await asyncio.to_thread(_ensure_dataset, payload["dataset_path"], payload["mapping"])
+            if job.kind == "training":
+                await self._run_training(job, payload["request"], loop)
+            else:
+                run_id = await self._eval_run_id(job, payload["request"])
+                if job.id in self._cancel_requested:
+                    await self._finish(job.id, status="cancelled", eval_run_id=run_id)
+                    return
+                result = await evaluation_service.run_evaluation_job(run_id, loop)
+                status = "cancelled" if result.get("stopped") else "completed"
+                await self._finish(job.id, status=status, eval_run_id=run_id, result=json.dumps({"run_id": run_id}))
+        except Exception as e:
+            logger.exception("Job #%d failed", job.id)
+            await self._finish(job.id, status="failed", error=str(e))
+        finally:
+            self._current_id = None
+            self._cancel_requested.discard(job.id)
+
+    async def _eval_run_id(self, job: Job, request: dict) -> int:
+        """The job's evaluation run; one requeued after a restart continues its stored samples."""
+        if job.eval_run_id is not None:
+            return job.eval_run_id
+        run_id = await evaluation_service.create_eval_run(request)
+        async with async_session() as db:
+            await db.execute(update(Job).where(Job.id == job.id).values(eval_run_id=run_id))
+            await db.commit()
+        return run_id
+
+    async def _run_training(self, job: Job, request: dict, loop: asyncio.AbstractEventLoop):
+        model_config = request["model_config_data"]
+        sft_config = request["sft_config"]
+        lora_config = request["lora_config"]
+        session_id = job.session_id
+        resume = False
+        if session_id is None:
+            session_id = await training_service.create_run_session(
+                model_config, sft_config, lora_config, request.get("session_name")
+            )
+            async with async_session() as db:
+                await db.execute(update(Job).where(Job.id == job.id).values(session_id=session_id))
+                await db.commit()
+        else:
+            # Requeued after a restart: continue from the session's checkpoint if there is one
+            try:
+                model_config, sft_config, lora_config = await training_service.get_resume_config(session_id)
+                resume = True
+            except (LookupError, ValueError):
+                pass
+            await training_service.update_session_status(session_id, "training")
+
+        if job.id in self._cancel_requested:
+            await training_service.update_session_status(session_id, "stopped")
+            await self._finish(job.id, status="cancelled", session_id=session_id)
+            return
+        result = await asyncio.to_thread(
+            training_service.run_training, model_config, sft_config, lora_config, loop, session_id, resume
+        )
+        if result.get("status") == "error":
+            await self._finish(job.id, status="failed", error=result.get("error"), session_id=session_id)
+        else:
+            status = "cancelled" if result.get("stopped") else "completed"
+            await self._finish(job.id, status=status, result=json.dumps(result), session_id=session_id)
+
+
+job_queue = JobQueue()
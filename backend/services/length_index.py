@@ -0,0 +1,226 @@
+import asyncio
+import hashlib
+import logging
+import os
+from concurrent.futures import wait
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+
+from backend.config import settings
+from backend.services import dataset_service
+from backend.services.model_manager import model_manager
+from backend.utils.image import prefetch_images, vision_token_count
+from backend.ws.manager import ws_manager
+
+logger = logging.getLogger(__name__)
+
+# Chat-template tokens added around each user/assistant turn pair
+TEMPLATE_OVERHEAD = 16
+
+_TOKENIZE_CHUNK = 10_000
+
+# Bumped whenever the index's columns change, so older files are recomputed
+_INDEX_VERSION = "3"
+_HISTOGRAM_BINS = 20
+
+_tokenizers: dict[str, object] = {}
+_analysis_status = {
+    "status": "idle",  # idle, running, completed, error
+    "done": 0,
+    "total": 0,
+    "error_message": None,
+}
+
+
+def get_analysis_status() -> dict:
+    return _analysis_status.copy()
+
+
+def _index_path(file_path: str) -> Path:
+    return Path(file_path).with_suffix(".lengths.arrow")
+
+
+def _fingerprint(model_name: str) -> str:
+    """Identity of everything the index depends on besides the data file itself."""
+    mapping = dataset_service.get_current_mapping()
+    parts = [
+        _INDEX_VERSION,
+        model_name,
+        mapping.model_dump_json() if mapping else "",
+        str(settings.image_max_pixels),
+        str(settings.image_patch_factor),
+    ]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+def _get_tokenizer(model_name: str):
+    if model_manager.tokenizer is not None and model_manager.model_name == model_name:
+        return model_manager.tokenizer
+    if model_name not in _tokenizers:
+        from transformers import AutoTokenizer
+
+        _tokenizers[model_name] = AutoTokenizer.from_pretrained(model_name)
+    return _tokenizers[model_name]
+
+
+def _safe_vision_tokens(url: str) -> int | None:
+    """Vision tokens for url, or None if the image couldn't be fetched or sized."""
+    try:
+        return vision_token_count(url)
+    except Exception as e:
+        logger.warning("No vision token estimate for %s: %s", url, e)
+        return None
+
+
+def compute_length_index(model_name: str, on_progress=None) -> pa.Table:
+    """Compute per-row text/vision token counts for the current dataset and store them.
+
+    The result is written as an Arrow file next to the dataset, tagged with the
+    model, mapping and image settings it was computed for.
+    """
+    file_path = dataset_service.get_current_file_path()
+    mapping = dataset_service.get_current_mapping()
+    if file_path is None or mapping is None:
+        raise ValueError("Dataset or mapping not set")
+
+    tokenizer = _get_tokenizer(model_name)
+    text_tokenizer = getattr(tokenizer, "tokenizer", tokenizer)
+    plan = dataset_service.get_row_plan()
+    df = dataset_service.read_columns([mapping.prompt_column, mapping.response_column])
+    prompts = df[mapping.prompt_column].astype(str).tolist()
+    responses = df[mapping.response_column].astype(str).tolist()
+    total = len(prompts)
+
+    # Prompts are counted on their own too: evaluation pads on prompt length only
+    prompt_tokens = np.zeros(total, dtype=np.int32)
+    response_tokens = np.zeros(total, dtype=np.int32)
+    for start in range(0, total, _TOKENIZE_CHUNK):
+        for texts, counts in ((prompts, prompt_tokens), (responses, response_tokens)):
+            batch = texts[start:start + _TOKENIZE_CHUNK]
+            ids = text_tokenizer(batch, add_special_tokens=False)["input_ids"]
+            counts[start:start + len(batch)] = [len(x) for x in ids]
+        if on_progress:
+            on_progress(min(start + _TOKENIZE_CHUNK, total), total)
+    text_tokens = prompt_tokens + response_tokens
+
+    # Image dimensions come from the cache index (header read once), never a full decode
+    urls = [url for urls in plan.image_urls for url in urls]
+    wait(prefetch_images(urls).values())
+    per_url = {url: _safe_vision_tokens(url) for url in dict.fromkeys(urls)}
+    vision_tokens = np.array([sum(per_url[u] or 0 for u in urls) for urls in plan.image_urls], dtype=np.int32)
+    # Rows with an image that couldn't be sized have an unknown (under-)estimate; see row_lengths
+    unsized_images = np.array([sum(per_url[u] is None for u in urls) for urls in plan.image_urls], dtype=np.int16)
+    num_images = np.array([len(urls) for urls in plan.image_urls], dtype=np.int16)
+
+    table = pa.table({
+        "text_tokens": text_tokens,
+        "prompt_tokens": prompt_tokens,
+        "vision_tokens": vision_tokens,
+        "num_images": num_images,
+        "unsized_images": unsized_images,
+        "total_tokens": text_tokens + vision_tokens + TEMPLATE_OVERHEAD,
+    }).replace_schema_metadata({"fingerprint": _fingerprint(model_name), "model_name": model_name})
+
+    dest = _index_path(file_path)
+    tmp = dest.with_suffix(".tmp")
+    with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, dest)
+    return table
+
+
+def load_length_index(model_name: str) -> pa.Table | None:
+    """The stored index for the current dataset, if it matches model/mapping/image settings."""
+    file_path = dataset_service.get_current_file_path()
+    if file_path is None:
+        return None
+    path = _index_path(file_path)
+    if not path.exists() or path.stat().st_mtime < Path(file_path).stat().st_mtime:
+        return None
+    table = pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+    metadata = table.schema.metadata or {}
+    if metadata.get(b"fingerprint", b"").decode() != _fingerprint(model_name):
+        return None
+    return table
+
+
+def require_length_index(model_name: str) -> pa.Table:
+    """The up-to-date index for the current dataset.
+
+    Raises ValueError if there is none: building one reads every image
+    header, which belongs in a reported analysis job rather than on the
+    training thread.
+    """
+    table = load_length_index(model_name)
+    if table is None:
+        raise ValueError(
+            f"No token length index for this dataset and {model_name}; run POST /api/datasets/analyze first"
+        )
+    return table
+
+
+def unsized_rows(table: pa.Table) -> np.ndarray:
+    """Boolean mask of rows with at least one image whose size couldn't be determined."""
+    return table.column("unsized_images").to_numpy() > 0
+
+
+def row_lengths(table: pa.Table, max_seq_length: int | None = None) -> list[int]:
+    """Estimated total tokens for every dataset row.
+
+    With max_seq_length, rows with an unsized image count as at least
+    max_seq_length, so packing and token budgets never put them in a
+    sample or batch their real length could overflow.
+    """
+    totals = table.column("total_tokens").to_numpy()
+    if max_seq_length:
+        totals = np.where(unsized_rows(table), np.maximum(totals, max_seq_length), totals)
+    return totals.tolist()
+
+
+def summarize(table: pa.Table, max_seq_length: int | None = None) -> dict:
+    valid = dataset_service.get_row_plan().valid_indices()
+    summary: dict = {"model_name": (table.schema.metadata or {}).get(b"model_name", b"").decode(), "num_rows": len(valid)}
+    for col in ["text_tokens", "vision_tokens", "total_tokens"]:
+        values = table.column(col).to_numpy()[valid]
+        if len(values) == 0:
+            summary[col] = None
+            continue
+        counts, edges = np.histogram(values, bins=_HISTOGRAM_BINS)
+        summary[col] = {
+            "mean": round(float(values.mean()), 1),
+            "p50": int(np.percentile(values, 50)),
+            "p90": int(np.percentile(values, 90)),
+            "p95": int(np.percentile(values, 95)),
+            "p99": int(np.percentile(values, 99)),
+            "max": int(values.max()),
+            "histogram": {"counts": counts.tolist(), "edges": [round(float(e), 1) for e in edges]},
+        }
+    summary["rows_unsized"] = int(unsized_rows(table)[valid].sum())
+    if max_seq_length:
+        totals = table.column("total_tokens").to_numpy()[valid]
+        summary["max_seq_length"] = max_seq_length
+        summary["rows_over_max"] = int((totals > max_seq_length).sum())
+    return summary
+
+
+def run_analysis(model_name: str, loop: asyncio.AbstractEventLoop):
+    """Build the length index as a background job (called via asyncio.to_thread)."""
+    global _analysis_status
+    _analysis_status = {"status": "running", "done": 0, "total": 0, "error_message": None}
+
+    def _on_progress(done: int, total: int):
+        _analysis_status["done"] = done
+        _analysis_status["total"] = total
+        ws_manager.broadcast_sync("dataset_analysis_progress", {"done": done, "total": total}, loop)
+
+    try:
+        table = compute_length_index(model_name, _on_progress)
+        _analysis_status["status"] = "completed"
+        ws_manager.broadcast_sync("dataset_analysis_complete", summarize(table), loop)
+    except Exception as e:
+        logger.exception("Dataset analysis failed")
+        _analysis_status["status"] = "error"
+        _analysis_status["error_message"] = str(e)
+        ws_manager.broadcast_sync("dataset_analysis_error", {"error": str(e)}, loop)
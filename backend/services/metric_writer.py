@@ -0,0 +1,110 @@
+import asyncio
+import datetime
+import logging
+import threading
+from collections import deque
+
+from sqlalchemy import delete, insert
+
+from backend.config import settings
+from backend.database import async_session
+from backend.models.training_run import TrainingMetricLog
+
+logger = logging.getLogger(__name__)
+
+_TIMING_FIELDS = (
+    "samples_per_sec",
+    "text_tokens_per_sec",
+    "vision_tokens_per_sec",
+    "data_wait_seconds",
+    "compute_seconds",
+    "optimizer_seconds",
+    "peak_memory_gb",
+)
+
+
+class MetricWriter:
+    """Buffers training step metrics in memory and bulk-inserts them from the event loop.
+
+    push() is called from the trainer thread and never touches the database;
+    a background task flushes the buffer every metric_flush_steps records or
+    metric_flush_seconds, whichever comes first. If the database falls behind
+    by more than metric_buffer_size records, the oldest are dropped.
+    """
+
+    def __init__(self):
+        self._buffer: deque[dict] = deque(maxlen=settings.metric_buffer_size)
+        self._lock = threading.Lock()
+        self._dropped = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def push(self, session_id: int, step: int, logs: dict):
+        record = {
+            "session_id": session_id,
+            "step": step,
+            "loss": logs["loss"],
+            "learning_rate": logs.get("learning_rate") or 0.0,
+            "epoch": logs.get("epoch") or 0.0,
+            "grad_norm": logs.get("grad_norm"),
+            **{key: logs.get(key) for key in _TIMING_FIELDS},
+            "timestamp": datetime.datetime.utcnow(),
+        }
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self._dropped += 1
+            self._buffer.append(record)
+            full = len(self._buffer) >= settings.metric_flush_steps
+        if full and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def flush(self):
+        with self._lock:
+            records = list(self._buffer)
+            self._buffer.clear()
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            logger.warning("Metric buffer overflowed; dropped %d step records", dropped)
+        if not records:
+            return
+        try:
+            async with async_session() as db:
+                await db.execute(insert(TrainingMetricLog), records)
+                await db.commit()
+        except Exception as e:
+            logger.warning("Could not write %d metric records: %s", len(records), e)
+
+    async def truncate(self, session_id: int, after_step: int):
+        """Drop a session's metrics past after_step (a resumed run logs those steps again)."""
+        await self.flush()
+        async with async_session() as db:
+            await db.execute(
+                delete(TrainingMetricLog).where(
+                    TrainingMetricLog.session_id == session_id, TrainingMetricLog.step > after_step
+                )
+            )
+            await db.commit()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.metric_flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+
+metric_writer = MetricWriter()
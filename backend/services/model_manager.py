@@ -1,6 +1,9 @@
 import gc
+import hashlib
+import json
 import logging
 import threading
+from collections import OrderedDict
 from pathlib import Path
 
 import torch
@@ -34,6 +37,9 @@ class ModelManager:
         self._mode = "idle"  # idle, loading, training, inference
         self._op_lock = threading.Lock()
         self._current_adapter_path = None
+        # Adapters attached to the resident base model, least recently used first:
+        # path -> {"name": PEFT adapter name, "on_gpu": bool, "bytes": weight size}
+        self._adapters: OrderedDict[str, dict] = OrderedDict()
 
     @property
     def status(self) -> str:
@@ -47,6 +53,10 @@ class ModelManager:
     def tokenizer(self):
         return self._tokenizer
 
+    @property
+    def model_name(self) -> str | None:
+        return self._model_name
+
     @property
     def is_loaded(self) -> bool:
         return self._model is not None
@@ -61,8 +71,17 @@ class ModelManager:
                 raise RuntimeError("Cannot load model during training")
 
             target = model_name or settings.default_model_name
-            if self._model is not None and self._model_name == target and self._current_adapter_path is None:
-                logger.info("Model already loaded: %s", target)
+            if self._model is not None and self._model_name == target:
+                if not self._has_lora():
+                    logger.info("Model already loaded: %s", target)
+                    return
+                # Strip the LoRA layers and keep the resident base weights instead of reloading
+                self._model = self._model.unload()
+                self._current_adapter_path = None
+                self._adapters = OrderedDict()
+                gc.collect()
+                torch.cuda.empty_cache()
+                logger.info("Removed adapter, reusing loaded base model: %s", target)
                 return
 
             self._mode = "loading"
@@ -85,12 +104,18 @@ class ModelManager:
                 self._tokenizer = tokenizer
                 self._model_name = target
                 self._current_adapter_path = None
+                self._adapters = OrderedDict()
                 self._mode = "idle"
                 logger.info("Model loaded successfully: %s", target)
             except Exception:
                 self._mode = "idle"
                 raise
 
+    def _has_lora(self) -> bool:
+        from peft import PeftModel
+
+        return isinstance(self._model, PeftModel)
+
     def apply_lora(self, lora_config: dict):
         with self._op_lock:
             if self._model is None:
@@ -115,6 +140,7 @@ class ModelManager:
                 loftq_config=None,
             )
             self._current_adapter_path = None
+            self._adapters = OrderedDict()
 
     def for_training(self):
         with self._op_lock:
@@ -144,33 +170,123 @@ class ModelManager:
             self._model.save_pretrained(str(path))
             self._tokenizer.save_pretrained(str(path))
             self._current_adapter_path = str(path)
+            # The weights just saved are the model's "default" adapter
+            self._adapters = OrderedDict((p, a) for p, a in self._adapters.items() if a["name"] != "default")
+            self._adapters[str(path)] = {"name": "default", "on_gpu": True, "bytes": self._adapter_bytes("default")}
             logger.info("Adapter saved to: %s", path)
             return str(path)
 
     def load_adapter(self, adapter_path: str):
-        """Load a saved LoRA adapter from disk."""
+        """Make a saved LoRA adapter active, attaching it to the resident base model if needed."""
+        self.activate_adapter(adapter_path)
+
+    @staticmethod
+    def _adapter_name(adapter_path: str) -> str:
+        # PEFT adapter names become module attribute names, so no path characters
+        return "adapter_" + hashlib.sha1(adapter_path.encode()).hexdigest()[:12]
+
+    def _adapter_params(self, name: str) -> list[torch.nn.Parameter]:
+        marker = f".{name}."
+        return [p for n, p in self._model.named_parameters() if marker in n]
+
+    def _adapter_bytes(self, name: str) -> int:
+        return sum(p.numel() * p.element_size() for p in self._adapter_params(name))
+
+    def _move_adapter(self, path: str, to_gpu: bool):
+        entry = self._adapters[path]
+        for param in self._adapter_params(entry["name"]):
+            if to_gpu:
+                param.data = param.data.to("cuda", non_blocking=True)
+            else:
+                param.data = param.data.to("cpu").pin_memory()
+        entry["on_gpu"] = to_gpu
+
+    def _enforce_adapter_limits(self):
+        """Spill least recently used adapters to pinned CPU memory, then drop the oldest spilled ones."""
+        on_gpu = [p for p, a in self._adapters.items() if a["on_gpu"] and p != self._current_adapter_path]
+        for path in on_gpu[:max(0, len(on_gpu) + 1 - settings.adapter_gpu_slots)]:
+            logger.info("Moving adapter %s to CPU memory", path)
+            self._move_adapter(path, to_gpu=False)
+        on_cpu = [p for p, a in self._adapters.items() if not a["on_gpu"]]
+        for path in on_cpu[:max(0, len(on_cpu) - settings.adapter_cpu_slots)]:
+            logger.info("Detaching adapter %s", path)
+            self._model.delete_adapter(self._adapters.pop(path)["name"])
+
+    def activate_adapter(self, adapter_path: str | None, base_model: str | None = None):
+        """Make adapter_path (None for the bare base model) active on the resident base model.
+
+        Adapters are attached as named PEFT adapters and stay attached, so
+        switching between them, or to the base model with adapter layers
+        disabled, doesn't reload any weights. The adapter_gpu_slots most
+        recently used adapters stay on the GPU; older ones are kept in pinned
+        CPU memory (up to adapter_cpu_slots) and copied back when used. The
+        base model is (re)loaded only if it isn't the one the adapter was
+        trained on; base_model selects it when adapter_path is None.
+        """
+        if adapter_path:
+            base_model = self._adapter_base_model(adapter_path) or base_model
+        target = base_model or self._model_name or settings.default_model_name
+        if self._model is None or self._model_name != target:
+            self.load_model(target)
+
         with self._op_lock:
             if self._mode == "training":
-                raise RuntimeError("Cannot load adapter during training")
-
-            # Reload the base model with the adapter
-            if self._model is not None:
-                del self._model
-                del self._tokenizer
-                gc.collect()
-                torch.cuda.empty_cache()
-
-            from unsloth import FastVisionModel
+                raise RuntimeError("Cannot switch adapters during training")
+            if adapter_path is None:
+                if self._has_lora():
+                    self._model.base_model.disable_adapter_layers()
+                self._current_adapter_path = None
+                return
 
-            logger.info("Loading adapter from: %s", adapter_path)
-            model, tokenizer = FastVisionModel.from_pretrained(
-                model_name=adapter_path,
-                load_in_4bit=True,
-            )
-            self._model = model
-            self._tokenizer = tokenizer
+            if adapter_path not in self._adapters:
+                name = self._adapter_name(adapter_path)
+                logger.info("Attaching adapter %s as '%s'", adapter_path, name)
+                if self._has_lora():
+                    self._model.load_adapter(adapter_path, adapter_name=name)
+                else:
+                    from peft import PeftModel
+
+                    self._model = PeftModel.from_pretrained(self._model, adapter_path, adapter_name=name)
+                self._adapters[adapter_path] = {"name": name, "on_gpu": True, "bytes": self._adapter_bytes(name)}
+            elif not self._adapters[adapter_path]["on_gpu"]:
+                self._move_adapter(adapter_path, to_gpu=True)
+            self._adapters.move_to_end(adapter_path)
+
+            self._model.base_model.enable_adapter_layers()
+            self._model.set_adapter(self._adapters[adapter_path]["name"])
             self._current_adapter_path = adapter_path
-            self._mode = "idle"
+            self._enforce_adapter_limits()
+
+    def adapter_status(self) -> dict:
+        """Attached adapters (most recently used first) and the memory they and the model occupy."""
+        adapters = [
+            {
+                "adapter_path": path,
+                "name": a["name"],
+                "device": "cuda" if a["on_gpu"] else "cpu",
+                "active": path == self._current_adapter_path,
+                "size_bytes": a["bytes"],
+            }
+            for path, a in reversed(self._adapters.items())
+        ]
+        memory = {
+            "adapters_gpu_bytes": sum(a["bytes"] for a in self._adapters.values() if a["on_gpu"]),
+            "adapters_cpu_bytes": sum(a["bytes"] for a in self._adapters.values() if not a["on_gpu"]),
+            "gpu_slots": settings.adapter_gpu_slots,
+            "cpu_slots": settings.adapter_cpu_slots,
+        }
+        if torch.cuda.is_available():
+            memory["cuda_allocated_bytes"] = torch.cuda.memory_allocated()
+            memory["cuda_reserved_bytes"] = torch.cuda.memory_reserved()
+        return {"adapters": adapters, "memory": memory}
+
+    @staticmethod
+    def _adapter_base_model(adapter_path: str) -> str | None:
+        config_path = Path(adapter_path) / "adapter_config.json"
+        try:
+            return json.loads(config_path.read_text()).get("base_model_name_or_path")
+        except (OSError, ValueError):
+            return None
 
     def unload(self):
         with self._op_lock:
@@ -185,6 +301,7 @@ class ModelManager:
             self._tokenizer = None
             self._model_name = None
             self._current_adapter_path = None
+            self._adapters = OrderedDict()
             self._mode = "idle"
 
     def generate(self, inputs: dict, **gen_kwargs) -> str:
@@ -201,5 +318,19 @@ class ModelManager:
         new_tokens = output_ids[0][input_len:]
         return self._tokenizer.decode(new_tokens, skip_special_tokens=True)
 
+    def generate_batch(self, inputs: dict, **gen_kwargs) -> list[str]:
+        """Like generate, for a left-padded batch; returns one output per row."""
+        if self._mode == "training":
+            raise RuntimeError("Model is currently training")
+        if self._model is None:
+            raise RuntimeError("Model not loaded")
+
+        with torch.no_grad():
+            output_ids = self._model.generate(**inputs, **gen_kwargs)
+
+        # With left padding every row's new tokens start at the same offset
+        input_len = inputs["input_ids"].shape[1]
+        return self._tokenizer.batch_decode(output_ids[:, input_len:], skip_special_tokens=True)
+
 
 model_manager = ModelManager()
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Generation kwargs that have no effect on greedy decoding
+_SAMPLING_ONLY = {"temperature", "top_p", "min_p", "top_k", "do_sample", "use_cache"}
+
+# Evict down to this fraction of the budget so we don't evict on every insert
+_LOW_WATERMARK = 0.9
+
+# Files whose contents define an adapter's weights
+_ADAPTER_FILES = ("adapter_config.json", "adapter_model.safetensors", "adapter_model.bin")
+
+
+def cacheable_params(gen_kwargs: dict) -> dict | None:
+    """Generation kwargs that determine the output, or None if decoding is sampled.
+
+    Under greedy decoding the sampling knobs are ignored, so runs that differ
+    only in temperature or top_p share entries.
+    """
+    if gen_kwargs.get("do_sample"):
+        return None
+    return {k: v for k, v in sorted(gen_kwargs.items()) if k not in _SAMPLING_ONLY}
+
+
+class PredictionCache:
+    """Persistent store of deterministic generations, in a SQLite file.
+
+    Entries are keyed by SHA-256 of (base model, adapter content hash, prompt,
+    image fingerprints, normalized generation params), so retraining an
+    adapter in place never serves stale outputs. Entries also record the
+    adapter path they were generated with, for per-adapter invalidation.
+    """
+
+    def __init__(self, db_path: Path, max_entries: int):
+        self._path = db_path
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = self._connect()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            " key TEXT PRIMARY KEY, base_model TEXT, adapter_hash TEXT, adapter_path TEXT,"
+            " output TEXT, created_at REAL, last_access REAL, hits INTEGER DEFAULT 0)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_predictions_adapter ON predictions (adapter_path)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_predictions_access ON predictions (last_access)")
+        self._db.commit()
+        self._entries = self._db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        # adapter path -> ((mtime_ns, size) of its files, content hash)
+        self._adapter_hashes: dict[str, tuple[tuple, str]] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(str(self._path), timeout=30, check_same_thread=False)
+
+    def _reset_after_fork(self):
+        # SQLite connections must not be shared across processes
+        self._lock = threading.Lock()
+        self._db = self._connect()
+
+    def adapter_hash(self, adapter_path: str | None) -> str:
+        """Content hash of an adapter's weights and config ("base" for no adapter).
+
+        Hashed once per version of the files on disk.
+        """
+        if not adapter_path:
+            return "base"
+        files = [Path(adapter_path) / name for name in _ADAPTER_FILES if (Path(adapter_path) / name).exists()]
+        stamp = tuple((f.name, f.stat().st_mtime_ns, f.stat().st_size) for f in files)
+        cached = self._adapter_hashes.get(adapter_path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        digest = hashlib.sha256()
+        for f in files:
+            digest.update(f.name.encode())
+            with open(f, "rb") as fh:
+                for chunk in iter(lambda: fh.read(1 << 20), b""):
+                    digest.update(chunk)
+        value = digest.hexdigest()
+        self._adapter_hashes[adapter_path] = (stamp, value)
+        return value
+
+    @staticmethod
+    def key_for(base_model: str, adapter_hash: str, prompt: str, image_fingerprints: list[str], params: dict) -> str:
+        payload = json.dumps([base_model, adapter_hash, prompt, image_fingerprints, params], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._db.execute("SELECT output FROM predictions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._db.execute(
+                "UPDATE predictions SET last_access = ?, hits = hits + 1 WHERE key = ?", (time.time(), key)
+            )
+            self._db.commit()
+        return row[0]
+
+    def put(self, key: str, output: str, base_model: str, adapter_hash: str, adapter_path: str | None):
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO predictions"
+                " (key, base_model, adapter_hash, adapter_path, output, created_at, last_access, hits)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, base_model, adapter_hash, adapter_path, output, now, now),
+            )
+            self._entries += cursor.rowcount
+            if self._entries > self._max_entries:
+                self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        excess = self._entries - int(self._max_entries * _LOW_WATERMARK)
+        cursor = self._db.execute(
+            "DELETE FROM predictions WHERE key IN"
+            " (SELECT key FROM predictions ORDER BY last_access ASC LIMIT ?)",
+            (excess,),
+        )
+        self._entries -= cursor.rowcount
+        self._evictions += cursor.rowcount
+        logger.info("Evicted %d cached predictions", cursor.rowcount)
+
+    def invalidate(self, adapter_path: str | None = None) -> int:
+        """Drop the entries generated with adapter_path (every entry if None). Returns the count removed."""
+        with self._lock:
+            if adapter_path is None:
+                cursor = self._db.execute("DELETE FROM predictions")
+            else:
+                cursor = self._db.execute("DELETE FROM predictions WHERE adapter_path = ?", (adapter_path,))
+            self._entries -= cursor.rowcount
+            self._db.commit()
+        if adapter_path is None:
+            self._adapter_hashes.clear()
+        else:
+            self._adapter_hashes.pop(adapter_path, None)
+        logger.info("Invalidated %d cached predictions for %s", cursor.rowcount, adapter_path or "all adapters")
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            by_adapter = self._db.execute(
+                "SELECT adapter_path, COUNT(*), SUM(hits) FROM predictions GROUP BY adapter_path"
+            ).fetchall()
+            lookups = self._hits + self._misses
+            return {
+                "enabled": settings.prediction_cache_enabled,
+                "entries": self._entries,
+                "max_entries": self._max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "adapters": [
+                    {"adapter_path": path, "entries": count, "hits": hits or 0}
+                    for path, count, hits in by_adapter
+                ],
+            }
+
+
+prediction_cache = PredictionCache(settings.prediction_cache_path, settings.prediction_cache_max_entries)
+os.register_at_fork(after_in_child=prediction_cache._reset_after_fork)
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from backend.config import settings
+from backend.services.dataset_service import get_row_plan
+from backend.utils.image import prefetch_images
+from backend.ws.manager import ws_manager
+
+logger = logging.getLogger(__name__)
+
+# Broadcast progress at most this many times per job
+_PROGRESS_UPDATES = 50
+
+_lock = threading.Lock()
+_job_id = 0
+_cancel_event = threading.Event()
+_prefetch_status = {
+    "status": "idle",  # idle, running, completed, cancelled, error
+    "total": 0,
+    "done": 0,
+    "failed": 0,
+    "error_message": None,
+}
+# url -> error message, and url -> row indices referencing it
+_failed_urls: dict[str, str] = {}
+_url_rows: dict[str, list[int]] = {}
+
+
+def get_prefetch_status() -> dict:
+    with _lock:
+        status = _prefetch_status.copy()
+        status["failed_rows"] = get_failed_rows()
+        status["failed_urls"] = dict(list(_failed_urls.items())[:100])
+        return status
+
+
+def get_failed_rows() -> list[int]:
+    """Row indices with at least one image URL that failed to download."""
+    return sorted({i for url in _failed_urls for i in _url_rows.get(url, [])})
+
+
+def cancel_prefetch() -> bool:
+    with _lock:
+        if _prefetch_status["status"] != "running":
+            return False
+        _cancel_event.set()
+        return True
+
+
+def start_prefetch() -> int:
+    """Cancel any running job and reset state for a new one. Returns the new job id."""
+    global _job_id, _cancel_event, _prefetch_status
+    with _lock:
+        _cancel_event.set()
+        _cancel_event = threading.Event()
+        _job_id += 1
+        _prefetch_status = {"status": "running", "total": 0, "done": 0, "failed": 0, "error_message": None}
+        _failed_urls.clear()
+        _url_rows.clear()
+        return _job_id
+
+
+def run_prefetch(job_id: int, loop: asyncio.AbstractEventLoop):
+    """Warm the image cache for every valid row (called via asyncio.to_thread)."""
+    with _lock:
+        if job_id != _job_id:
+            return
+        cancel = _cancel_event
+        status = _prefetch_status
+
+    try:
+        plan = get_row_plan()
+        url_rows: dict[str, list[int]] = {}
+        for i in plan.valid_indices():
+            for url in plan.image_urls[i]:
+                url_rows.setdefault(url, []).append(i)
+        with _lock:
+            if job_id == _job_id:
+                _url_rows.update(url_rows)
+        status["total"] = len(url_rows)
+
+        broadcast_every = max(1, len(url_rows) // _PROGRESS_UPDATES)
+        last_broadcast = 0
+        pending = {}
+        urls = iter(url_rows)
+        window = settings.image_fetch_workers * 2
+
+        # Keep a bounded number of downloads queued so cancellation takes effect quickly
+        # and interactive requests aren't stuck behind the whole dataset
+        while True:
+            while not cancel.is_set() and len(pending) < window:
+                url = next(urls, None)
+                if url is None:
+                    break
+                fut = prefetch_images([url]).get(url)
+                if fut is None:
+                    status["done"] += 1
+                else:
+                    pending[fut] = url
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                url = pending.pop(fut)
+                status["done"] += 1
+                exc = fut.exception()
+                if exc is not None:
+                    status["failed"] += 1
+                    with _lock:
+                        if job_id == _job_id:
+                            _failed_urls[url] = str(exc)
+            if cancel.is_set():
+                # Futures may be shared with other callers, so leave queued ones to finish
+                break
+            if status["done"] - last_broadcast >= broadcast_every:
+                last_broadcast = status["done"]
+                ws_manager.broadcast_sync("prefetch_progress", {
+                    "done": status["done"],
+                    "total": status["total"],
+                    "failed": status["failed"],
+                }, loop)
+
+        status["status"] = "cancelled" if cancel.is_set() else "completed"
+        if status["failed"]:
+            logger.warning("Image prefetch: %d of %d URLs failed", status["failed"], status["total"])
+        ws_manager.broadcast_sync("prefetch_complete", {
+            "status": status["status"],
+            "done": status["done"],
+            "total": status["total"],
+            "failed": status["failed"],
+            "failed_rows": get_failed_rows(),
+        }, loop)
+    except Exception as e:
+        logger.exception("Image prefetch failed")
+        status["status"] = "error"
+        status["error_message"] = str(e)
+        ws_manager.broadcast_sync("prefetch_error", {"error": str(e)}, loop)
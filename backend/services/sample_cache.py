@@ -0,0 +1,130 @@
+import hashlib
+import json
+import logging
+import os
+
+import torch
+import torch.nn.functional as F
+from safetensors.torch import load_file, save
+
+from backend.config import settings
+from backend.utils.image import image_fingerprint
+from backend.utils.image_cache import ImageCache
+
+logger = logging.getLogger(__name__)
+
+
+def processor_identity(tokenizer, max_seq_length: int) -> str:
+    """Everything about the processor that changes its output for a given row."""
+    template = getattr(tokenizer, "chat_template", None) or ""
+    return ":".join([
+        type(tokenizer).__name__,
+        getattr(tokenizer, "name_or_path", "") or "",
+        hashlib.sha256(template.encode()).hexdigest()[:16],
+        str(max_seq_length),
+    ])
+
+
+def sample_key(rows: list[tuple[str, str, list[str]]], identity: str) -> str:
+    """Key for a sample built from rows of (prompt, response, image fingerprints)."""
+    payload = json.dumps([rows, identity])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SampleCache:
+    """Processed training samples, one safetensors blob per sample.
+
+    Blobs live in a size-bounded ImageCache store, so the sample cache gets
+    the same byte budget, LRU/LFU eviction and fork safety as the image
+    caches.
+    """
+
+    def __init__(self, store: ImageCache):
+        self._store = store
+
+    def get(self, key: str) -> dict[str, torch.Tensor] | None:
+        path = self._store.lookup(key)
+        if path is None:
+            return None
+        try:
+            return load_file(str(path))
+        except FileNotFoundError:
+            # Evicted by another worker since the lookup
+            return None
+        except Exception:
+            logger.warning("Discarding unreadable cached sample %s", path.name)
+            path.unlink(missing_ok=True)
+            return None
+
+    def put(self, key: str, tensors: dict[str, torch.Tensor]):
+        data = save({k: v.detach().cpu().contiguous() for k, v in tensors.items()})
+        self._store.put(key, data, "application/x-safetensors")
+
+
+class ProcessedSampleDataset:
+    """Wraps LazyConversationDataset to return processed tensors, cached on disk.
+
+    On a hit the row's images are never decoded; on a miss the row is run
+    through the vision collator on its own and the result stored.
+    """
+
+    def __init__(self, base, process, cache: SampleCache, identity: str):
+        self._base = base
+        self._process = process
+        self._cache = cache
+        self._identity = identity
+
+    def __len__(self) -> int:
+        return len(self._base)
+
+    def __getitem__(self, idx: int) -> dict[str, torch.Tensor]:
+        rows = [
+            (prompt_text, response_text, [image_fingerprint(u) for u in image_urls])
+            for prompt_text, response_text, image_urls in self._base.rows(idx)
+        ]
+        key = sample_key(rows, self._identity)
+        tensors = self._cache.get(key)
+        if tensors is None:
+            processed = self._process([self._base[idx]])
+            tensors = {k: v for k, v in processed.items() if isinstance(v, torch.Tensor)}
+            self._cache.put(key, tensors)
+        return tensors
+
+
+class PaddingCollator:
+    """Batches per-sample processed tensors.
+
+    The per-token keys in _PAD_VALUES are padded to the longest sample;
+    everything else (pixel_values, image_grid_thw) is concatenated along
+    dim 0, which is how the Qwen-VL processor lays out images across a batch.
+    """
+
+    # Per-token keys and their pad value; input_ids pads with the tokenizer's pad token
+    _PAD_VALUES = {"input_ids": None, "attention_mask": 0, "labels": -100}
+
+    def __init__(self, pad_token_id: int, padding_side: str = "right"):
+        self._pad_token_id = pad_token_id
+        self._padding_side = padding_side
+
+    def __call__(self, samples: list[dict[str, torch.Tensor]]) -> dict[str, torch.Tensor]:
+        max_len = max(s["input_ids"].shape[-1] for s in samples)
+        batch = {}
+        for key in dict.fromkeys(k for s in samples for k in s):
+            present = [s for s in samples if key in s]
+            if key in self._PAD_VALUES:
+                pad_value = self._PAD_VALUES[key]
+                if pad_value is None:
+                    pad_value = self._pad_token_id
+                padded = []
+                for s in present:
+                    pad = max_len - s[key].shape[-1]
+                    widths = (0, pad) if self._padding_side == "right" else (pad, 0)
+                    padded.append(F.pad(s[key], widths, value=pad_value))
+                batch[key] = torch.cat(padded, dim=0)
+            else:
+                batch[key] = torch.cat([s[key] for s in present], dim=0)
+        return batch
+
+
+sample_store = ImageCache(settings.sample_cache_dir, settings.sample_cache_max_bytes, settings.image_cache_policy)
+os.register_at_fork(after_in_child=sample_store._reset_after_fork)
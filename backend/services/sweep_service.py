@@ -0,0 +1,210 @@
+import asyncio
+import itertools
+import logging
+import math
+import random
+
+from pydantic import ValidationError
+
+from backend.callbacks.halving_callback import SuccessiveHalvingCallback
+from backend.schemas.sweep import SweepRequest
+from backend.schemas.training import LoRAConfigSchema, ModelConfigSchema, SFTConfigSchema
+from backend.services import evaluation_service, training_service
+from backend.ws.manager import ws_manager
+
+logger = logging.getLogger(__name__)
+
+# search_space key prefix -> (config key in a trial, schema validating it)
+_SECTIONS = {
+    "model": ("model_config", ModelConfigSchema),
+    "sft": ("sft_config", SFTConfigSchema),
+    "lora": ("lora_config", LoRAConfigSchema),
+}
+
+_sweep_task: asyncio.Task | None = None
+_cancel_requested = False
+_sweep_status: dict = {
+    "status": "idle",  # idle, running, completed, cancelled, error
+    "name": None,
+    "trials": [],
+    "best_trial": None,
+    "error_message": None,
+}
+
+
+def get_sweep_status() -> dict:
+    return {**_sweep_status, "trials": [t.copy() for t in _sweep_status["trials"]]}
+
+
+def is_running() -> bool:
+    return _sweep_status["status"] == "running"
+
+
+def _sample(param, rng: random.Random):
+    if param.values:
+        return rng.choice(param.values)
+    if param.log:
+        value = math.exp(rng.uniform(math.log(param.min), math.log(param.max)))
+    else:
+        value = rng.uniform(param.min, param.max)
+    return round(value) if param.integer else value
+
+
+def build_trials(req: SweepRequest) -> list[dict]:
+    """Expand the search space into validated trial configs. Raises ValueError if it is invalid."""
+    for key, param in req.search_space.items():
+        section, _, field = key.partition(".")
+        schema = _SECTIONS.get(section, (None, None))[1]
+        if schema is None or field not in schema.model_fields:
+            raise ValueError(f"Unknown search space key '{key}' (use model.*, sft.* or lora.* fields)")
+        if not param.values and (param.min is None or param.max is None):
+            raise ValueError(f"'{key}' needs either values or min/max")
+        if req.strategy == "grid" and not param.values:
+            raise ValueError(f"Grid search needs a list of values for '{key}'")
+        if param.log and not param.values and param.min <= 0:
+            raise ValueError(f"Log-scale range for '{key}' must be positive")
+
+    keys = list(req.search_space)
+    if req.strategy == "grid":
+        combos = [dict(zip(keys, combo)) for combo in itertools.product(*(req.search_space[k].values for k in keys))]
+    else:
+        rng = random.Random(req.seed)
+        combos = [{k: _sample(req.search_space[k], rng) for k in keys} for _ in range(req.num_trials)]
+
+    base = {
+        "model_config": req.model_config_data.model_dump(),
+        "sft_config": req.sft_config.model_dump(),
+        "lora_config": req.lora_config.model_dump(),
+    }
+    trials = []
+    for index, params in enumerate(combos):
+        configs = {name: dict(cfg) for name, cfg in base.items()}
+        for key, value in params.items():
+            section, _, field = key.partition(".")
+            configs[_SECTIONS[section][0]][field] = value
+        try:
+            for section, (name, schema) in _SECTIONS.items():
+                configs[name] = schema(**configs[name]).model_dump()
+        except ValidationError as e:
+            raise ValueError(f"Trial {index} {params} is invalid: {e}") from e
+        trials.append({
+            "index": index,
+            "params": params,
+            "status": "pending",  # pending, running, completed, pruned, failed, cancelled
+            "session_id": None,
+            "adapter_path": None,
+            "final_loss": None,
+            "pruned_at": None,
+            "rung_losses": {},
+            "eval_run_id": None,
+            "eval_metrics": None,
+            "error": None,
+            **configs,
+        })
+    return trials
+
+
+def start_sweep(req: SweepRequest, trials: list[dict]):
+    global _sweep_task, _sweep_status, _cancel_requested
+    _cancel_requested = False
+    _sweep_status = {
+        "status": "running",
+        "name": req.name or "sweep",
+        "trials": trials,
+        "best_trial": None,
+        "error_message": None,
+    }
+    _sweep_task = asyncio.create_task(_run_sweep(req, asyncio.get_event_loop()))
+
+
+def cancel_sweep() -> bool:
+    global _cancel_requested
+    if not is_running():
+        return False
+    _cancel_requested = True
+    training_service.stop_training()
+    evaluation_service.stop_evaluation()
+    return True
+
+
+async def _broadcast():
+    await ws_manager.broadcast("sweep_update", get_sweep_status())
+
+
+def _score(trial: dict, classification_mode: bool) -> float | None:
+    """Higher is better: eval F1 when available, otherwise negative final loss."""
+    metrics = trial["eval_metrics"]
+    if metrics:
+        if classification_mode and "classification_metrics" in metrics:
+            return metrics["classification_metrics"]["f1"]
+        return metrics["metrics"]["token_f1"]
+    return -trial["final_loss"] if trial["final_loss"] is not None else None
+
+
+async def _run_sweep(req: SweepRequest, loop: asyncio.AbstractEventLoop):
+    # Losses every trial reached at each rung, shared so later trials are judged against earlier ones
+    rung_losses: dict[int, list[float]] = {}
+    name = _sweep_status["name"]
+    try:
+        for trial in _sweep_status["trials"]:
+            if _cancel_requested:
+                trial["status"] = "cancelled"
+                continue
+            trial["status"] = "running"
+            await _broadcast()
+            await _run_trial(trial, req, name, rung_losses, loop)
+            await _broadcast()
+
+        scored = [
+            (score, t["index"]) for t in _sweep_status["trials"]
+            if t["status"] == "completed" and (score := _score(t, req.classification_mode)) is not None
+        ]
+        _sweep_status["best_trial"] = max(scored)[1] if scored else None
+        _sweep_status["status"] = "cancelled" if _cancel_requested else "completed"
+    except Exception as e:
+        logger.exception("Sweep failed")
+        _sweep_status["status"] = "error"
+        _sweep_status["error_message"] = str(e)
+    await _broadcast()
+
+
+async def _run_trial(trial: dict, req: SweepRequest, name: str, rung_losses: dict, loop: asyncio.AbstractEventLoop):
+    halving = SuccessiveHalvingCallback(rung_losses, req.min_steps, req.eta) if req.early_stopping else None
+    model_config, sft_config, lora_config = trial["model_config"], trial["sft_config"], trial["lora_config"]
+    trial["session_id"] = await training_service.create_run_session(
+        model_config, sft_config, lora_config, f"{name} #{trial['index']}"
+    )
+    # The base model stays loaded between trials: load_model only strips the previous LoRA
+    result = await asyncio.to_thread(
+        training_service.run_training,
+        dict(model_config), dict(sft_config), dict(lora_config),
+        loop, trial["session_id"], False, [halving] if halving else None,
+    )
+    if result.get("status") == "error":
+        trial["status"] = "failed"
+        trial["error"] = result.get("error")
+        return
+
+    trial["adapter_path"] = result["adapter_path"]
+    trial["final_loss"] = halving.last_loss if halving and halving.last_loss is not None else result["metrics"].get("train_loss")
+    if halving:
+        trial["pruned_at"] = halving.pruned_at
+        trial["rung_losses"] = halving.trial_rung_losses
+    if _cancel_requested:
+        trial["status"] = "cancelled"
+        return
+    if halving and halving.pruned_at is not None:
+        trial["status"] = "pruned"
+        return
+
+    if req.eval_sample_limit:
+        # The trained adapter is still the resident model, so evaluation doesn't reload it
+        trial["eval_run_id"] = await evaluation_service.create_eval_run({
+            "adapter_path": trial["adapter_path"],
+            "sample_limit": req.eval_sample_limit,
+            "generation_params": req.eval_generation_params,
+            "classification_mode": req.classification_mode,
+        })
+        eval_result = await evaluation_service.run_evaluation_job(trial["eval_run_id"], loop)
+        trial["eval_metrics"] = {k: v for k, v in eval_result.items() if k != "run_id"}
+    trial["status"] = "completed"
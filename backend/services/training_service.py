@@ -1,11 +1,40 @@
 import asyncio
+import json
 import logging
+import random
 import time
 from datetime import datetime
+from pathlib import Path
 
+from sqlalchemy import func, select, update
+
+from backend.callbacks.checkpoint_callback import ResumableCheckpointCallback
 from backend.callbacks.ws_callback import WebSocketTrainerCallback
+from backend.database import async_session
+from backend.models.session import TrainingSession
+from backend.models.training_run import TrainingMetricLog
+from backend.services.batching import (
+    BatchStats,
+    LengthGroupedSampler,
+    TokenBudgetBatchSampler,
+    batched_padding_ratio,
+    pack_lengths,
+    pack_text_rows,
+    padding_ratio,
+)
+from backend.services.metric_writer import metric_writer
 from backend.services.model_manager import model_manager
-from backend.services.dataset_service import build_training_dataset
+from backend.services.dataset_service import (
+    build_training_dataset,
+    get_current_file_path,
+    get_current_mapping,
+    get_row_plan,
+)
+from backend.services.length_index import load_length_index, require_length_index, row_lengths, unsized_rows
+from backend.services.prefetch_service import get_failed_rows
+from backend.services.sample_cache import (
+    PaddingCollator, ProcessedSampleDataset, SampleCache, processor_identity, sample_store,
+)
 from backend.ws.manager import ws_manager
 from backend.config import settings
 
@@ -13,6 +42,7 @@ logger = logging.getLogger(__name__)
 
 # Training state
 _trainer = None
+_checkpoint_callback: ResumableCheckpointCallback | None = None
 _training_status = {
     "status": "idle",
     "current_step": 0,
@@ -21,6 +51,7 @@ _training_status = {
     "learning_rate": None,
     "eta_seconds": None,
     "error_message": None,
+    "session_id": None,
 }
 
 
@@ -38,19 +69,192 @@ def _reset_status():
         "learning_rate": None,
         "eta_seconds": None,
         "error_message": None,
+        "session_id": None,
+    }
+
+
+def _output_dir(session_id: int | None) -> Path:
+    if session_id is None:
+        return settings.data_dir / "training_output"
+    return settings.data_dir / "training_output" / f"session_{session_id}"
+
+
+async def create_run_session(model_config: dict, sft_config: dict, lora_config: dict, name: str | None = None) -> int:
+    """Record a new training run as a TrainingSession. Returns its id."""
+    mapping = get_current_mapping()
+    async with async_session() as db:
+        session = TrainingSession(
+            name=name or f"Training {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+            status="training",
+            dataset_config=json.dumps(mapping.model_dump() if mapping else {}),
+            training_config=json.dumps({"model_config": model_config, "sft_config": sft_config}),
+            lora_config=json.dumps(lora_config),
+            dataset_path=get_current_file_path(),
+        )
+        db.add(session)
+        await db.commit()
+        await db.refresh(session)
+        return session.id
+
+
+async def get_resume_config(session_id: int) -> tuple[dict, dict, dict]:
+    """(model_config, sft_config, lora_config) of a session that has a checkpoint to resume from.
+
+    Raises ValueError if the session can't be resumed with the current dataset.
+    """
+    async with async_session() as db:
+        session = await db.get(TrainingSession, session_id)
+    if session is None:
+        raise LookupError("Session not found")
+    if session.status == "completed":
+        raise ValueError("Session already completed")
+    if not session.checkpoint_dir or not Path(session.checkpoint_dir).exists():
+        raise ValueError("Session has no checkpoint to resume from")
+    mapping = get_current_mapping()
+    if session.dataset_path != get_current_file_path() or json.loads(session.dataset_config) != (mapping.model_dump() if mapping else {}):
+        raise ValueError("Load the session's dataset and column mapping before resuming")
+    training_config = json.loads(session.training_config)
+    return training_config["model_config"], training_config["sft_config"], json.loads(session.lora_config)
+
+
+async def update_session_status(session_id: int, status: str):
+    async with async_session() as db:
+        await db.execute(update(TrainingSession).where(TrainingSession.id == session_id).values(status=status))
+        await db.commit()
+
+
+async def mark_interrupted_sessions():
+    """Runs that were training when the backend went down can be resumed; flag them."""
+    async with async_session() as db:
+        await db.execute(
+            update(TrainingSession).where(TrainingSession.status == "training").values(status="interrupted")
+        )
+        await db.commit()
+
+
+async def get_metrics(session_id: int | None = None, max_points: int = 500) -> dict:
+    """Loss curve of a session (default: the current or latest run), averaged into at most max_points buckets."""
+    await metric_writer.flush()
+    async with async_session() as db:
+        if session_id is None:
+            session_id = _training_status["session_id"] or await db.scalar(
+                select(TrainingMetricLog.session_id).order_by(TrainingMetricLog.id.desc()).limit(1)
+            )
+        if session_id is None:
+            return {"session_id": None, "num_points": 0, "bucket_steps": 1, "points": []}
+
+        where = TrainingMetricLog.session_id == session_id
+        first, last, count = (await db.execute(
+            select(func.min(TrainingMetricLog.step), func.max(TrainingMetricLog.step), func.count()).where(where)
+        )).one()
+        if not count:
+            return {"session_id": session_id, "num_points": 0, "bucket_steps": 1, "points": []}
+
+        # Fixed-width step buckets, aggregated in SQLite so long runs never load every row
+        width = max(1, -(-(last - first + 1) // max_points))
+        bucket = (TrainingMetricLog.step - first) // width
+        rows = (await db.execute(
+            select(
+                func.max(TrainingMetricLog.step),
+                func.avg(TrainingMetricLog.loss),
+                func.min(TrainingMetricLog.loss),
+                func.max(TrainingMetricLog.loss),
+                func.avg(TrainingMetricLog.learning_rate),
+                func.max(TrainingMetricLog.epoch),
+                func.avg(TrainingMetricLog.grad_norm),
+                func.avg(TrainingMetricLog.samples_per_sec),
+                func.avg(TrainingMetricLog.text_tokens_per_sec),
+                func.avg(TrainingMetricLog.vision_tokens_per_sec),
+                func.sum(TrainingMetricLog.data_wait_seconds),
+                func.sum(TrainingMetricLog.compute_seconds),
+                func.sum(TrainingMetricLog.optimizer_seconds),
+                func.max(TrainingMetricLog.peak_memory_gb),
+            ).where(where).group_by(bucket).order_by(func.max(TrainingMetricLog.step))
+        )).all()
+
+    return {
+        "session_id": session_id,
+        "num_points": count,
+        "bucket_steps": width,
+        "points": [
+            {
+                "step": step,
+                "loss": loss,
+                "loss_min": loss_min,
+                "loss_max": loss_max,
+                "learning_rate": lr,
+                "epoch": epoch,
+                "grad_norm": grad_norm,
+                "samples_per_sec": samples_per_sec,
+                "text_tokens_per_sec": text_tps,
+                "vision_tokens_per_sec": vision_tps,
+                "data_wait_seconds": data_wait,
+                "compute_seconds": compute,
+                "optimizer_seconds": optimizer,
+                "peak_memory_gb": peak_memory,
+            }
+            for (
+                step, loss, loss_min, loss_max, lr, epoch, grad_norm,
+                samples_per_sec, text_tps, vision_tps, data_wait, compute, optimizer, peak_memory,
+            ) in rows
+        ],
     }
 
 
+def _update_session(session_id: int | None, loop: asyncio.AbstractEventLoop, **fields):
+    if session_id is None:
+        return
+
+    async def _update():
+        async with async_session() as db:
+            await db.execute(update(TrainingSession).where(TrainingSession.id == session_id).values(**fields))
+            await db.commit()
+
+    try:
+        asyncio.run_coroutine_threadsafe(_update(), loop).result(timeout=10)
+    except Exception as e:
+        logger.warning("Could not update session %s: %s", session_id, e)
+
+
+def check_length_index(model_config: dict, sft_config: dict):
+    """Raise ValueError if the batching options need a token length index that hasn't been built."""
+    if sft_config.get("group_by_length") or sft_config.get("pack_text_rows") or sft_config.get("token_budget"):
+        require_length_index(model_config.get("model_name") or settings.default_model_name)
+
+
 def run_training(
     model_config: dict,
     sft_config: dict,
     lora_config: dict,
     loop: asyncio.AbstractEventLoop,
+    session_id: int | None = None,
+    resume: bool = False,
+    extra_callbacks: list | None = None,
 ) -> dict:
-    """Run training synchronously (called via asyncio.to_thread)."""
-    global _trainer, _training_status
+    """Run training synchronously (called via asyncio.to_thread).
+
+    With resume=True, continues from the latest checkpoint of session_id.
+    """
+    global _trainer, _training_status, _checkpoint_callback
+
+    _training_status["session_id"] = session_id
+
+    def _on_checkpoint(step: int, path: str):
+        _update_session(session_id, loop, checkpoint_dir=path, last_checkpoint_step=step)
+        ws_manager.broadcast_sync("training_state_saved", {"step": step, "path": path, "session_id": session_id}, loop)
 
+    # Created before the model loads so a stop requested while loading or preparing data takes effect
+    _checkpoint_callback = ResumableCheckpointCallback(_on_checkpoint)
+
+    def _set_phase(status: str):
+        if not _checkpoint_callback.stop_requested:
+            _training_status["status"] = status
+
+    ws_callback = None
     try:
+        # Fail before loading the model rather than after
+        check_length_index(model_config, sft_config)
+
         _training_status["status"] = "loading_model"
         ws_manager.broadcast_sync("training_status", {"status": "loading_model", "message": "Loading model..."}, loop)
         logger.info("Loading model: %s", model_config.get("model_name"))
@@ -68,9 +272,17 @@ def run_training(
         # Set to training mode
         model_manager.for_training()
 
-        _training_status["status"] = "preparing_data"
+        _set_phase("preparing_data")
         ws_manager.broadcast_sync("training_status", {"status": "preparing_data", "message": "Building training dataset..."}, loop)
 
+        failed_rows = get_failed_rows()
+        if failed_rows:
+            ws_manager.broadcast_sync("training_status", {
+                "status": "preparing_data",
+                "message": f"Warning: {len(failed_rows)} rows have images that failed to prefetch",
+                "failed_rows": failed_rows[:100],
+            }, loop)
+
         # Build dataset
         dataset, num_skipped = build_training_dataset()
         logger.info("Training dataset built with %d samples (%d rows skipped due to mandatory columns)", len(dataset), num_skipped)
@@ -80,7 +292,7 @@ def run_training(
                 "message": f"Dataset ready: {len(dataset)} samples ({num_skipped} rows skipped)",
             }, loop)
 
-        _training_status["status"] = "training"
+        _set_phase("training")
 
         # Create trainer
         from unsloth.trainer import UnslothVisionDataCollator
@@ -88,6 +300,11 @@ def run_training(
 
         use_epochs = sft_config.pop("use_epochs", False)
         max_seq_length = sft_config.pop("max_seq_length", 2048)
+        save_steps = sft_config.get("save_steps", 0)
+        output_dir = _output_dir(session_id)
+
+        # Worker processes take image download/decode and collation off the training thread
+        num_workers = sft_config.get("dataloader_num_workers", 0)
 
         sft_args = SFTConfig(
             per_device_train_batch_size=sft_config.get("per_device_train_batch_size", 2),
@@ -101,7 +318,10 @@ def run_training(
             weight_decay=sft_config.get("weight_decay", 0.01),
             lr_scheduler_type=sft_config.get("lr_scheduler_type", "linear"),
             seed=sft_config.get("seed", 3407),
-            output_dir=str(settings.data_dir / "training_output"),
+            output_dir=str(output_dir),
+            save_strategy="steps" if save_steps else "no",
+            save_steps=save_steps or 500,
+            save_total_limit=sft_config.get("save_total_limit", 2),
             report_to="none",
             fp16=sft_config.get("fp16", False),
             bf16=sft_config.get("bf16", True),
@@ -109,24 +329,139 @@ def run_training(
             dataset_text_field="",
             dataset_kwargs={"skip_prepare_dataset": True},
             max_length=max_seq_length,
+            dataloader_num_workers=num_workers,
+            dataloader_pin_memory=sft_config.get("dataloader_pin_memory", True),
+            dataloader_prefetch_factor=(sft_config.get("dataloader_prefetch_factor") or 2) if num_workers > 0 else None,
+            dataloader_persistent_workers=num_workers > 0,
         )
 
-        ws_callback = WebSocketTrainerCallback(loop)
+        config = getattr(model_manager.model, "config", None)
+        batch_stats = BatchStats({
+            token_id for token_id in (getattr(config, "image_token_id", None), getattr(config, "video_token_id", None))
+            if token_id is not None
+        })
+        ws_callback = WebSocketTrainerCallback(loop, batch_stats=batch_stats, session_id=session_id)
+
+        # Optional length-aware sampling, token-budget batching and packing of text-only rows
+        train_sampler = None
+        batch_sampler = None
+        padding_report = None
+        group_by_length = sft_config.get("group_by_length", False)
+        pack_rows = sft_config.get("pack_text_rows", False)
+        token_budget = sft_config.get("token_budget")
+        lengths_by_row = None
+        valid_rows = get_row_plan().valid_indices()
+        if group_by_length or pack_rows or token_budget:
+            ws_manager.broadcast_sync("training_status", {
+                "status": "preparing_data",
+                "message": "Loading sample lengths for batching...",
+            }, loop)
+            index = require_length_index(model_manager.model_name)
+            all_lengths = row_lengths(index, max_seq_length)
+            lengths_by_row = [all_lengths[i] for i in valid_rows]
+            unsized = int(unsized_rows(index)[valid_rows].sum())
+            if unsized:
+                logger.warning("%d rows have images that couldn't be sized; batching them as max_seq_length", unsized)
+                ws_manager.broadcast_sync("training_status", {
+                    "status": "preparing_data",
+                    "message": f"Warning: {unsized} rows have images that couldn't be sized and are batched as {max_seq_length} tokens",
+                    "rows_unsized": unsized,
+                }, loop)
+        else:
+            # Use the length index if it has already been computed, but don't build it just for a warning
+            index = load_length_index(model_manager.model_name)
+            if index is not None:
+                all_lengths = row_lengths(index)
+                lengths_by_row = [all_lengths[i] for i in valid_rows]
+
+        if lengths_by_row is not None:
+            over_max = sum(n > max_seq_length for n in lengths_by_row)
+            if over_max:
+                logger.warning("%d rows exceed max_seq_length=%d and will be truncated", over_max, max_seq_length)
+                ws_manager.broadcast_sync("training_status", {
+                    "status": "preparing_data",
+                    "message": f"Warning: {over_max} rows exceed max_seq_length ({max_seq_length}) and will be truncated",
+                }, loop)
+
+        if group_by_length or pack_rows or token_budget:
+            batch_size = sft_args.per_device_train_batch_size
+            before = padding_ratio(lengths_by_row, _shuffled(len(lengths_by_row), sft_args.seed), batch_size)
+            lengths = lengths_by_row
+            if pack_rows:
+                packs = pack_text_rows(dataset.source_rows, lengths_by_row, max_seq_length)
+                dataset = dataset.with_packs(packs)
+                lengths = pack_lengths(packs, lengths_by_row)
+            if token_budget:
+                batch_sampler = TokenBudgetBatchSampler(lengths, token_budget, seed=sft_args.seed)
+                after = batched_padding_ratio(lengths, batch_sampler.order(0))
+                # Keep samples per optimizer step close to batch_size * grad_accum
+                target = batch_size * sft_args.gradient_accumulation_steps
+                sft_args.gradient_accumulation_steps = max(1, round(target / batch_sampler.mean_batch_size))
+            elif group_by_length:
+                train_sampler = LengthGroupedSampler(lengths, batch_size, seed=sft_args.seed)
+                after = padding_ratio(lengths, train_sampler.order(0), batch_size)
+            else:
+                after = padding_ratio(lengths, _shuffled(len(lengths), sft_args.seed), batch_size)
+            padding_report = {
+                "padding_ratio_before": round(before, 4),
+                "padding_ratio_after": round(after, 4),
+                "num_samples_before": len(lengths_by_row),
+                "num_samples_after": len(lengths),
+            }
+            if batch_sampler is not None:
+                padding_report["mean_batch_size"] = round(batch_sampler.mean_batch_size, 2)
+                padding_report["gradient_accumulation_steps"] = sft_args.gradient_accumulation_steps
+            logger.info("Batching: padding %.1f%% -> %.1f%%, %d -> %d samples",
+                        before * 100, after * 100, len(lengths_by_row), len(lengths))
+            ws_manager.broadcast_sync("training_status", {
+                "status": "preparing_data",
+                "message": f"Padding {before:.0%} -> {after:.0%} ({len(lengths_by_row)} rows -> {len(lengths)} samples)",
+                **padding_report,
+            }, loop)
+
+        data_collator = UnslothVisionDataCollator(model_manager.model, model_manager.tokenizer)
+        train_dataset = dataset
+        if sft_config.get("cache_processed_samples", False):
+            # Process each row once and reuse the tensors across epochs and runs
+            tokenizer = model_manager.tokenizer
+            text_tokenizer = getattr(tokenizer, "tokenizer", tokenizer)
+            train_dataset = ProcessedSampleDataset(
+                dataset,
+                data_collator,
+                SampleCache(sample_store),
+                processor_identity(tokenizer, max_seq_length),
+            )
+            data_collator = PaddingCollator(text_tokenizer.pad_token_id, text_tokenizer.padding_side)
 
-        _trainer = SFTTrainer(
+        _trainer = _trainer_class(SFTTrainer, batch_stats, train_sampler, batch_sampler)(
             model=model_manager.model,
             tokenizer=model_manager.tokenizer,
-            data_collator=UnslothVisionDataCollator(model_manager.model, model_manager.tokenizer),
-            train_dataset=dataset,
+            data_collator=data_collator,
+            train_dataset=train_dataset,
             args=sft_args,
-            callbacks=[ws_callback],
+            callbacks=[ws_callback, _checkpoint_callback, *(extra_callbacks or [])],
         )
 
         _training_status["total_steps"] = sft_args.max_steps if sft_args.max_steps > 0 else 0
 
+        resume_from = None
+        if resume:
+            from transformers.trainer_utils import get_last_checkpoint
+
+            resume_from = get_last_checkpoint(str(output_dir)) if output_dir.exists() else None
+            if resume_from is None:
+                raise ValueError(f"No checkpoint found in {output_dir}")
+            if session_id is not None:
+                checkpoint_step = int(Path(resume_from).name.rsplit("-", 1)[-1])
+                asyncio.run_coroutine_threadsafe(metric_writer.truncate(session_id, checkpoint_step), loop).result(timeout=30)
+            ws_manager.broadcast_sync("training_status", {
+                "status": "training",
+                "message": f"Resuming from {Path(resume_from).name}",
+            }, loop)
+
         # Train
         start_time = time.time()
-        trainer_stats = _trainer.train()
+        trainer_stats = _trainer.train(resume_from_checkpoint=resume_from)
         elapsed = time.time() - start_time
 
         # Save adapter
@@ -135,16 +470,21 @@ def run_training(
         adapter_path = str(settings.adapter_dir / adapter_name)
         model_manager.save_adapter(adapter_path)
 
+        stopped = _checkpoint_callback.stop_requested
         _training_status["status"] = "completed"
         model_manager.set_idle()
+        _update_session(session_id, loop, status="stopped" if stopped else "completed", adapter_path=adapter_path)
 
         return {
             "status": "completed",
+            "stopped": stopped,
             "adapter_path": adapter_path,
             "metrics": {
                 "train_runtime": round(elapsed, 2),
                 "train_loss": trainer_stats.metrics.get("train_loss"),
                 "total_steps": trainer_stats.metrics.get("total_flos", 0),
+                **(padding_report or {}),
+                **ws_callback.throughput_summary(),
             },
         }
 
@@ -153,15 +493,74 @@ def run_training(
         _training_status["status"] = "error"
         _training_status["error_message"] = str(e)
         model_manager.set_idle()
+        _update_session(session_id, loop, status="error")
         ws_manager.broadcast_sync("training_error", {"error": str(e)}, loop)
         return {"status": "error", "error": str(e)}
+    finally:
+        # on_train_end doesn't run when training raises
+        if ws_callback is not None:
+            ws_callback.close_writer()
+
+
+def _trainer_class(base, batch_stats: BatchStats, train_sampler=None, batch_sampler=None):
+    """SFTTrainer subclass that records batch stats and timings, and uses our samplers when given."""
+
+    class _Trainer(base):
+        if hasattr(base, "get_batch_samples"):
+            # Every batch of an optimizer step is pulled from the data loader here
+            def get_batch_samples(self, *args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return super().get_batch_samples(*args, **kwargs)
+                finally:
+                    batch_stats.add_data_wait(time.perf_counter() - start)
+
+        def _get_train_sampler(self, *args, **kwargs):
+            if train_sampler is not None:
+                return train_sampler
+            return super()._get_train_sampler(*args, **kwargs)
+
+        def get_train_dataloader(self):
+            if batch_sampler is None:
+                return super().get_train_dataloader()
+            from torch.utils.data import DataLoader
+
+            args = self.args
+            loader = DataLoader(
+                self.train_dataset,
+                batch_sampler=batch_sampler,
+                collate_fn=self.data_collator,
+                num_workers=args.dataloader_num_workers,
+                pin_memory=args.dataloader_pin_memory,
+                prefetch_factor=args.dataloader_prefetch_factor,
+                persistent_workers=args.dataloader_persistent_workers,
+            )
+            return self.accelerator.prepare(loader)
+
+        def training_step(self, model, inputs, *args, **kwargs):
+            batch_stats.record(inputs)
+            batch_stats.compute.start()
+            try:
+                return super().training_step(model, inputs, *args, **kwargs)
+            finally:
+                batch_stats.compute.stop()
+
+    return _Trainer
+
+
+def _shuffled(n: int, seed: int) -> list[int]:
+    # Order the default RandomSampler would produce, for padding comparisons
+    order = list(range(n))
+    random.Random(seed).shuffle(order)
+    return order
 
 
 def stop_training():
+    """Stop after the current step, saving a checkpoint the run can be resumed from."""
     global _trainer, _training_status
-    if _trainer is not None and _training_status["status"] == "training":
+    if _checkpoint_callback is not None and _training_status["status"] in ("loading_model", "preparing_data", "training"):
         _training_status["status"] = "stopping"
-        _trainer.args.max_steps = _trainer.state.global_step
+        _checkpoint_callback.request_stop()
         return True
     return False
 
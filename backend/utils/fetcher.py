@@ -0,0 +1,136 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import httpx
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying — everything else is a permanent failure
+_RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class ImageFetcher:
+    """Pooled, concurrent HTTP fetcher shared by all image downloads.
+
+    A single httpx.Client keeps connections alive between requests, a thread
+    pool runs downloads concurrently, each host is capped at a fixed number
+    of in-flight requests, and concurrent submissions for the same key share
+    one future instead of downloading twice.
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        per_host: int | None = None,
+        retries: int | None = None,
+        backoff: float | None = None,
+        timeout: float | None = None,
+    ):
+        self._max_workers = max_workers or settings.image_fetch_workers
+        self._per_host = per_host or settings.image_fetch_per_host
+        self._retries = settings.image_fetch_retries if retries is None else retries
+        self._backoff = settings.image_fetch_backoff if backoff is None else backoff
+        self._timeout = timeout or settings.image_fetch_timeout
+        self._lock = threading.Lock()
+        self._client: httpx.Client | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._host_slots: dict[str, threading.BoundedSemaphore] = {}
+        self._inflight: dict[str, Future] = {}
+
+    def _get_client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    timeout=self._timeout,
+                    follow_redirects=True,
+                    limits=httpx.Limits(
+                        max_connections=self._max_workers,
+                        max_keepalive_connections=self._max_workers,
+                    ),
+                )
+            return self._client
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers, thread_name_prefix="image-fetch"
+                )
+            return self._executor
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self._per_host)
+                self._host_slots[host] = slot
+            return slot
+
+    def get(self, url: str) -> tuple[bytes, str | None]:
+        """Download a URL on the calling thread, with per-host limits and retries.
+
+        Returns the body and the response content type.
+        """
+        client = self._get_client()
+        attempt = 0
+        while True:
+            try:
+                with self._host_slot(url):
+                    resp = client.get(url)
+                if resp.status_code not in _RETRY_STATUS or attempt >= self._retries:
+                    resp.raise_for_status()
+                    return resp.content, resp.headers.get("content-type")
+                logger.debug("Retrying %s after HTTP %d", url, resp.status_code)
+            except httpx.TransportError as e:
+                if attempt >= self._retries:
+                    raise
+                logger.debug("Retrying %s after %s", url, e)
+            time.sleep(self._backoff * (2 ** attempt))
+            attempt += 1
+
+    def submit(self, key: str, fn, *args) -> Future:
+        """Run fn(*args) on the pool, sharing the future with any in-flight call for key."""
+        executor = self._get_executor()
+        with self._lock:
+            fut = self._inflight.get(key)
+            if fut is not None:
+                return fut
+            fut = executor.submit(fn, *args)
+            self._inflight[key] = fut
+
+        def _done(f: Future):
+            with self._lock:
+                if self._inflight.get(key) is f:
+                    del self._inflight[key]
+
+        fut.add_done_callback(_done)
+        return fut
+
+    def _reset_after_fork(self):
+        # DataLoader workers are forked from the trainer process; the parent's pool
+        # threads, sockets and possibly-held lock don't survive into the child
+        self._lock = threading.Lock()
+        self._client = None
+        self._executor = None
+        self._host_slots = {}
+        self._inflight = {}
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            client, self._client = self._client, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if client is not None:
+            client.close()
+
+
+image_fetcher = ImageFetcher()
+os.register_at_fork(after_in_child=image_fetcher._reset_after_fork)
@@ -1,27 +1,131 @@
-import hashlib
+import io
+import math
+from concurrent.futures import Future
 from pathlib import Path
 
-import httpx
 from PIL import Image
 
 from backend.config import settings
+from backend.utils.fetcher import image_fetcher
+from backend.utils.image_cache import derived_image_cache, image_cache, memory_image_cache
 
 
-def _cache_path(url: str) -> Path:
-    h = hashlib.sha256(url.encode()).hexdigest()
-    return settings.image_cache_dir / h
+def fit_to_pixel_budget(width: int, height: int, max_pixels: int, factor: int) -> tuple[int, int]:
+    """Size (width, height) aligned to the patch grid and within max_pixels.
+
+    Mirrors the Qwen-VL processor's smart_resize so the processor leaves our
+    pre-resized images untouched.
+    """
+    w_bar = max(factor, round(width / factor) * factor)
+    h_bar = max(factor, round(height / factor) * factor)
+    if w_bar * h_bar > max_pixels:
+        beta = math.sqrt((width * height) / max_pixels)
+        w_bar = max(factor, math.floor(width / beta / factor) * factor)
+        h_bar = max(factor, math.floor(height / beta / factor) * factor)
+    return w_bar, h_bar
+
+
+def _fetch_to_cache(url: str) -> Path:
+    # Another caller may have finished the download while this one was queued
+    cached = image_cache.peek(url)
+    if cached is None:
+        data, content_type = image_fetcher.get(url)
+        cached = image_cache.put(url, data, content_type)
+    return cached
+
+
+def _open_source(url: str) -> Image.Image:
+    cached = image_cache.lookup(url)
+    if cached is not None:
+        try:
+            return Image.open(cached)
+        except FileNotFoundError:
+            # Evicted by another process between the lookup and the open
+            pass
+    return Image.open(image_fetcher.submit(url, _fetch_to_cache, url).result())
+
+
+def _decode(url: str) -> Image.Image:
+    src = _open_source(url)
+    if not settings.image_max_pixels:
+        return src.convert("RGB")
+
+    # Only the header has been read so far — check for a stored derivative before decoding
+    size = fit_to_pixel_budget(src.width, src.height, settings.image_max_pixels, settings.image_patch_factor)
+    if size == src.size:
+        return src.convert("RGB")
+    # Keyed on the source bytes, so new content at the same URL gets a new derivative
+    digest = image_cache.content_hash(url)
+    if digest is None:
+        # Source evicted since it was opened; without its hash a stored derivative can't be matched
+        return src.convert("RGB").resize(size, Image.Resampling.BICUBIC)
+    key = f"{digest}#{size[0]}x{size[1]}"
+    derived = derived_image_cache.lookup(key)
+    if derived is not None:
+        try:
+            return Image.open(derived).convert("RGB")
+        except FileNotFoundError:
+            pass
+
+    img = src.convert("RGB").resize(size, Image.Resampling.BICUBIC)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", compress_level=1)
+    derived_image_cache.put(key, buf.getvalue(), "image/png")
+    return img
+
+
+def vision_token_count(url: str) -> int:
+    """Vision tokens the processor will produce for url, from the image header only."""
+    if image_cache.peek(url) is None:
+        image_fetcher.submit(url, _fetch_to_cache, url).result()
+    dimensions = image_cache.dimensions(url)
+    if dimensions is None:
+        # Evicted between the fetch and the header read
+        raise ValueError(f"Image is no longer cached: {url}")
+    width, height = dimensions
+    factor = settings.image_patch_factor
+    max_pixels = settings.image_max_pixels or width * height
+    w, h = fit_to_pixel_budget(width, height, max_pixels, factor)
+    return (w // factor) * (h // factor)
+
+
+def image_fingerprint(url: str) -> str:
+    """Identity of the image download_image would return, without decoding it.
+
+    Combines the content hash of the source bytes with the resize settings.
+    """
+    if image_cache.peek(url) is None:
+        image_fetcher.submit(url, _fetch_to_cache, url).result()
+    digest = image_cache.content_hash(url)
+    return f"{digest}:{settings.image_max_pixels}:{settings.image_patch_factor}"
+
+
+def prefetch_images(urls: list[str]) -> dict[str, Future]:
+    """Start downloading any uncached URLs in the background.
+
+    Returns a future per URL that had to be downloaded, resolving to its cache path.
+    """
+    futures: dict[str, Future] = {}
+    for url in urls:
+        url = url.strip()
+        if url and url not in futures and image_cache.peek(url) is None:
+            futures[url] = image_fetcher.submit(url, _fetch_to_cache, url)
+    return futures
 
 
 def download_image(url: str) -> Image.Image:
-    cached = _cache_path(url)
-    if cached.exists():
-        return Image.open(cached).convert("RGB")
+    """Return the decoded RGB image for url, downscaled to the configured pixel budget.
 
-    resp = httpx.get(url, timeout=30, follow_redirects=True)
-    resp.raise_for_status()
-    cached.write_bytes(resp.content)
-    return Image.open(cached).convert("RGB")
+    The result is shared and must not be mutated.
+    """
+    img = memory_image_cache.get(url)
+    if img is None:
+        img = _decode(url)
+        memory_image_cache.put(url, img)
+    return img
 
 
 def download_images(urls: list[str]) -> list[Image.Image]:
-    return [download_image(url) for url in urls if url.strip()]
+    urls = [url.strip() for url in urls if url.strip()]
+    prefetch_images(urls)
+    return [download_image(url) for url in urls]
@@ -0,0 +1,312 @@
+import atexit
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from PIL import Image
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+_INDEX_NAME = "index.sqlite"
+_TMP_PREFIX = ".tmp-"
+
+# Evict down to this fraction of the budget so we don't evict on every insert
+_LOW_WATERMARK = 0.9
+
+# Buffered access updates are written to the index once this many keys are pending
+_FLUSH_EVERY = 256
+
+
+class ImageCache:
+    """Size-bounded on-disk cache of downloaded image bytes (or any blob keyed by a string).
+
+    Files are stored by SHA-256 of the URL. A SQLite index next to them tracks
+    size, content type, last access and hit count, which drive LRU or LFU
+    eviction once the cache exceeds its byte budget. Hits are buffered in
+    memory and written in batches, and always before an eviction pass.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int, policy: str = "lru"):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown cache eviction policy: {policy}")
+        self._dir = cache_dir
+        self._max_bytes = max_bytes
+        self._policy = policy
+        self._lock = threading.Lock()
+        self._db = self._connect()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, url TEXT, size INTEGER, content_type TEXT,"
+            " created_at REAL, last_access REAL, hits INTEGER DEFAULT 0, sha256 TEXT,"
+            " width INTEGER, height INTEGER)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(entries)")}
+        for col, col_type in [("sha256", "TEXT"), ("width", "INTEGER"), ("height", "INTEGER")]:
+            if col not in columns:
+                self._db.execute(f"ALTER TABLE entries ADD COLUMN {col} {col_type}")
+        self._db.commit()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        # key -> (last access, hits since the last flush)
+        self._pending: dict[str, tuple[float, int]] = {}
+        self._reconcile()
+        self._total_bytes = self._indexed_bytes()
+
+    def _indexed_bytes(self) -> int:
+        # The index is shared with other processes (DataLoader workers), so a running total kept
+        # in this process goes stale; read the sum whenever the budget is checked
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(str(self._dir / _INDEX_NAME), timeout=30, check_same_thread=False)
+
+    def _reset_after_fork(self):
+        # SQLite connections must not be shared across processes
+        self._lock = threading.Lock()
+        self._db = self._connect()
+        # The parent still owns these and will flush them
+        self._pending = {}
+        self._total_bytes = self._indexed_bytes()
+
+    @staticmethod
+    def key_for(url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def path_for(self, url: str) -> Path:
+        return self._dir / self.key_for(url)
+
+    def _reconcile(self):
+        """Bring the index in line with the files actually on disk."""
+        indexed = {row[0] for row in self._db.execute("SELECT key FROM entries")}
+        on_disk = set()
+        for p in self._dir.iterdir():
+            if p.name.startswith(_TMP_PREFIX):
+                # Left behind by a crash mid-write
+                p.unlink(missing_ok=True)
+                continue
+            if not p.is_file() or p.name.startswith(_INDEX_NAME):
+                continue
+            on_disk.add(p.name)
+            if p.name not in indexed:
+                st = p.stat()
+                self._db.execute(
+                    "INSERT INTO entries (key, url, size, content_type, created_at, last_access, hits)"
+                    " VALUES (?, NULL, ?, NULL, ?, ?, 0)",
+                    (p.name, st.st_size, st.st_mtime, st.st_atime),
+                )
+        missing = indexed - on_disk
+        if missing:
+            self._db.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k in missing])
+        self._db.commit()
+
+    def peek(self, url: str) -> Path | None:
+        """Return the cached path without counting it as an access."""
+        path = self.path_for(url)
+        return path if path.exists() else None
+
+    def lookup(self, url: str) -> Path | None:
+        """Return the cached path for url, recording a hit or miss."""
+        path = self.path_for(url)
+        with self._lock:
+            if not path.exists():
+                self._misses += 1
+                return None
+            self._hits += 1
+            _, hits = self._pending.get(path.name, (0.0, 0))
+            self._pending[path.name] = (time.time(), hits + 1)
+            if len(self._pending) >= _FLUSH_EVERY:
+                self._flush_pending()
+                self._db.commit()
+        return path
+
+    def _flush_pending(self):
+        """Write buffered access updates to the index. Caller holds the lock and commits."""
+        if not self._pending:
+            return
+        self._db.executemany(
+            "UPDATE entries SET last_access = ?, hits = hits + ? WHERE key = ?",
+            [(last_access, hits, key) for key, (last_access, hits) in self._pending.items()],
+        )
+        self._pending.clear()
+
+    def flush(self):
+        with self._lock:
+            self._flush_pending()
+            self._db.commit()
+
+    def put(self, url: str, data: bytes, content_type: str | None = None) -> Path:
+        """Atomically write data for url and evict old entries if over budget."""
+        path = self.path_for(url)
+        fd, tmp = tempfile.mkstemp(prefix=_TMP_PREFIX, dir=self._dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+        now = time.time()
+        with self._lock:
+            # The entry is replaced with fresh counters
+            self._pending.pop(path.name, None)
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, url, size, content_type, created_at, last_access, hits, sha256)"
+                " VALUES (?, ?, ?, ?, ?, ?, 0, ?)",
+                (path.name, url, len(data), content_type, now, now, hashlib.sha256(data).hexdigest()),
+            )
+            self._total_bytes = self._indexed_bytes()
+            if self._total_bytes > self._max_bytes:
+                self._evict(keep=path.name)
+            self._db.commit()
+        return path
+
+    def content_hash(self, url: str) -> str | None:
+        """SHA-256 of the cached bytes for url, or None if not cached."""
+        path = self.path_for(url)
+        with self._lock:
+            row = self._db.execute("SELECT sha256 FROM entries WHERE key = ?", (path.name,)).fetchone()
+        if row and row[0]:
+            return row[0]
+        if not path.exists():
+            return None
+        # Entry predates content hashing
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()
+        with self._lock:
+            self._db.execute("UPDATE entries SET sha256 = ? WHERE key = ?", (digest, path.name))
+            self._db.commit()
+        return digest
+
+    def dimensions(self, url: str) -> tuple[int, int] | None:
+        """(width, height) of the cached image, read from the header once and then indexed."""
+        path = self.path_for(url)
+        with self._lock:
+            row = self._db.execute("SELECT width, height FROM entries WHERE key = ?", (path.name,)).fetchone()
+        if row and row[0] is not None:
+            return row[0], row[1]
+        if not path.exists():
+            return None
+        with Image.open(path) as img:
+            width, height = img.size
+        with self._lock:
+            self._db.execute("UPDATE entries SET width = ?, height = ? WHERE key = ?", (width, height, path.name))
+            self._db.commit()
+        return width, height
+
+    def _evict(self, keep: str):
+        order = "last_access ASC" if self._policy == "lru" else "hits ASC, last_access ASC"
+        target = self._max_bytes * _LOW_WATERMARK
+        self._flush_pending()
+        rows = self._db.execute(f"SELECT key, size FROM entries WHERE key != ? ORDER BY {order}", (keep,))
+        victims = []
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            (self._dir / key).unlink(missing_ok=True)
+            self._total_bytes -= size
+            victims.append((key,))
+        self._db.executemany("DELETE FROM entries WHERE key = ?", victims)
+        self._evictions += len(victims)
+        if victims:
+            logger.info("Evicted %d images from cache (%.1f MB in use)", len(victims), self._total_bytes / 1024**2)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            self._total_bytes = self._indexed_bytes()
+            lookups = self._hits + self._misses
+            return {
+                "entries": entries,
+                "size_bytes": self._total_bytes,
+                "max_bytes": self._max_bytes,
+                "policy": self._policy,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+            }
+
+
+class MemoryImageCache:
+    """LRU of decoded RGB images bounded by their pixel bytes.
+
+    Cached images are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[Image.Image, int]] = OrderedDict()
+        self._total_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size_of(img: Image.Image) -> int:
+        return img.width * img.height * len(img.getbands())
+
+    def get(self, key: str) -> Image.Image | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key: str, img: Image.Image):
+        size = self._size_of(img)
+        if size > self._max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+            self._entries[key] = (img, size)
+            self._total_bytes += size
+            while self._total_bytes > self._max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._total_bytes,
+                "max_bytes": self._max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+            }
+
+
+image_cache = ImageCache(settings.image_cache_dir, settings.image_cache_max_bytes, settings.image_cache_policy)
+derived_image_cache = ImageCache(settings.image_derived_dir, settings.image_derived_cache_max_bytes, settings.image_cache_policy)
+memory_image_cache = MemoryImageCache(settings.image_memory_cache_bytes)
+
+for _cache in (image_cache, derived_image_cache, memory_image_cache):
+    os.register_at_fork(after_in_child=_cache._reset_after_fork)
+for _cache in (image_cache, derived_image_cache):
+    atexit.register(_cache.flush)
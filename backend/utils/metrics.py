@@ -61,36 +61,24 @@ def _normalize_binary(text: str) -> str | None:
     return None
 
 
-def compute_classification_metrics(predictions: list[str], ground_truths: list[str]) -> dict:
-    """Compute binary classification metrics over the full batch."""
-    tp = fp = tn = fn = 0
-    skipped = 0
+def classify_pair(prediction: str, ground_truth: str) -> str | None:
+    """Confusion-matrix cell ('tp', 'fp', 'tn', 'fn') for one row, or None if the ground truth isn't binary."""
+    gt_label = _normalize_binary(ground_truth)
+    pred_label = _normalize_binary(prediction)
 
-    for pred, gt in zip(predictions, ground_truths):
-        gt_label = _normalize_binary(gt)
-        pred_label = _normalize_binary(pred)
+    if gt_label is None:
+        return None
 
-        if gt_label is None:
-            skipped += 1
-            continue
-
-        # If prediction couldn't be parsed, treat as wrong
-        if pred_label is None:
-            if gt_label == "positive":
-                fn += 1
-            else:
-                fp += 1
-            continue
-
-        if gt_label == "positive" and pred_label == "positive":
-            tp += 1
-        elif gt_label == "positive" and pred_label == "negative":
-            fn += 1
-        elif gt_label == "negative" and pred_label == "positive":
-            fp += 1
-        else:
-            tn += 1
+    # If prediction couldn't be parsed, treat as wrong
+    if pred_label is None:
+        return "fn" if gt_label == "positive" else "fp"
+
+    if gt_label == "positive":
+        return "tp" if pred_label == "positive" else "fn"
+    return "fp" if pred_label == "positive" else "tn"
 
+
+def classification_summary(tp: int, fp: int, tn: int, fn: int, skipped: int = 0) -> dict:
     total = tp + fp + tn + fn
     accuracy = (tp + tn) / total if total > 0 else 0.0
     precision = tp / (tp + fp) if (tp + fp) > 0 else 0.0
@@ -109,3 +97,18 @@ def compute_classification_metrics(predictions: list[str], ground_truths: list[s
         "total": total,
         "skipped": skipped,
     }
+
+
+def compute_classification_metrics(predictions: list[str], ground_truths: list[str]) -> dict:
+    """Compute binary classification metrics over the full batch."""
+    counts = {"tp": 0, "fp": 0, "tn": 0, "fn": 0}
+    skipped = 0
+
+    for pred, gt in zip(predictions, ground_truths):
+        cell = classify_pair(pred, gt)
+        if cell is None:
+            skipped += 1
+        else:
+            counts[cell] += 1
+
+    return classification_summary(**counts, skipped=skipped)
@@ -0,0 +1,146 @@
+"""CPU-only benchmark: DataLoader workers take image decoding out of the training step.
+
+Serves generated JPEGs from a local HTTP server, wraps them in the training
+LazyConversationDataset and drives a stand-in model (a small MLP) through a
+DataLoader with 0 and N workers. The in-memory image cache is disabled so
+every access reads the file from the disk cache and decodes it, as in a first epoch.
+
+With 0 workers each step waits for its batch to be decoded; with workers
+the batch is ready when the step starts, so step time falls to about the
+compute time.
+
+    python scripts/bench_dataloader.py --workers 4 --steps 40
+"""
+
+import argparse
+import functools
+import http.server
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+_tmp = Path(tempfile.mkdtemp(prefix="bench-dataloader-"))
+# Keep the benchmark's images out of the app's caches; must be set before backend.config is imported
+os.environ["QWEN3VL_IMAGE_CACHE_DIR"] = str(_tmp / "image_cache")
+os.environ["QWEN3VL_IMAGE_MEMORY_CACHE_BYTES"] = "0"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+import torch  # noqa: E402
+from PIL import Image  # noqa: E402
+from torch.utils.data import DataLoader  # noqa: E402
+
+from backend.services.dataset_service import LazyConversationDataset  # noqa: E402
+
+_THUMB = 64
+
+
+def _write_images(directory: Path, count: int, size: int):
+    directory.mkdir(parents=True)
+    rng = np.random.default_rng(0)
+    for i in range(count):
+        pixels = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(directory / f"{i}.jpg", quality=90)
+
+
+def _serve(directory: Path) -> str:
+    handler = functools.partial(_QuietHandler, directory=str(directory))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def _collate(samples: list[dict]) -> torch.Tensor:
+    """Stand-in for the vision collator: one small tensor per image."""
+    images = []
+    for sample in samples:
+        for message in sample["messages"]:
+            for item in message["content"]:
+                if item["type"] == "image":
+                    thumb = item["image"].resize((_THUMB, _THUMB))
+                    images.append(torch.from_numpy(np.asarray(thumb, dtype=np.float32) / 255).flatten())
+    return torch.stack(images)
+
+
+def _model(hidden: int) -> torch.nn.Module:
+    return torch.nn.Sequential(
+        torch.nn.Linear(_THUMB * _THUMB * 3, hidden),
+        torch.nn.ReLU(),
+        *[layer for _ in range(4) for layer in (torch.nn.Linear(hidden, hidden), torch.nn.ReLU())],
+        torch.nn.Linear(hidden, 1),
+    )
+
+
+def _run(dataset, model, optimizer, workers: int, batch_size: int, steps: int) -> dict:
+    loader = DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=True,
+        collate_fn=_collate,
+        num_workers=workers,
+        prefetch_factor=2 if workers else None,
+        persistent_workers=workers > 0,
+    )
+    it = iter(loader)
+    next(it)  # Worker startup isn't part of a step
+    wait = compute = 0.0
+    for _ in range(steps):
+        start = time.perf_counter()
+        try:
+            batch = next(it)
+        except StopIteration:
+            it = iter(loader)
+            batch = next(it)
+        fetched = time.perf_counter()
+        loss = model(batch).pow(2).mean()
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad()
+        wait += fetched - start
+        compute += time.perf_counter() - fetched
+    return {
+        "step_ms": (wait + compute) / steps * 1000,
+        "data_wait_ms": wait / steps * 1000,
+        "compute_ms": compute / steps * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--image-size", type=int, default=1536)
+    parser.add_argument("--hidden", type=int, default=2048)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    torch.set_num_threads(max(1, (os.cpu_count() or 2) // 2))
+    _write_images(_tmp / "images", args.images, args.image_size)
+    base_url = _serve(_tmp / "images")
+    rows = [(f"Describe image {i}.", "A picture.", [f"{base_url}/{i}.jpg"]) for i in range(args.images)]
+    dataset = LazyConversationDataset(rows)
+    for i in range(len(dataset)):
+        # Fill the disk cache so the timed runs measure decoding, not the first download
+        dataset[i]
+    model = _model(args.hidden)
+    optimizer = torch.optim.SGD(model.parameters(), lr=1e-4)
+
+    print(f"{args.images} images of {args.image_size}px, batch {args.batch_size}, {args.steps} steps")
+    print(f"{'workers':>8} {'step ms':>9} {'wait ms':>9} {'compute ms':>11}")
+    for workers in (0, args.workers):
+        r = _run(dataset, model, optimizer, workers, args.batch_size, args.steps)
+        print(f"{workers:>8} {r['step_ms']:>9.1f} {r['data_wait_ms']:>9.1f} {r['compute_ms']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
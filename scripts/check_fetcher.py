@@ -0,0 +1,129 @@
+"""Checks ImageFetcher against a local stand-in HTTP server.
+
+Covers retries on retryable statuses, giving up on permanent errors, the
+per-host in-flight limit and sharing one download between concurrent
+submissions of the same key. Exits non-zero if any check fails.
+
+    python scripts/check_fetcher.py
+"""
+
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.utils.fetcher import ImageFetcher  # noqa: E402
+
+_SLOW_SECONDS = 0.2
+
+
+class _Server:
+    """Records every request; paths choose the behaviour.
+
+    /flaky/<n>/<id>  503 for the first n requests of each id, then 200
+    /slow/<id>       200 after _SLOW_SECONDS, tracking peak concurrency
+    /missing         404
+    """
+
+    def __init__(self):
+        self.hits: Counter[str] = Counter()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status = server.handle(self.path)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"ok")
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self._httpd.server_port}"
+
+    def handle(self, path: str) -> int:
+        with self._lock:
+            self.hits[path] += 1
+            count = self.hits[path]
+        parts = path.strip("/").split("/")
+        if parts[0] == "flaky":
+            return 503 if count <= int(parts[1]) else 200
+        if parts[0] == "slow":
+            with self._lock:
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            time.sleep(_SLOW_SECONDS)
+            with self._lock:
+                self.in_flight -= 1
+            return 200
+        return 404
+
+    def close(self):
+        self._httpd.shutdown()
+
+
+def main() -> int:
+    server = _Server()
+    failures = []
+
+    def check(name: str, ok: bool, detail: str):
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: {detail}")
+        if not ok:
+            failures.append(name)
+
+    fetcher = ImageFetcher(max_workers=8, per_host=2, retries=3, backoff=0.01, timeout=5)
+    try:
+        url = f"{server.base_url}/flaky/2/a"
+        body, _ = fetcher.get(url)
+        check("retries", body == b"ok" and server.hits["/flaky/2/a"] == 3,
+              f"{server.hits['/flaky/2/a']} requests for 2 failures")
+
+        try:
+            fetcher.get(f"{server.base_url}/flaky/10/b")
+            raised = False
+        except Exception:
+            raised = True
+        check("retries exhausted", raised and server.hits["/flaky/10/b"] == 4,
+              f"raised={raised} after {server.hits['/flaky/10/b']} requests (1 + 3 retries)")
+
+        try:
+            fetcher.get(f"{server.base_url}/missing")
+            raised = False
+        except Exception:
+            raised = True
+        check("no retry on 404", raised and server.hits["/missing"] == 1,
+              f"raised={raised} after {server.hits['/missing']} requests")
+
+        urls = [f"{server.base_url}/slow/{i}" for i in range(8)]
+        futures = [fetcher.submit(u, fetcher.get, u) for u in urls]
+        for f in futures:
+            f.result()
+        check("per-host limit", server.peak_in_flight == 2,
+              f"peak {server.peak_in_flight} in flight with per_host=2 and 8 workers")
+
+        url = f"{server.base_url}/slow/shared"
+        futures = [fetcher.submit(url, fetcher.get, url) for _ in range(5)]
+        for f in futures:
+            f.result()
+        check("in-flight dedup", len({id(f) for f in futures}) == 1 and server.hits["/slow/shared"] == 1,
+              f"{len({id(f) for f in futures})} future(s), {server.hits['/slow/shared']} request(s) for 5 submissions")
+    finally:
+        fetcher.close()
+        server.close()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())